@@ -0,0 +1,408 @@
+__author__ = 'Jonas'
+import asyncio
+import concurrent.futures
+from pisole.cancellation import CancellationToken, CommandCancelled, CO_COROUTINE
+from pisole.commandpackage import LazyCommand
+import pisole.message as message
+import functools
+import itertools
+import threading
+import traceback
+import time
+import sys
+
+
+# The prefix of an input, that is supposed to be executed as a background job
+BACKGROUND_PREFIX = "!"
+
+
+class Job:
+    """
+    A single input, that is executed in the background by the thread pool of a JobManager.
+
+    :ivar job_id: (int) The id of the job, by which it can be addressed with the 'wait' and 'cancel' commands
+    :ivar input_string: (string) The input executed by the job
+    :ivar entry_id: (int) The id of the output entry, that all the prints of the job are written to
+    :ivar future: (concurrent.futures.Future) The future of the execution within the thread pool
+    :ivar start_time: (float) The time the job was submitted
+    :ivar end_time: (float) The time the job finished, None while it is still pending or running
+    :ivar started: (bool) Whether the execution of the job has started
+    :ivar is_coroutine: (bool) Whether the job is a coroutine running within the event loop of the console
+    :ivar cancellation_token: (CancellationToken) The token, that is cancelled when the job is cancelled
+    """
+    def __init__(self, job_id, input_string, entry_id, is_coroutine=False):
+        self.job_id = job_id
+        self.input_string = input_string
+        self.entry_id = entry_id
+        self.future = None
+        self.start_time = time.time()
+        self.end_time = None
+        self.started = False
+        self.is_coroutine = is_coroutine
+        self.cancellation_token = CancellationToken()
+
+    def get_status(self):
+        """
+        :return: (string) one of 'pending', 'running', 'cancelled', 'failed' and 'finished'
+        """
+        if self.future.cancelled():
+            return "cancelled"
+        if not self.future.done():
+            return "running" if self.started else "pending"
+        if isinstance(self.future.exception(), CommandCancelled):
+            return "cancelled"
+        if self.future.exception() is not None:
+            return "failed"
+        return "finished"
+
+    def get_duration(self):
+        """
+        :return: (float) the amount of seconds the job has been running or took to finish
+        """
+        end_time = self.end_time if self.end_time is not None else time.time()
+        return end_time - self.start_time
+
+    def __await__(self):
+        # the jobs can be awaited within the event loop of the console, 'await fetch(url)' for example waits for the
+        # result of the coroutine command
+        return asyncio.wrap_future(self.future).__await__()
+
+
+class JobConsole:
+    """
+    The console object passed to the commands of a background job in place of the engine itself. It offers the same
+    methods as the engine, but all the prints are written into the output entry of the job, so the output of the
+    job doesn't get mixed up with the output of the commands executed in the foreground meanwhile.
+
+    :ivar engine: (ConsoleEngine) The engine, that started the job
+    :ivar job: (Job) The job the console belongs to
+    """
+    def __init__(self, engine, job):
+        self.engine = engine
+        self.job = job
+        self.cancellation_token = job.cancellation_token
+
+    def print_info(self, string):
+        self.engine.frontend.print_message(message.InfoMessage(string), self.job.entry_id)
+
+    def print_result(self, string):
+        self.engine.frontend.print_message(message.ResultMessage(string), self.job.entry_id)
+
+    def print_error(self, exception):
+        self.engine.frontend.print_message(message.ErrorMessage(exception), self.job.entry_id)
+
+    def print_message(self, message_object):
+        self.engine.frontend.print_message(message_object, self.job.entry_id)
+
+    def prompt_input(self, prompt_string):
+        # the input line belongs to the foreground, a background job can't block waiting for the user to answer
+        raise RuntimeError("the background job {} can't prompt for input, use 'await console.prompt_input_async()' "
+                           "within a coroutine command instead".format(self.job.job_id))
+
+    async def prompt_input_async(self, prompt_string):
+        self.print_message(message.InputPromptMessage(prompt_string))
+        return await self.engine.frontend.input_channel.get_async(priority=True)
+
+    def start_coroutine(self, function, args, kwargs):
+        return self.engine.start_coroutine(function, args, kwargs, self.job.input_string, self.job.entry_id)
+
+    def get_width(self):
+        return self.engine.get_width()
+
+    def get_font_size(self):
+        return self.engine.get_font_size()
+
+    def _print(self, string):
+        self.engine.frontend.print(string, self.job.entry_id)
+
+    def _println(self, string):
+        self.engine.frontend.println(string, self.job.entry_id)
+
+    def __getattr__(self, name):
+        # everything else, like the job manager, is provided by the engine
+        return getattr(self.engine, name)
+
+
+class JobManager:
+    """
+    Executes inputs as background jobs within a bounded thread pool, so the console can accept the next input while
+    a long running command is still working.
+
+    :ivar max_workers: (int) The maximum amount of jobs running at the same time, further jobs are pending until a
+    worker becomes available
+    :ivar max_finished_jobs: (int) The maximum amount of jobs kept after they are done, the oldest ones being removed
+    once a new job is started
+    :ivar jobs: (dict) The jobs, that are pending, running or among the most recently finished ones, by their ids
+    """
+    def __init__(self, max_workers=4, max_finished_jobs=100):
+        self.max_workers = max_workers
+        self.max_finished_jobs = max_finished_jobs
+        self.jobs = {}
+        self._executor = None
+        self._job_counter = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def submit(self, engine, code, input_string, entry_id):
+        """
+        starts the execution of the given compiled input as a background job
+        :param engine: (ConsoleEngine) the engine the job belongs to
+        :param code: (code) the compiled input, translated with 'self' as the first parameter of the commands
+        :param input_string: (string) the input
+        :param entry_id: (int) the id of the output entry for the prints of the job
+        :return: (Job) the new job
+        """
+        with self._lock:
+            # the threads of the pool are only created, once the first job is actually started
+            if self._executor is None:
+                self._executor = concurrent.futures.ThreadPoolExecutor(max_workers=self.max_workers,
+                                                                       thread_name_prefix="pisole-job")
+            self._remove_finished_jobs()
+            job = Job(next(self._job_counter), input_string, entry_id)
+            self._report_start(engine, job)
+            job.future = self._executor.submit(self._run_job, engine, code, job)
+            # the job is only published once it has its future, as the other threads read the jobs without the lock
+            self.jobs[job.job_id] = job
+        return job
+
+    def submit_coroutine(self, engine, function, args, kwargs, input_string, entry_id):
+        """
+        starts the given coroutine command as a task within the event loop of the console thread
+        :param engine: (ConsoleEngine) the engine the job belongs to, running the event loop
+        :param function: (function) the coroutine function of the command
+        :param args: (tuple) the positional parameters for the command, without the console
+        :param kwargs: (dict) the keyword parameters for the command
+        :param input_string: (string) the input, that started the command
+        :param entry_id: (int) the id of the output entry for the prints of the job
+        :return: (Job) the new job
+        """
+        with self._lock:
+            self._remove_finished_jobs()
+            job = Job(next(self._job_counter), input_string, entry_id, is_coroutine=True)
+            self._report_start(engine, job)
+            # the concurrent future returned can be waited for from any thread and cancelling it cancels the task
+            job.future = asyncio.run_coroutine_threadsafe(self._run_coroutine_job(engine, function, args, kwargs, job),
+                                                          engine.loop)
+            self.jobs[job.job_id] = job
+        return job
+
+    def _remove_finished_jobs(self):
+        # removing the oldest of the finished jobs, that exceed the maximum amount. The dict keeps the order the jobs
+        # have been started in, so the oldest ones come first
+        finished_ids = [job_id for job_id, job in self.jobs.items() if job.future.done()]
+        for job_id in finished_ids[:max(len(finished_ids) - self.max_finished_jobs, 0)]:
+            del self.jobs[job_id]
+
+    @staticmethod
+    def _report_start(engine, job):
+        # reported before the job is actually started, so the report always precedes the output of the job
+        engine.frontend.print_message(message.InfoMessage("started job {}".format(job.job_id)), job.entry_id)
+
+    @staticmethod
+    def _run_job(engine, code, job):
+        job.started = True
+        console = JobConsole(engine, job)
+        status = "failed"
+        # the job works on a copy of the session namespace, the variables it assigns are taken over once it is done
+        namespace, baseline = engine.session.fork(console)
+        try:
+            result = eval(code, namespace)
+            # an input awaiting a coroutine command is a coroutine itself, which has to run within the event loop
+            if code.co_flags & CO_COROUTINE:
+                asyncio.run_coroutine_threadsafe(result, engine.loop).result()
+            status = "finished"
+            engine.session.merge(namespace, baseline)
+        except CommandCancelled:
+            status = "cancelled"
+            raise
+        except Exception as exception:
+            traceback.print_tb(sys.exc_info()[2])
+            console.print_error(exception)
+            raise
+        finally:
+            JobManager._finish_job(engine, job, status)
+
+    @staticmethod
+    async def _run_coroutine_job(engine, function, args, kwargs, job):
+        job.started = True
+        console = JobConsole(engine, job)
+        status = "failed"
+        try:
+            result = await function(console, *args, **kwargs)
+            status = "finished"
+            return result
+        except (asyncio.CancelledError, CommandCancelled):
+            status = "cancelled"
+            raise
+        except Exception as exception:
+            traceback.print_tb(sys.exc_info()[2])
+            console.print_error(exception)
+            raise
+        finally:
+            JobManager._finish_job(engine, job, status)
+
+    @staticmethod
+    def _finish_job(engine, job, status):
+        job.end_time = time.time()
+        report = "[JOB {}] {} after {:.2f} s".format(job.job_id, status, job.get_duration())
+        token = job.cancellation_token
+        if token.cancelled:
+            report += " ({}, the cancellation took effect after {:.1f} ms)".format(token.reason,
+                                                                                 token.get_latency() * 1000)
+        engine.frontend.println("[color=808080]{}[/color]".format(report), job.entry_id)
+
+    def get_job(self, job_id):
+        """
+        :param job_id: (int) the id of the job
+        :return: (Job) the job with the given id
+        """
+        if job_id not in self.jobs:
+            raise KeyError("there is no job with the id {}".format(job_id))
+        return self.jobs[job_id]
+
+    def wait(self, job_ids, timeout=None):
+        """
+        blocks until all the jobs with the given ids are done or the timeout expired
+        :param job_ids: (list) the ids of the jobs to wait for
+        :param timeout: (float) the maximum amount of seconds to wait, None meaning to wait forever
+        :return: (list) the jobs, that aren't done yet
+        """
+        futures = [self.get_job(job_id).future for job_id in job_ids]
+        done, not_done = concurrent.futures.wait(futures, timeout=timeout)
+        return [job for job in list(self.jobs.values()) if job.future in not_done]
+
+    async def wait_async(self, job_ids, timeout=None):
+        """
+        suspends the calling coroutine until all the jobs with the given ids are done or the timeout expired, without
+        blocking the event loop
+        :param job_ids: (list) the ids of the jobs to wait for
+        :param timeout: (float) the maximum amount of seconds to wait, None meaning to wait forever
+        :return: (list) the jobs, that aren't done yet
+        """
+        futures = {asyncio.wrap_future(self.get_job(job_id).future): self.get_job(job_id) for job_id in job_ids}
+        if len(futures) == 0:
+            return []
+        done, not_done = await asyncio.wait(futures.keys(), timeout=timeout)
+        # the exceptions of the jobs have already been reported, marking them as retrieved, so asyncio doesn't
+        # complain about them
+        for future in done:
+            if not future.cancelled():
+                future.exception()
+        return [futures[future] for future in not_done]
+
+    def cancel(self, job_id, reason="cancelled by the user"):
+        """
+        cancels the job with the given id. Jobs, that haven't started yet, and coroutine jobs are cancelled right away,
+        jobs running in a thread are signaled through their cancellation token and stop, once they check it
+        :param job_id: (int) the id of the job
+        :param reason: (string) the reason of the cancellation
+        :return: (bool) whether the job was still running and has been cancelled
+        """
+        job = self.get_job(job_id)
+        if job.future.done():
+            return False
+        job.cancellation_token.cancel(reason)
+        job.future.cancel()
+        return True
+
+    def shutdown(self):
+        """
+        cancels all pending jobs and releases the threads of the pool once the running jobs have finished
+        :return: (void)
+        """
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = None
+
+
+def jobs(console):
+    """
+    prints the list of all the background jobs, with their status and duration
+    :param console: -
+    :return: (void)
+    """
+    job_manager = console.job_manager
+    if len(job_manager.jobs) == 0:
+        console.print_info("there are no background jobs")
+        return
+    print_string_list = ["background jobs\n"]
+    # a copy, as a job running in the background can start another job meanwhile
+    for job in list(job_manager.jobs.values()):
+        print_string_list.append("[color=3AD126]{:>4}[/color]  {:<10}{:>9.2f} s  [color=808080]{}[/color]\n".format(
+            job.job_id, job.get_status(), job.get_duration(), job.input_string))
+    console.print_info(''.join(print_string_list))
+
+
+def wait(console, job_id=None, timeout=None):
+    """
+    waits until the background job with the given id or on default all the background jobs are done
+    :param console: -
+    :param job_id: (int) the id of the job to wait for, None meaning all jobs
+    :param timeout: (float) the maximum amount of seconds to wait
+    :return: (void)
+    """
+    job_manager = console.job_manager
+    job_ids = list(job_manager.jobs.keys()) if job_id is None else [job_id]
+    if console.in_console_thread():
+        # blocking the console thread would also block the coroutine jobs running within its event loop, so the
+        # console awaits the jobs instead, before it executes the next input
+        console.await_before_next_input(_wait_async(console, job_ids, job_id, timeout))
+    else:
+        _print_wait_result(console, job_id, job_manager.wait(job_ids, timeout))
+
+
+async def _wait_async(console, job_ids, job_id, timeout):
+    _print_wait_result(console, job_id, await console.job_manager.wait_async(job_ids, timeout))
+
+
+def _print_wait_result(console, job_id, not_done):
+    if len(not_done) == 0:
+        console.print_result("all jobs done" if job_id is None else "job {} done".format(job_id))
+    else:
+        console.print_info("still running: {}".format(", ".join(str(job.job_id) for job in not_done)))
+
+
+def cancel(console, job_id):
+    """
+    cancels the background job with the given id. A job running in a thread stops, once it checks its cancellation
+    token
+    :param console: -
+    :param job_id: (int) the id of the job to cancel
+    :return: (void)
+    """
+    if console.job_manager.cancel(job_id):
+        console.print_result("job {} cancelled".format(job_id))
+    else:
+        console.print_info("job {} is already done".format(job_id))
+
+
+def coroutine_command(function):
+    """
+    wraps the given coroutine function ('async def'), so that calling the command starts it as a job within the event
+    loop of the console. The console is ready for the next input right away and any amount of such commands can run
+    concurrently. The returned job can be awaited to get the result of the command: 'result = await fetch(url)'
+    :param function: (function) the coroutine function of the command
+    :return: (function) the wrapped command returning a Job
+    """
+    @functools.wraps(function)
+    def wrapper(console, *args, **kwargs):
+        return console.start_coroutine(function, args, kwargs)
+    return wrapper
+
+
+def wrap_commands(namespace):
+    """
+    returns a copy of the given namespace with all the coroutine functions wrapped by 'coroutine_command'
+    :param namespace: (dict) the names and objects of the namespace the inputs are executed in
+    :return: (dict)
+    """
+    return {name: coroutine_command(value) if _is_coroutine_function(value) else value
+            for name, value in namespace.items()}
+
+
+def _is_coroutine_function(value):
+    # the commands of a package, that haven't been imported yet, know from the scan whether they're coroutines
+    if isinstance(value, LazyCommand):
+        return value.is_coroutine
+    code = getattr(value, "__code__", None)
+    return code is not None and bool(code.co_flags & CO_COROUTINE)
@@ -0,0 +1,93 @@
+"""
+Benchmark of the fast path for single command calls with literal arguments against the general path of translating,
+compiling and executing the input. Runnable without a display, as it never imports kivy.
+
+Both paths are measured cold (every input seen for the first time, the caches being cleared) and warm (the input
+repeated, as when issued from the history), the dummy commands doing nothing, so only the overhead of the console is
+measured. The namespace is filled with additional names, as a commands module importing other modules would.
+
+USAGE:
+python -m pisole.benchmarks.fastpath --number 20000
+"""
+__author__ = 'Jonas'
+import argparse
+import timeit
+import types
+
+from pisole.commandindex import command_index
+import pisole.translate as translate
+import pisole.fastpath as fastpath
+
+
+# The inputs, typical for what is typed into the console
+INPUTS = ["status()",
+          "load_data('measurements.csv', separator=';')",
+          "query('SELECT * FROM t WHERE a > 3', limit=100, verbose=True)",
+          "plot([1, 2, 3, 5, 8], {'color': 'red', 'width': 2.5}, title='fibonacci')"]
+
+COMMAND_NAMES = ["status", "load_data", "query", "plot"]
+
+
+def _build_namespace(size):
+    """
+    builds the command index from a module of dummy commands and returns the namespace for the general path
+    :param size: (int) the amount of additional names within the namespace, as imported by the commands module
+    :return: (dict)
+    """
+    module = types.ModuleType("benchmark_commands")
+    for name in COMMAND_NAMES:
+        exec("def {}(console, *args, **kwargs):\n    return None".format(name), module.__dict__)
+    command_index.build(module)
+    namespace = {"name_{}".format(index): index for index in range(size)}
+    namespace.update(command_index.functions)
+    return namespace
+
+
+def fast(input_string, namespace):
+    name, arguments, keywords = fastpath.parse_call(input_string)
+    namespace[name](None, *arguments, **keywords)
+
+
+def general(input_string, namespace):
+    eval(translate.compile_input(input_string, "self"), dict(namespace, self=None))
+
+
+def clear_caches():
+    fastpath.call_cache.clear()
+    translate.compile_cache.clear()
+
+
+def measure(function, input_string, namespace, number, cold):
+    """
+    :return: (float) the average amount of microseconds per execution of the input
+    """
+    if cold:
+        def statement():
+            clear_caches()
+            function(input_string, namespace)
+        # subtracting the time it takes to clear the caches
+        overhead = timeit.timeit(clear_caches, number=number)
+        return (timeit.timeit(statement, number=number) - overhead) / number * 1e6
+    function(input_string, namespace)
+    return timeit.timeit(lambda: function(input_string, namespace), number=number) / number * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description="benchmark of the fast path for single command calls")
+    parser.add_argument("--number", type=int, default=20000, help="the amount of executions per measurement")
+    parser.add_argument("--namespace-size", type=int, default=200,
+                        help="the amount of names within the namespace, copied for every input by the general path")
+    arguments = parser.parse_args()
+
+    namespace = _build_namespace(arguments.namespace_size)
+    print("{:<75}{:>10}{:>10}{:>10}{:>10}".format("input [us]", "fast cold", "gen cold", "fast warm", "gen warm"))
+    for input_string in INPUTS:
+        results = [measure(function, input_string, namespace, number, cold)
+                   for cold, number in ((True, arguments.number // 10), (False, arguments.number))
+                   for function in (fast, general)]
+        print("{:<75}{:>10.1f}{:>10.1f}{:>10.1f}{:>10.1f}".format(input_string, *results))
+    return 0
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+"""
+Benchmark of the incremental reverse search through the command history. Runnable without a display, as it never
+imports kivy.
+
+The history is filled with generated commands and every query is typed character by character, as with CTRL-R
+within the input line, measuring the time each keystroke takes to find the most recent match. A frame at 60 fps
+takes 16.7 ms.
+
+USAGE:
+python -m pisole.benchmarks.historysearch --size 100000
+"""
+__author__ = 'Jonas'
+import argparse
+import random
+import time
+
+from pisole.history import History
+
+
+WORDS = ["load", "plot", "print", "query", "data", "show", "fetch", "crunch", "status", "select", "where", "limit"]
+
+# The queries typed, some of them matching recent, some old and some no commands at all
+QUERIES = ["plot", "load_data('file_1", "limit=9999", "status()", "print(x)", "zzz"]
+
+
+def fill_history(size):
+    """
+    :param size: (int) the amount of distinct commands
+    :return: (History) the history containing the generated commands
+    """
+    history = History(max_size=size)
+    generator = random.Random(0)
+    for index in range(size):
+        history.add("{}_{}('file_{}.csv', {}={})".format(generator.choice(WORDS), generator.choice(WORDS),
+                                                         generator.randrange(size), generator.choice(WORDS), index))
+    return history
+
+
+def main():
+    parser = argparse.ArgumentParser(description="benchmark of the incremental reverse search through the history")
+    parser.add_argument("--size", type=int, default=100000, help="the amount of commands within the history")
+    arguments = parser.parse_args()
+
+    history = fill_history(arguments.size)
+    start_time = time.perf_counter()
+    history.search("")
+    print("building the search index: {:.1f} ms".format((time.perf_counter() - start_time) * 1000))
+    print("{:<25}{:>12}{:>12}".format("query [ms]", "mean", "worst"))
+    for query in QUERIES:
+        times = []
+        for length in range(1, len(query) + 1):
+            start_time = time.perf_counter()
+            history.search(query[:length])
+            times.append((time.perf_counter() - start_time) * 1000)
+        print("{:<25}{:>12.3f}{:>12.3f}".format(query, sum(times) / len(times), max(times)))
+    return 0
+
+
+if __name__ == "__main__":
+    main()
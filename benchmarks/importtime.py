@@ -0,0 +1,102 @@
+"""
+Benchmark of the cold start import time of the pisole modules, based on the '-X importtime' option of the python
+interpreter. Every module is imported within a fresh interpreter process several times and the fastest cumulative
+import time is reported, together with whether the import pulled in kivy or pygments.
+
+Exits with status 1 if the import time of any module exceeds its threshold or if one of the modules meant to be
+usable without a display imports kivy, so cold start regressions can be caught.
+
+USAGE:
+python -m pisole.benchmarks.importtime --repeat 5
+"""
+__author__ = 'Jonas'
+import subprocess
+import argparse
+import os
+import sys
+
+
+# The modules to be measured with their import time thresholds in milliseconds and whether they may import kivy. The
+# engine runs an asyncio event loop and imports asyncio, which accounts for most of its import time
+MODULES = [("pisole.translate", 40.0, False),
+           ("pisole.engine", 90.0, False),
+           ("pisole.frontend", 30.0, False),
+           ("pisole.pisole", 100.0, False),
+           ("pisole.consolewidget", 1500.0, True)]
+
+# The heavy packages, whose import is reported
+HEAVY_PACKAGES = ("kivy", "pygments")
+
+
+def measure_import(module_name, python_path):
+    """
+    imports the module within a fresh interpreter process and parses the '-X importtime' report printed to stderr
+    :param module_name: (string) the name of the module to be imported
+    :param python_path: (string) the directory containing the pisole package
+    :return: (tuple) the cumulative import time of the module in milliseconds and the set of the top level packages
+    imported. None instead of the time, if the import failed
+    """
+    environment = dict(os.environ, PYTHONPATH=python_path)
+    process = subprocess.run([sys.executable, "-X", "importtime", "-c", "import " + module_name],
+                             env=environment, stderr=subprocess.PIPE, stdout=subprocess.DEVNULL,
+                             universal_newlines=True)
+
+    cumulative_time = None
+    packages = set()
+    for line in process.stderr.split("\n"):
+        # the lines have the form 'import time:      self [us] |  cumulative | imported package'
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        parts = line[len("import time:"):].split("|")
+        name = parts[2].strip()
+        packages.add(name.split(".")[0])
+        if name == module_name and parts[1].strip().isdigit():
+            cumulative_time = int(parts[1].strip()) / 1000
+    if process.returncode != 0:
+        return None, packages
+    return cumulative_time, packages
+
+
+def run(repeat=5):
+    """
+    measures every module of the MODULES list and prints the report
+    :param repeat: (int) the amount of fresh processes per module, the fastest one being reported
+    :return: (bool) whether all modules are within their thresholds
+    """
+    import pisole
+    python_path = os.path.dirname(os.path.dirname(os.path.abspath(pisole.__file__)))
+
+    successful = True
+    print("{:<24}{:>14}{:>16}  {}".format("module", "import [ms]", "threshold [ms]", "heavy packages"))
+    for module_name, threshold, may_import_kivy in MODULES:
+        times = []
+        packages = set()
+        for _ in range(repeat):
+            import_time, packages = measure_import(module_name, python_path)
+            if import_time is None:
+                break
+            times.append(import_time)
+
+        heavy_packages = sorted(package for package in HEAVY_PACKAGES if package in packages)
+        if len(times) == 0:
+            # the modules depending on kivy can't be imported without it, which is not a regression
+            print("{:<24}{:>14}{:>16}  {}".format(module_name, "failed", threshold, ", ".join(heavy_packages)))
+            successful = successful and may_import_kivy
+            continue
+
+        exceeded = min(times) > threshold or ("kivy" in heavy_packages and not may_import_kivy)
+        successful = successful and not exceeded
+        print("{:<24}{:>14.1f}{:>16}  {}{}".format(module_name, min(times), threshold, ", ".join(heavy_packages),
+                                                   "  FAIL" if exceeded else ""))
+    return successful
+
+
+def main(arguments=None):
+    parser = argparse.ArgumentParser(description="Benchmark of the import time of the pisole modules")
+    parser.add_argument("--repeat", type=int, default=5, help="the amount of fresh processes per module")
+    arguments = parser.parse_args(arguments)
+    return 0 if run(arguments.repeat) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
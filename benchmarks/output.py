@@ -0,0 +1,116 @@
+"""
+Stress test of the output channel, the path every print of the console takes from the threads executing commands to
+the ui thread. Runnable without a display, as it never imports kivy.
+
+Several producer threads hammer the channel with prints, while a single consumer thread drains it the same way the
+console widget does once every frame, peeking at the following items to join the prints of the same entry. In the
+end it is verified, that no print was lost or duplicated and that the prints of every producer arrived in order.
+Exits with status 1 if the verification failed.
+
+USAGE:
+python -m pisole.benchmarks.output --producers 8 --prints 100000
+"""
+__author__ = 'Jonas'
+import argparse
+import threading
+import time
+import sys
+
+from pisole.channel import OutputChannel
+
+
+def produce(channel, producer_id, prints, start_event):
+    """
+    puts the given amount of prints into the channel, each one being a tuple (producer id, sequence number). Every
+    thousandth print is a None string, signaling a new entry just like the console widget does
+    :param channel: (OutputChannel) the channel to put the prints into
+    :param producer_id: (int) the id of the producing thread, used as the entry id
+    :param prints: (int) the amount of prints
+    :param start_event: (threading.Event) the event to wait for, so all producers start at the same time
+    :return: (void)
+    """
+    start_event.wait()
+    for sequence_number in range(prints):
+        channel.put((producer_id, None if sequence_number % 1000 == 0 else sequence_number))
+
+
+def consume(channel, expected, received, batch_sizes):
+    """
+    drains the channel until the expected amount of prints has been received, joining consecutive prints of the same
+    producer into batches by peeking, just like the 'write_output' method of the console widget
+    :param channel: (OutputChannel) the channel to consume
+    :param expected: (int) the total amount of prints to receive
+    :param received: (dict) the producer ids as keys and lists of the received sequence numbers as values
+    :param batch_sizes: (list) the sizes of the joined batches are appended to this list
+    :return: (void)
+    """
+    count = 0
+    while count < expected:
+        item = channel.get()
+        if item is None:
+            # the real consumer waits for the next frame
+            time.sleep(0)
+            continue
+        producer_id, sequence_number = item
+        batch = [sequence_number]
+        following = channel.peek()
+        while following is not None and following[0] == producer_id and following[1] is not None \
+                and sequence_number is not None:
+            batch.append(channel.get()[1])
+            following = channel.peek()
+        received.setdefault(producer_id, []).extend(batch)
+        batch_sizes.append(len(batch))
+        count += len(batch)
+
+
+def run(producers, prints):
+    """
+    runs the stress test and prints the report
+    :param producers: (int) the amount of producer threads
+    :param prints: (int) the amount of prints per producer
+    :return: (bool) whether all prints arrived complete and in order
+    """
+    channel = OutputChannel()
+    received = {}
+    batch_sizes = []
+    start_event = threading.Event()
+    threads = [threading.Thread(target=produce, args=(channel, producer_id, prints, start_event))
+               for producer_id in range(producers)]
+    consumer = threading.Thread(target=consume, args=(channel, producers * prints, received, batch_sizes))
+    for thread in threads:
+        thread.start()
+    consumer.start()
+
+    start = time.perf_counter()
+    start_event.set()
+    for thread in threads:
+        thread.join()
+    consumer.join()
+    duration = time.perf_counter() - start
+
+    successful = len(channel) == 0
+    for producer_id in range(producers):
+        sequence = [number for number in received.get(producer_id, []) if number is not None]
+        expected = [number for number in range(prints) if number % 1000 != 0]
+        if sequence != expected:
+            print("producer {}: {} of {} prints received, order {}".format(
+                producer_id, len(sequence), len(expected), "kept" if sequence == sorted(sequence) else "broken"))
+            successful = False
+
+    print("{} producers x {} prints in {:.3f} s ({:.0f} prints/sec)".format(producers, prints, duration,
+                                                                           producers * prints / duration))
+    print("{} batches, average batch size {:.1f}".format(len(batch_sizes), sum(batch_sizes) / len(batch_sizes)))
+    print("PASSED" if successful else "FAILED")
+    return successful
+
+
+def main(arguments=None):
+    parser = argparse.ArgumentParser(description="Stress test of the pisole output channel")
+    parser.add_argument("--producers", type=int, default=8, help="the amount of producing threads")
+    parser.add_argument("--prints", type=int, default=100000, help="the amount of prints per producer")
+    arguments = parser.parse_args(arguments)
+    return 0 if run(arguments.producers, arguments.prints) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
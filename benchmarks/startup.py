@@ -0,0 +1,119 @@
+"""
+Benchmark of loading a large commands package, cold (without the on-disk index cache, every submodule being scanned)
+against warm (the commands taken from the cache of the previous start). Runnable without a display, as it never
+imports kivy.
+
+A temporary commands package is generated with the given amount of submodules and commands per submodule, every
+command documented like the commands of a real project. Every measurement starts from scratch, as a new start of
+the application would: the package is imported again and the command index and the help index are built.
+
+USAGE:
+python -m pisole.benchmarks.startup --modules 50 --commands 20
+"""
+__author__ = 'Jonas'
+import argparse
+import importlib
+import tempfile
+import shutil
+import time
+import sys
+import os
+
+import pisole.pisole as pisole
+from pisole.helpindex import help_index
+
+
+COMMAND_TEMPLATE = '''
+def {name}(console, path, separator=",", limit=None, verbose=False):
+    """
+    loads the data from the file at the given path and prints a summary of the columns found within it, the command
+    {name} of the generated benchmark package
+    :param console: -
+    :param path: (string) the path of the file to load
+    :param separator: (string) the character separating the columns
+    :param limit: (int) the maximum amount of rows to load, None meaning all of them
+    :param verbose: (bool) whether to print every row
+    :return: (list) the loaded rows
+    """
+    rows = []
+    with open(path) as file:
+        for index, line in enumerate(file):
+            if limit is not None and index >= limit:
+                break
+            rows.append(line.split(separator))
+            if verbose:
+                console.print_info(line)
+    console.print_result("{{}} rows".format(len(rows)))
+    return rows
+'''
+
+
+def create_package(directory, modules, commands):
+    """
+    generates the commands package within the given directory
+    :param directory: (string) the directory to create the package in
+    :param modules: (int) the amount of submodules
+    :param commands: (int) the amount of commands per submodule
+    :return: (void)
+    """
+    package = os.path.join(directory, "commands")
+    os.makedirs(package)
+    open(os.path.join(package, "__init__.py"), "w").close()
+    for module_index in range(modules):
+        with open(os.path.join(package, "module_{}.py".format(module_index)), "w") as file:
+            # the heavy dependencies of a real submodule, which aren't imported, until one of its commands is called
+            file.write("import json\nimport csv\n")
+            for command_index in range(commands):
+                file.write(COMMAND_TEMPLATE.format(name="command_{}_{}".format(module_index, command_index)))
+
+
+def start():
+    """
+    loads the commands as a new start of the application would and builds the help index
+    :return: (float) the amount of milliseconds it took
+    """
+    for name in [name for name in sys.modules if name == "commands" or name.startswith("commands.")]:
+        del sys.modules[name]
+    pisole._commands_module = None
+    pisole._index_cache = None
+    importlib.invalidate_caches()
+    start_time = time.perf_counter()
+    pisole.load_commands()
+    help_index.get_entries()
+    return (time.perf_counter() - start_time) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description="benchmark of loading a commands package with and without the cache")
+    parser.add_argument("--modules", type=int, default=50, help="the amount of submodules of the package")
+    parser.add_argument("--commands", type=int, default=20, help="the amount of commands per submodule")
+    parser.add_argument("--repeat", type=int, default=5, help="the amount of starts per measurement")
+    arguments = parser.parse_args()
+
+    directory = tempfile.mkdtemp()
+    try:
+        create_package(directory, arguments.modules, arguments.commands)
+        sys.path.insert(0, directory)
+        cache_path = os.path.join(directory, "commands", "__pycache__", "pisole_index.json")
+
+        cold = []
+        for _ in range(arguments.repeat):
+            if os.path.exists(cache_path):
+                os.remove(cache_path)
+            cold.append(start())
+        warm = [start() for _ in range(arguments.repeat)]
+
+        print("{} commands in {} submodules".format(arguments.modules * arguments.commands, arguments.modules))
+        print("{:<10}{:>12}{:>12}".format("[ms]", "best", "median"))
+        for label, times in (("cold", cold), ("warm", warm)):
+            times.sort()
+            print("{:<10}{:>12.1f}{:>12.1f}".format(label, times[0], times[len(times) // 2]))
+        print("cache file: {:.1f} kB".format(os.path.getsize(cache_path) / 1024))
+    finally:
+        sys.path.remove(directory)
+        shutil.rmtree(directory)
+    return 0
+
+
+if __name__ == "__main__":
+    main()
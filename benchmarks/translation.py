@@ -0,0 +1,184 @@
+"""
+Benchmark of the translation of console inputs, runnable without a display, as it never imports kivy.
+
+Measures the latency of every input of a corpus of realistic and pathological inputs, the throughput in lines per
+second and how the latency scales with the length of the input and the nesting depth of command calls. Exits with
+status 1 if the latency per 100 characters of any input exceeds the regression threshold, so the benchmark can be
+used as a gate. The latency is normalized by the characters instead of the lines, as single lines can be arbitrarily
+long and a linear algorithm has a roughly constant latency per character.
+
+USAGE:
+python -m pisole.benchmarks.translation --engine tokenize --engine ast --threshold 500
+"""
+__author__ = 'Jonas'
+import argparse
+import timeit
+import types
+import json
+import sys
+
+from pisole.commandindex import command_index
+import pisole.translate as translate
+
+
+# The names of the dummy commands the corpus is calling
+COMMAND_NAMES = ["load_data", "filter_rows", "print_table", "connect", "query"]
+
+# The default regression threshold in microseconds per 100 characters of input
+DEFAULT_THRESHOLD = 500.0
+
+# The lines, that are cycled through to assemble pasted scripts of arbitrary length
+SCRIPT_LINES = ["rows = load_data('measurements.csv', separator=';')",
+                "for row in rows:",
+                "    if row.get('value') > 10 and filter_rows(row, 'value > (3)'):",
+                "        values.append(query(connect('db'), \"SELECT * FROM t WHERE (a = ')')\"))",
+                "    # a comment containing a call(like, this)",
+                "print_table([len(str(value)) for value in values], title=\"Result (final)\")",
+                "result = {key: query(key) for key in sorted(set(values))}"]
+
+
+def _build_command_index():
+    """
+    builds the command index from a module of dummy commands, so the benchmark does not depend on the commands module
+    of an actual project
+    :return: (void)
+    """
+    module = types.ModuleType("benchmark_commands")
+    for name in COMMAND_NAMES:
+        exec("def {}(console, *args, **kwargs):\n    return None".format(name), module.__dict__)
+    command_index.build(module)
+
+
+def nested_input(depth):
+    """
+    creates an input consisting of command calls nested into each other
+    :param depth: (int) the nesting depth
+    :return: (string)
+    """
+    return "connect(" * depth + "'(leaf)'" + ")" * depth
+
+
+def script_input(lines):
+    """
+    creates a multi line input, as if a script was pasted into the console
+    :param lines: (int) the amount of lines
+    :return: (string)
+    """
+    script_lines = ["values = []"] + [SCRIPT_LINES[index % len(SCRIPT_LINES)] for index in range(lines - 1)]
+    # in case the script was cut off right after a block statement, completing the block with one more line
+    if script_lines[-1].endswith(":"):
+        indent = len(script_lines[-1]) - len(script_lines[-1].lstrip())
+        script_lines.append(" " * (indent + 4) + "pass")
+    return "\n".join(script_lines)
+
+
+def build_corpus():
+    """
+    assembles the corpus of inputs to be benchmarked
+    :return: (list) of tuples (name, input string)
+    """
+    return [("single_call", "load_data('measurements.csv', 100)"),
+            ("builtins_only", "print(len(str(sorted([3, 1, 2]))))"),
+            ("method_calls", "values = []; values.append(1); values.extend([2]); values.sort(key=abs)"),
+            ("quoted_parentheses", " and ".join(["query('((', \")(\", 'x(y)', \"))\")"] * 20)),
+            ("nested_depth_16", nested_input(16)),
+            ("nested_depth_64", nested_input(64)),
+            ("pasted_script_500", script_input(500))]
+
+
+def measure(function, input_string, repeat=5):
+    """
+    measures the best latency of calling the given function with the input string
+    :param function: (callable) the function to be measured
+    :param input_string: (string) the argument to call the function with
+    :param repeat: (int) how many measurements to take, the fastest one being reported
+    :return: (float) the latency in seconds
+    """
+    timer = timeit.Timer(lambda: function(input_string))
+    number, _ = timer.autorange()
+    return min(timer.repeat(repeat=repeat, number=number)) / number
+
+
+def get_function(engine, mode):
+    """
+    returns the function to be measured for the given engine
+    :param engine: (string) the name of the translation engine
+    :param mode: (string) 'translate' to only measure the translation to source code, 'compile' to measure the whole
+    way to the code object, bypassing the compile cache
+    :return: (callable)
+    """
+    if mode == "compile":
+        return lambda input_string: translate._compile_uncached(input_string, "self", engine)
+    return lambda input_string: translate.translate(input_string, "self", engine)
+
+
+def run(engines, mode="compile", threshold=DEFAULT_THRESHOLD, repeat=5):
+    """
+    runs the whole benchmark for the given engines and prints the reports
+    :param engines: (list) the names of the translation engines to be benchmarked
+    :param mode: (string) 'translate' or 'compile'
+    :param threshold: (float) the maximum latency per 100 characters in microseconds
+    :param repeat: (int) how many measurements to take per input
+    :return: (dict) the results, containing whether the threshold was exceeded under the key 'failed'
+    """
+    _build_command_index()
+    results = {"mode": mode, "threshold": threshold, "engines": {}, "failed": False}
+    for engine in engines:
+        function = get_function(engine, mode)
+        engine_results = {"corpus": {}, "length_scaling": {}, "depth_scaling": {}}
+        results["engines"][engine] = engine_results
+
+        print("\nENGINE '{}' ({})".format(engine, mode))
+        print("{:<22}{:>8}{:>14}{:>16}{:>14}".format("input", "lines", "latency [us]", "lines/sec", "us/100ch"))
+        for name, input_string in build_corpus():
+            lines = input_string.count("\n") + 1
+            latency = measure(function, input_string, repeat)
+            per_characters = latency * 1e6 / (len(input_string) / 100)
+            exceeded = per_characters > threshold
+            results["failed"] = results["failed"] or exceeded
+            engine_results["corpus"][name] = {"lines": lines, "characters": len(input_string), "latency": latency,
+                                              "per_100_characters": per_characters}
+            print("{:<22}{:>8}{:>14.1f}{:>16.0f}{:>14.1f}{}".format(name, lines, latency * 1e6, lines / latency,
+                                                                    per_characters, "  FAIL" if exceeded else ""))
+
+        # the scaling curves show whether the latency grows linearly with the size of the input
+        print("scaling with the input length [lines: us]")
+        for lines in (10, 50, 100, 250, 500):
+            engine_results["length_scaling"][lines] = measure(function, script_input(lines), repeat)
+        print("  " + "  ".join("{}: {:.0f}".format(lines, latency * 1e6)
+                               for lines, latency in engine_results["length_scaling"].items()))
+
+        print("scaling with the nesting depth [depth: us]")
+        for depth in (1, 2, 4, 8, 16, 32, 64):
+            engine_results["depth_scaling"][depth] = measure(function, nested_input(depth), repeat)
+        print("  " + "  ".join("{}: {:.0f}".format(depth, latency * 1e6)
+                               for depth, latency in engine_results["depth_scaling"].items()))
+    return results
+
+
+def main(arguments=None):
+    parser = argparse.ArgumentParser(description="Benchmark of the pisole input translation")
+    parser.add_argument("--engine", action="append", choices=sorted(list(translate.TRANSLATION_ENGINES.keys()) +
+                                                                    list(translate.COMPILING_ENGINES.keys())),
+                        help="the engine to be benchmarked, can be given multiple times. Defaults to all engines")
+    parser.add_argument("--mode", choices=["translate", "compile"], default="compile",
+                        help="whether to measure the translation only or the whole way to the code object")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                        help="the maximum allowed latency per 100 characters of input in microseconds")
+    parser.add_argument("--repeat", type=int, default=5, help="the amount of measurements per input")
+    parser.add_argument("--json", help="the path of a file to write the results to")
+    arguments = parser.parse_args(arguments)
+
+    engines = arguments.engine or [translate.default_engine, "ast"]
+    results = run(engines, arguments.mode, arguments.threshold, arguments.repeat)
+    if arguments.json:
+        with open(arguments.json, "w") as file:
+            json.dump(results, file, indent=4)
+    if results["failed"]:
+        print("\nthe latency per 100 characters exceeded the threshold of {} us".format(arguments.threshold))
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
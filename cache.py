@@ -0,0 +1,120 @@
+__author__ = 'Jonas'
+import collections
+import threading
+
+
+class LRUCache:
+    """
+    A bounded, thread safe mapping, that discards the least recently used entry, once more than 'max_size' entries
+    would be stored. Mainly used to save the results of expensive operations, like translating and compiling an input
+    string, that are likely to be repeated (re-running a command from the history for example).
+
+    Every cache is bound to a version. Whenever the cache is accessed with a version different from the one of its
+    entries, all entries are discarded, as they were computed based on an outdated state (for example an outdated set
+    of commands).
+
+    :ivar max_size: (int) The maximum amount of entries to be stored within the cache
+    :ivar version: (int) The version the currently stored entries are valid for
+    :ivar hits: (int) The amount of times a lookup has found an entry
+    :ivar misses: (int) The amount of times a lookup has not found an entry
+    :ivar evictions: (int) The amount of entries, that have been discarded due to the size limit
+    :ivar invalidations: (int) The amount of times the whole cache has been cleared due to a version change
+    """
+    def __init__(self, max_size=256):
+        self.max_size = max_size
+        self.version = None
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+        self._entries = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, version=None, default=None):
+        """
+        returns the value stored for the given key and marks it as the most recently used entry.
+        :param key: the (hashable) key of the entry
+        :param version: the version the entry has to be valid for. If it differs from the version of the cache the
+        cache is cleared
+        :param default: the value to return, in case there is no entry for the key
+        :return: the cached value or the default
+        """
+        with self._lock:
+            self._validate(version)
+            try:
+                value = self._entries[key]
+            except KeyError:
+                self.misses += 1
+                return default
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value, version=None):
+        """
+        stores the value for the given key as the most recently used entry, discarding the least recently used entries
+        in case the size limit is exceeded
+        :param key: the (hashable) key of the entry
+        :param value: the value to be stored
+        :param version: the version the value is valid for
+        :return: (void)
+        """
+        with self._lock:
+            self._validate(version)
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            self._shrink()
+
+    def resize(self, max_size):
+        """
+        changes the maximum amount of entries of the cache, discarding the least recently used entries if necessary
+        :param max_size: (int) the new maximum size
+        :return: (void)
+        """
+        with self._lock:
+            self.max_size = max_size
+            self._shrink()
+
+    def clear(self):
+        """
+        removes all entries from the cache. The statistic counters are not reset
+        :return: (void)
+        """
+        with self._lock:
+            self._entries.clear()
+
+    def get_statistics(self):
+        """
+        returns the counters of the cache
+        :return: (dict) with the keys 'size', 'max_size', 'hits', 'misses', 'evictions' and 'invalidations'
+        """
+        with self._lock:
+            return {"size": len(self._entries),
+                    "max_size": self.max_size,
+                    "hits": self.hits,
+                    "misses": self.misses,
+                    "evictions": self.evictions,
+                    "invalidations": self.invalidations}
+
+    def _validate(self, version):
+        # discarding every entry in case they were created for another version. Has to be called with the lock held
+        if version != self.version:
+            if len(self._entries) > 0:
+                self.invalidations += 1
+            self._entries.clear()
+            self.version = version
+
+    def _shrink(self):
+        # removing the least recently used entries, which are at the beginning of the ordered dict, until the size
+        # limit is met. Has to be called with the lock held
+        while len(self._entries) > max(self.max_size, 0):
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key):
+        return key in self._entries
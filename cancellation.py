@@ -0,0 +1,161 @@
+__author__ = 'Jonas'
+import asyncio
+import functools
+import threading
+import time
+
+
+# The flag of the code objects of coroutine functions and of inputs containing a top level 'await' (the same value as
+# inspect.CO_COROUTINE, which isn't imported for the sake of the startup time)
+CO_COROUTINE = 0x80
+
+
+class CommandCancelled(Exception):
+    """
+    The exception raised within a command, that checks its cancellation token after the user cancelled it or its
+    timeout expired. The console reports it as an info message instead of an error
+    """
+    pass
+
+
+class CancellationToken:
+    """
+    The token signaling a running command, that it is supposed to stop. The console can't interrupt a thread, so the
+    cancellation is cooperative: long running commands check the token from time to time, which is cheap enough to be
+    done within every iteration of a loop, either by reading the 'cancelled' attribute or by calling 'check', which
+    raises a CommandCancelled exception. Waiting for the user input and the 'sleep' method of the token return as
+    soon as the token is cancelled.
+
+    EXAMPLE:
+    def count(console, n):
+        for i in range(n):
+            console.cancellation_token.check()
+            ...
+
+    The token records when the cancellation was requested, so the console can report how long it took the command to
+    actually stop.
+
+    :ivar cancelled: (bool) Whether the cancellation has been requested
+    :ivar reason: (string) The reason of the cancellation, like 'cancelled by the user' or 'timeout after 5 s'
+    :ivar requested_time: (float) The performance counter time of the cancellation request, None if not cancelled
+    """
+    def __init__(self):
+        self.cancelled = False
+        self.reason = None
+        self.requested_time = None
+        self._event = threading.Event()
+        self._callbacks = []
+        self._lock = threading.Lock()
+
+    def cancel(self, reason="cancelled by the user"):
+        """
+        requests the cancellation of the command. Can be called from any thread, only the first call has an effect
+        :param reason: (string) the reason of the cancellation
+        :return: (bool) whether this call cancelled the token
+        """
+        with self._lock:
+            if self.cancelled:
+                return False
+            self.reason = reason
+            self.requested_time = time.perf_counter()
+            self.cancelled = True
+            callbacks = list(self._callbacks)
+        self._event.set()
+        for callback in callbacks:
+            callback()
+        return True
+
+    def cancel_after(self, seconds, reason=None):
+        """
+        cancels the token, once the given amount of seconds has passed
+        :param seconds: (float) the timeout
+        :param reason: (string) the reason of the cancellation. On default the timeout is given as the reason
+        :return: (threading.Timer) the started timer, which has to be cancelled in case the command finishes in time
+        """
+        reason = reason if reason is not None else "timeout after {} s".format(seconds)
+        timer = threading.Timer(seconds, self.cancel, args=(reason, ))
+        timer.daemon = True
+        timer.start()
+        return timer
+
+    def add_callback(self, callback):
+        """
+        registers a function, that is called (without parameters) as soon as the token is cancelled. In case the token
+        already is cancelled, the function is called right away
+        :param callback: (callable) the function
+        :return: (void)
+        """
+        with self._lock:
+            if not self.cancelled:
+                self._callbacks.append(callback)
+                return
+        callback()
+
+    def remove_callback(self, callback):
+        """
+        removes the given function from the callbacks of the token
+        :param callback: (callable) the function
+        :return: (void)
+        """
+        with self._lock:
+            if callback in self._callbacks:
+                self._callbacks.remove(callback)
+
+    def check(self):
+        """
+        raises a CommandCancelled exception, in case the token has been cancelled
+        :return: (void)
+        """
+        if self.cancelled:
+            raise CommandCancelled(self.reason)
+
+    def sleep(self, seconds):
+        """
+        an alternative to time.sleep for commands, that returns as soon as the token is cancelled
+        :param seconds: (float) the amount of seconds to sleep
+        :return: (void)
+        """
+        self._event.wait(seconds)
+        self.check()
+
+    def get_latency(self):
+        """
+        :return: (float) the amount of seconds passed since the cancellation was requested, None if it wasn't
+        """
+        if self.requested_time is None:
+            return None
+        return time.perf_counter() - self.requested_time
+
+
+def timeout(seconds):
+    """
+    decorator for command functions, that are supposed to be cancelled, once they've been running for the given amount
+    of seconds. As any cancellation, the timeout is cooperative and only stops commands, that check the cancellation
+    token of the console
+
+    EXAMPLE:
+    @timeout(10)
+    def download(console, url):
+        ...
+
+    :param seconds: (float) the timeout of the command
+    :return: (function) the decorator
+    """
+    def decorator(function):
+        if function.__code__.co_flags & CO_COROUTINE:
+            # coroutine commands are cancelled by the event loop directly, raising a TimeoutError within them
+            @functools.wraps(function)
+            async def coroutine_wrapper(console, *args, **kwargs):
+                return await asyncio.wait_for(function(console, *args, **kwargs), seconds)
+            return coroutine_wrapper
+
+        @functools.wraps(function)
+        def wrapper(console, *args, **kwargs):
+            timer = console.cancellation_token.cancel_after(seconds, "{} timed out after {} s".format(
+                function.__name__, seconds))
+            try:
+                return function(console, *args, **kwargs)
+            finally:
+                timer.cancel()
+        return wrapper
+    return decorator
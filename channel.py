@@ -0,0 +1,202 @@
+__author__ = 'Jonas'
+import collections
+import threading
+
+
+class InputChannel:
+    """
+    A thread safe FIFO channel, that transports the strings entered into the ui of the console to the thread, that
+    executes them as commands. The ui side (the producer) only ever calls the 'put' method, while the worker thread
+    (the consumer) fetches the entered strings in the same order they were entered by calling 'get'.
+
+    Internally the channel is a deque guarded by a condition variable. A consumer waiting for input is suspended on the
+    condition and woken up directly by the producer, so that there is no cpu time spent while the console is idle and
+    the consumer reacts to a new input as soon as it is put into the channel.
+
+    Coroutines running within an asyncio event loop can await the next item with 'get_async'. Those waiters are served
+    before the buffer, the ones that asked for priority (a coroutine command prompting for input) before the others
+    (the main loop of the console waiting for the next command).
+
+    :ivar closed: (bool) Whether None has been put into the channel, signaling that there will be no more input
+    :ivar _items: (collections.deque) The buffer for the entered strings, that haven't been fetched yet
+    :ivar _condition: (threading.Condition) The condition guarding the buffer and waking up waiting consumers
+    :ivar _waiters: (collections.deque) The (event loop, future) pairs of the coroutines awaiting an item
+    :ivar _priority_waiters: (collections.deque) The (event loop, future) pairs of the coroutines awaiting an item
+    with priority
+    """
+    def __init__(self):
+        self._items = collections.deque()
+        self._condition = threading.Condition(threading.Lock())
+        self._waiters = collections.deque()
+        self._priority_waiters = collections.deque()
+        self.closed = False
+
+    def put(self, item):
+        """
+        appends the given item to the end of the channel and wakes up one consumer, that is waiting for input. None
+        closes the channel, it is passed to all the waiting coroutines as well as put into the buffer
+        :param item: (string) the user entered string
+        :return: (void)
+        """
+        if item is None:
+            self.closed = True
+        self._dispatch(item, False)
+
+    def _dispatch(self, item, front):
+        # hands the item over to the first waiting coroutine or puts it into the buffer
+        with self._condition:
+            while len(self._priority_waiters) > 0 or len(self._waiters) > 0:
+                waiters = self._priority_waiters if len(self._priority_waiters) > 0 else self._waiters
+                loop, future = waiters.popleft()
+                if future.done():
+                    # the waiting coroutine has been cancelled meanwhile
+                    continue
+                loop.call_soon_threadsafe(self._resolve, future, item)
+                if item is not None:
+                    return
+            if front:
+                self._items.appendleft(item)
+            else:
+                self._items.append(item)
+            self._condition.notify()
+
+    def _resolve(self, future, item):
+        # executed within the event loop of the waiter. In case it was cancelled after the item had been handed over,
+        # the item is dispatched again, so it isn't lost
+        if future.done():
+            if item is not None:
+                self._dispatch(item, True)
+            return
+        future.set_result(item)
+
+    async def get_async(self, priority=False):
+        """
+        removes and returns the item, that has been put into the channel first, suspending the calling coroutine until
+        an item is available, without blocking the event loop
+        :param priority: (bool) whether the coroutine is to be served before the coroutines waiting without priority
+        :return: (string) the user entered string
+        """
+        # the frontends only use the blocking side of the channel, so they don't pay for importing asyncio
+        import asyncio
+        loop = asyncio.get_running_loop()
+        with self._condition:
+            if len(self._items) > 0:
+                return self._items.popleft()
+            future = loop.create_future()
+            waiters = self._priority_waiters if priority else self._waiters
+            waiters.append((loop, future))
+        try:
+            return await future
+        except asyncio.CancelledError:
+            with self._condition:
+                if (loop, future) in waiters:
+                    waiters.remove((loop, future))
+            raise
+
+    def get(self, blocking=True, timeout=None, cancellation_token=None):
+        """
+        removes and returns the item, that has been put into the channel first.
+        :param blocking: (bool) whether or not the method is supposed to block the calling thread until an item is
+        available. If False: the method will return None if there was no item to return.
+        :param timeout: (float) the maximum amount of seconds to block. None meaning to wait forever. If the timeout
+        expires before an item was available, None is returned
+        :param cancellation_token: (CancellationToken) the token, whose cancellation stops the waiting right away,
+        None being returned as well
+        :return: (string) the user entered string
+        """
+        if cancellation_token is None:
+            predicate = self._items.__len__
+        else:
+            def predicate():
+                return len(self._items) > 0 or cancellation_token.cancelled
+            cancellation_token.add_callback(self._wake)
+        try:
+            with self._condition:
+                if blocking:
+                    # the wait_for method handles spurious wake ups and subtracts the already waited time from the
+                    # timeout
+                    self._condition.wait_for(predicate, timeout)
+                if len(self._items) > 0:
+                    return self._items.popleft()
+                return None
+        finally:
+            if cancellation_token is not None:
+                cancellation_token.remove_callback(self._wake)
+
+    def _wake(self):
+        # wakes up all the waiting threads, so they can check whether they were cancelled
+        with self._condition:
+            self._condition.notify_all()
+
+    def get_latest(self, blocking=False, timeout=None):
+        """
+        removes and returns the item, that has been put into the channel last.
+        :param blocking: (bool) whether or not the method is supposed to block the calling thread until an item is
+        available. If False: the method will return None if there was no item to return.
+        :param timeout: (float) the maximum amount of seconds to block. None meaning to wait forever
+        :return: (string) the user entered string or None if the channel is empty
+        """
+        with self._condition:
+            if blocking:
+                self._condition.wait_for(self._items.__len__, timeout)
+            if len(self._items) > 0:
+                return self._items.pop()
+            return None
+
+    def clear(self):
+        """
+        removes all the items, that are currently buffered inside the channel
+        :return: (void)
+        """
+        with self._condition:
+            self._items.clear()
+
+    def __len__(self):
+        return len(self._items)
+
+
+class OutputChannel:
+    """
+    A thread safe FIFO channel for the prints of the console, with any amount of producer threads (the console thread
+    executing the commands and background jobs), but just one consumer: the ui thread, writing the prints onto the
+    output window once every frame.
+
+    The channel is based on a deque, whose 'append' and 'popleft' methods are atomic, so neither the producers nor the
+    consumer need to acquire a lock. As there is only one consumer, the first item can safely be peeked at before it
+    is removed.
+
+    :ivar _items: (collections.deque) The buffer of the prints, that have not been consumed yet
+    """
+    def __init__(self):
+        self._items = collections.deque()
+
+    def put(self, item):
+        """
+        appends the item to the end of the channel. Can be called from any thread
+        :param item: the item to be put into the channel
+        :return: (void)
+        """
+        self._items.append(item)
+
+    def get(self):
+        """
+        removes and returns the first item of the channel. May only be called by the consuming thread
+        :return: the first item or None if the channel is empty
+        """
+        try:
+            return self._items.popleft()
+        except IndexError:
+            return None
+
+    def peek(self):
+        """
+        returns the first item of the channel without removing it. May only be called by the consuming thread
+        :return: the first item or None if the channel is empty
+        """
+        try:
+            return self._items[0]
+        except IndexError:
+            return None
+
+    def __len__(self):
+        return len(self._items)
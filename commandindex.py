@@ -0,0 +1,135 @@
+__author__ = 'Jonas'
+
+
+class CommandIndex:
+    """
+    The index of all the functions, that can be issued as commands within the console. The translation of the user
+    input only inserts the console object into calls of functions, whose names are contained in this index, which is
+    why the lookup of a name is done within a frozenset.
+
+    The index is built from the functions of the commands module once at startup and rebuilt, whenever the commands
+    module is reloaded. Every (re)build increments the version of the index, so any other layer caching information,
+    that depends on the set of commands (translations, compiled code, help texts), can use the version as part of its
+    cache key and thus is invalidated automatically.
+
+    When the commands module is reloaded, 'update' compares the fingerprints of the new functions with the ones of
+    the index, so only the commands, that actually changed, have to be processed again by the other layers and the
+    version is only incremented, if there are any changes at all.
+
+    :ivar functions: (dict) The command names as keys and the according function objects as values
+    :ivar names: (frozenset) The names of all commands
+    :ivar version: (int) The counter of how many times the index has been built
+    :ivar fingerprints: (dict) The command names as keys and the fingerprints of the functions as values
+    :ivar last_changes: (dict) The sets of the names, that have been 'added', 'removed' and 'changed' by the last
+    (re)build of the index
+    """
+    def __init__(self):
+        self.functions = {}
+        self.names = frozenset()
+        self.version = 0
+        self.fingerprints = {}
+        self.last_changes = {"added": set(), "removed": set(), "changed": set()}
+
+    def build(self, module, extra_functions=None):
+        """
+        (re)builds the index from all the functions found within the given module.
+        :param module: (module) the module containing the command functions
+        :param extra_functions: (dict) additional commands, that are not part of the module, with their names as keys
+        and the functions as values. For example the commands of the console itself
+        :return: (int) the new version of the index
+        """
+        self._replace(self._collect(module, extra_functions))
+        return self.version
+
+    def update(self, module, extra_functions=None):
+        """
+        updates the index with the functions of the given (reloaded) module. The version is only incremented, in
+        case any command has been added, removed or changed
+        :param module: (module) the module containing the command functions
+        :param extra_functions: (dict) additional commands, that are not part of the module
+        :return: (dict) the sets of the names of the 'added', 'removed' and 'changed' commands
+        """
+        functions = self._collect(module, extra_functions)
+        fingerprints = {name: get_fingerprint(function) for name, function in functions.items()}
+        changes = self._compare(functions, fingerprints)
+        if any(len(names) > 0 for names in changes.values()):
+            self._replace(functions, fingerprints)
+        else:
+            # the function objects are replaced nonetheless, as the old ones belong to the previous module execution
+            self.functions = functions
+        return changes
+
+    @staticmethod
+    def _collect(module, extra_functions):
+        # imported here instead of at the top, as the translation imports this module, but only the building of the
+        # index needs inspect
+        import inspect
+        functions = dict(inspect.getmembers(module, inspect.isfunction))
+        if extra_functions is not None:
+            functions.update(extra_functions)
+        return functions
+
+    def _compare(self, functions, fingerprints):
+        # the names of the commands added, removed and changed by the given functions compared to the index
+        names = set(functions.keys())
+        return {"added": names - self.names,
+                "removed": self.names - names,
+                "changed": set(name for name in names & self.names if fingerprints[name] != self.fingerprints[name])}
+
+    def _replace(self, functions, fingerprints=None):
+        if fingerprints is None:
+            fingerprints = {name: get_fingerprint(function) for name, function in functions.items()}
+        self.last_changes = self._compare(functions, fingerprints)
+        # replacing the attributes only after the new index is complete, so a translation running concurrently
+        # always sees a consistent set of names
+        self.functions = functions
+        self.fingerprints = fingerprints
+        self.names = frozenset(functions.keys())
+        self.version += 1
+
+    def get_function(self, name):
+        """
+        returns the function object of the command with the given name
+        :param name: (string) the name of the command
+        :return: (function) the command function or None if there is no such command
+        """
+        return self.functions.get(name)
+
+    def __contains__(self, name):
+        return name in self.names
+
+    def __len__(self):
+        return len(self.names)
+
+    def __iter__(self):
+        return iter(self.names)
+
+
+def get_fingerprint(function):
+    """
+    returns a value identifying the implementation of the given function, equal for two function objects created by
+    executing the same source code twice, like the functions of a reloaded module. The line numbers are not part of
+    the fingerprint, so adding a function above another doesn't change the latter
+    :param function: (function) the function
+    :return: (tuple)
+    """
+    code = getattr(function, "__code__", None)
+    if code is None:
+        # the lazily imported commands of a package provide the fingerprint of their source
+        return getattr(function, "fingerprint", id(function))
+    # the decorators of the commands (functools.wraps) keep the original function
+    wrapped = getattr(function, "__wrapped__", None)
+    return (_get_code_fingerprint(code), repr(function.__defaults__), repr(function.__kwdefaults__),
+            function.__doc__, get_fingerprint(wrapped) if wrapped is not None else None)
+
+
+def _get_code_fingerprint(code):
+    # the code objects of nested functions and comprehensions are contained within the constants
+    constants = tuple(_get_code_fingerprint(constant) if hasattr(constant, "co_code") else repr(constant)
+                      for constant in code.co_consts)
+    return (code.co_code, constants, code.co_names, code.co_varnames, code.co_freevars, code.co_cellvars,
+            code.co_argcount, code.co_kwonlyargcount, code.co_flags)
+
+
+# The index of the commands, that is used by the translation of the console inputs
+command_index = CommandIndex()
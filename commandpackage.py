@@ -0,0 +1,321 @@
+__author__ = 'Jonas'
+from pisole.helpindex import parse_docstring
+import importlib
+import threading
+import hashlib
+import json
+import ast
+import sys
+import os
+
+
+# The name of the file within the '__pycache__' folder of the commands package, that the scanned commands are cached in
+INDEX_CACHE_NAME = "pisole_index.json"
+
+# The version of the format of the cache file, cache files of another format are ignored
+INDEX_CACHE_FORMAT = 1
+
+
+class LazyCommand:
+    """
+    The stand-in for a command function defined within a submodule of a commands package. The commands of a package
+    are known from a static scan of the source files, so the translation and the help index know every command, while
+    the submodule is only imported, the first time one of its commands is actually called. This way the heavy
+    dependencies of the commands, that aren't used within a session, are never imported.
+
+    :ivar __name__: (string) The name of the command
+    :ivar __module__: (string) The name of the submodule defining the command
+    :ivar __doc__: (string) The docstring of the command function, as found by the scan
+    :ivar is_coroutine: (bool) Whether the command is a coroutine function ('async def')
+    :ivar fingerprint: (string) The hash of the syntax tree of the function, identifying its implementation
+    :ivar help_info: (tuple) The summary, the parameters and the return value extracted from the docstring
+    """
+    def __init__(self, name, module_name, doc, is_coroutine, fingerprint, help_info=None):
+        self.__name__ = name
+        self.__qualname__ = name
+        self.__module__ = module_name
+        # an empty string instead of None, as inspect.getdoc would take the docstring of this class otherwise
+        self.__doc__ = doc or ""
+        self.is_coroutine = is_coroutine
+        self.fingerprint = fingerprint
+        self.help_info = help_info if help_info is not None else parse_docstring(self.__doc__)
+        self._function = None
+        self._lock = threading.Lock()
+
+    def resolve(self):
+        """
+        imports the submodule of the command, in case that hasn't already been done
+        :return: (function) the actual function of the command
+        """
+        function = self._function
+        if function is None:
+            with self._lock:
+                if self._function is None:
+                    module = importlib.import_module(self.__module__)
+                    self._function = getattr(module, self.__name__)
+                function = self._function
+        return function
+
+    def is_loaded(self):
+        """
+        :return: (bool) whether the submodule of the command has already been imported
+        """
+        return self._function is not None
+
+    def __call__(self, *args, **kwargs):
+        return self.resolve()(*args, **kwargs)
+
+    def __repr__(self):
+        return "<lazy command {} of {}>".format(self.__name__, self.__module__)
+
+
+def is_package(module):
+    """
+    :param module: (module) the imported commands module
+    :return: (bool) whether the commands are a package with submodules instead of a single module
+    """
+    return hasattr(module, "__path__")
+
+
+def scan_package(package, cache=None):
+    """
+    scans the source files of all the submodules of the given package for their command functions, without importing
+    them. The public functions defined at the top level of a submodule are its commands, respectively the names listed
+    within its '__all__'. In case two submodules define a command with the same name, the one of the submodule coming
+    first in alphabetical order is used
+    :param package: (module) the imported commands package
+    :param cache: (IndexCache) the cache of the commands of the source files, which are only scanned, in case they
+    have changed since they have been cached. None meaning to scan all the files
+    :return: (tuple) the dict of the LazyCommand objects by the names of the commands and the dict of the module
+    names by the paths of the scanned source files
+    """
+    commands = {}
+    files = {}
+    for module_name, path in sorted(_find_modules(package.__name__, package.__path__)):
+        files[path] = module_name
+        for name, doc, is_coroutine, fingerprint, help_info in _get_module_commands(path, cache):
+            if name not in commands:
+                commands[name] = LazyCommand(name, module_name, doc, is_coroutine, fingerprint, help_info)
+    if cache is not None:
+        cache.retain(files.keys())
+    return commands, files
+
+
+def _get_module_commands(path, cache):
+    # the commands of the source file taken from the cache, in case the file hasn't changed, scanning it otherwise
+    state = get_file_states([path])[path]
+    if cache is not None:
+        commands = cache.get(path, state)
+        if commands is not None:
+            return commands
+    try:
+        with open(path, "rb") as file:
+            source = file.read()
+    except OSError:
+        return []
+    source_hash = hashlib.sha1(source).hexdigest()
+    commands = cache.get(path, state, source_hash) if cache is not None else None
+    if commands is None:
+        commands = _scan_module(source, path)
+    if cache is not None:
+        cache.put(path, state, source_hash, commands)
+    return commands
+
+
+def _find_modules(package_name, directories):
+    # the names and paths of the submodules within the directories of the package, including nested packages
+    for directory in directories:
+        try:
+            entries = sorted(os.scandir(directory), key=lambda entry: entry.name)
+        except OSError:
+            continue
+        for entry in entries:
+            if entry.name.startswith("_") or entry.name.startswith("."):
+                continue
+            if entry.is_file() and entry.name.endswith(".py"):
+                yield "{}.{}".format(package_name, entry.name[:-3]), entry.path
+            elif entry.is_dir() and os.path.isfile(os.path.join(entry.path, "__init__.py")):
+                for module in _find_modules("{}.{}".format(package_name, entry.name), [entry.path]):
+                    yield module
+
+
+def _scan_module(source, path):
+    """
+    finds the command functions of a single source file
+    :param source: (bytes) the content of the source file
+    :param path: (string) the path of the source file
+    :return: (list) the tuples of the name, the docstring, whether it's a coroutine function, the fingerprint and the
+    documentation for the help of every command function
+    """
+    try:
+        tree = ast.parse(source, path)
+    except SyntaxError as exception:
+        # the error is raised, once a command of the module is called
+        print("the commands of {} can't be scanned: {}".format(path, exception), file=sys.stderr)
+        return []
+
+    exported = None
+    functions = []
+    for node in tree.body:
+        if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)):
+            functions.append(node)
+        elif isinstance(node, ast.Assign) and any(isinstance(target, ast.Name) and target.id == "__all__"
+                                                  for target in node.targets):
+            try:
+                exported = set(ast.literal_eval(node.value))
+            except ValueError:
+                # a computed '__all__' can't be evaluated statically, falling back to the public names
+                exported = None
+
+    commands = []
+    for node in functions:
+        if (exported is not None and node.name not in exported) or (exported is None and node.name.startswith("_")):
+            continue
+        # the dump doesn't contain the line numbers, so moving a function doesn't change its fingerprint
+        fingerprint = hashlib.sha1(ast.dump(node).encode()).hexdigest()
+        doc = ast.get_docstring(node)
+        commands.append((node.name, doc, isinstance(node, ast.AsyncFunctionDef), fingerprint,
+                         parse_docstring(doc or "")))
+    return commands
+
+
+def unload_changed_modules(files, previous_states):
+    """
+    removes the already imported submodules, whose source files have changed since the given states, from the
+    module cache, so that they are imported again by their commands
+    :param files: (dict) the module names by the paths of the source files
+    :param previous_states: (dict) the states of the source files by their paths, as returned by 'get_file_states'
+    :return: (list) the names of the removed modules
+    """
+    states = get_file_states(files)
+    unloaded = []
+    for path, module_name in files.items():
+        if module_name in sys.modules and states.get(path) != previous_states.get(path):
+            del sys.modules[module_name]
+            unloaded.append(module_name)
+    return unloaded
+
+
+def get_file_states(paths):
+    """
+    :param paths: (iterable) the paths of the files
+    :return: (dict) the modification time and the size of every file by its path, None for a file, that doesn't exist
+    """
+    states = {}
+    for path in paths:
+        try:
+            stat = os.stat(path)
+            states[path] = (stat.st_mtime_ns, stat.st_size)
+        except OSError:
+            states[path] = None
+    return states
+
+
+class IndexCache:
+    """
+    The commands found within the source files of a commands package, stored in a file, so the files only have to be
+    scanned again, once they have changed. A file is considered unchanged, if its modification time and size are the
+    same as when it was cached or, in case only the modification time differs (for example after a checkout), if the
+    hash of its content is the same.
+
+    :ivar path: (string) The path of the cache file
+    :ivar files: (dict) The cached states, hashes and commands by the paths of the source files
+    :ivar modified: (bool) Whether the cache has been changed since it was loaded
+    :ivar hits: (int) The amount of source files, whose commands have been taken from the cache
+    :ivar misses: (int) The amount of source files, that had to be scanned
+    """
+    def __init__(self, path):
+        self.path = path
+        self.files = {}
+        self.modified = False
+        self.hits = 0
+        self.misses = 0
+
+    def load(self):
+        """
+        loads the cache file, in case it exists and has the current format. The fingerprints of the commands depend on
+        the syntax tree of the python version, so a cache of another python version is ignored as well
+        :return: (IndexCache) the cache itself
+        """
+        try:
+            with open(self.path, "r", encoding="utf-8") as file:
+                data = json.load(file)
+            if data.get("format") == INDEX_CACHE_FORMAT and data.get("python") == _get_python_version():
+                self.files = data["files"]
+        except (OSError, ValueError, KeyError, AttributeError):
+            # a missing or broken cache file is simply rebuilt
+            self.files = {}
+        return self
+
+    def save(self):
+        """
+        writes the cache file, in case anything has changed. The file is replaced at once, so a console starting at
+        the same time never reads a partially written cache
+        :return: (void)
+        """
+        if not self.modified:
+            return
+        temporary_path = "{}.{}.tmp".format(self.path, os.getpid())
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            with open(temporary_path, "w", encoding="utf-8") as file:
+                json.dump({"format": INDEX_CACHE_FORMAT, "python": _get_python_version(), "files": self.files}, file)
+            os.replace(temporary_path, self.path)
+            self.modified = False
+        except OSError:
+            # the cache is only an optimization, a read only package works without it
+            pass
+
+    def get(self, path, state, source_hash=None):
+        """
+        :param path: (string) the path of the source file
+        :param state: (tuple) the modification time and size of the file
+        :param source_hash: (string) the hash of the content of the file, None to only compare the state
+        :return: (list) the cached commands of the file, None in case the file has changed
+        """
+        entry = self.files.get(path)
+        if entry is None or (tuple(entry["state"]) != tuple(state or ()) and entry["hash"] != source_hash):
+            if source_hash is not None:
+                self.misses += 1
+            return None
+        self.hits += 1
+        if tuple(entry["state"]) != tuple(state or ()):
+            # only the modification time has changed, updating it to avoid hashing the file next time
+            self.put(path, state, source_hash, entry["commands"])
+        return [(name, doc, is_coroutine, fingerprint, (summary, [tuple(parameter) for parameter in parameters],
+                                                        returns))
+                for name, doc, is_coroutine, fingerprint, (summary, parameters, returns) in entry["commands"]]
+
+    def put(self, path, state, source_hash, commands):
+        """
+        :param path: (string) the path of the source file
+        :param state: (tuple) the modification time and size of the file
+        :param source_hash: (string) the hash of the content of the file
+        :param commands: (list) the commands found within the file
+        :return: (void)
+        """
+        self.files[path] = {"state": list(state or ()), "hash": source_hash, "commands": commands}
+        self.modified = True
+
+    def retain(self, paths):
+        """
+        removes the files, that are no longer part of the package, from the cache
+        :param paths: (iterable) the paths of the source files of the package
+        :return: (void)
+        """
+        paths = set(paths)
+        for path in [path for path in self.files.keys() if path not in paths]:
+            del self.files[path]
+            self.modified = True
+
+
+def get_index_cache(package):
+    """
+    :param package: (module) the imported commands package
+    :return: (IndexCache) the loaded cache of the commands of the package
+    """
+    return IndexCache(os.path.join(package.__path__[0], "__pycache__", INDEX_CACHE_NAME)).load()
+
+
+def _get_python_version():
+    return "{}.{}".format(*sys.version_info[:2])
@@ -1,34 +1,103 @@
 __author__ = 'Jonas'
 from kivy.uix.gridlayout import GridLayout
+from kivy.uix.widget import WidgetMetaclass
 from kivy.uix.scrollview import ScrollView
 from kivy.uix.textinput import TextInput
 from kivy.uix.codeinput import CodeInput
 from kivy.uix.label import Label
+from kivy.uix.recycleview import RecycleView
+from kivy.uix.recycleview.views import RecycleDataViewBehavior
+from kivy.uix.recycleboxlayout import RecycleBoxLayout
 from kivy.clock import Clock
 
 
 from kivy.properties import NumericProperty
 from kivy.properties import StringProperty
 from kivy.properties import ObjectProperty
-from kivy.properties import ListProperty
 
-from pygments.formatters.html import HtmlFormatter
-from pygments.lexers.python import Python3Lexer
 import pygments.token as pygtoken
 from pygments.style import Style
 
+from pisole.channel import InputChannel
+from pisole.channel import OutputChannel
+from pisole.outputentry import OutputEntry
+from pisole.frontend import ConsoleFrontend
+from pisole.history import History
+from pisole.history import get_history
+
 import configparser
+import collections
+import traceback
+import itertools
 import inspect
 import time
+import abc
 import os
 
-config_parser = configparser.ConfigParser()
-config_parser.read("config.ini")
-font_directory = config_parser["Paths"]["font_dir"]
-from kivy.core.text import LabelBase
-LabelBase.register(name="Inconsolata",
-                   fn_regular=font_directory+"\\Inconsolata.ttf",
-                   fn_bold=font_directory+"\\Inconsolata_bold.ttf")
+# The maximum amount of characters of the consecutive prints to the same entry, that are joined into a single update of
+# the output window
+MAX_COALESCED_CHARACTERS = 65536
+
+# Whether the 'Inconsolata' font has already been registered with kivy
+_fonts_registered = False
+
+# The pygments styles by the names used for the 'style' parameter of the SimpleConsoleWidget, created on first use and
+# shared between all widgets
+_style_cache = {}
+
+# The lexer for the syntax highlighting, created on first use and shared between all input lines
+_lexer = None
+
+
+def register_fonts():
+    """
+    registers the 'Inconsolata' font, whose directory is read from the 'config.ini' file, with kivy. The registration
+    is only done once, when the first widget of this module is created, instead of when the module is imported
+    :return: (void)
+    """
+    global _fonts_registered
+    if _fonts_registered:
+        return
+    config_parser = configparser.ConfigParser()
+    config_parser.read("config.ini")
+    font_directory = config_parser["Paths"]["font_dir"]
+    from kivy.core.text import LabelBase
+    LabelBase.register(name="Inconsolata",
+                       fn_regular=font_directory+"\\Inconsolata.ttf",
+                       fn_bold=font_directory+"\\Inconsolata_bold.ttf")
+    _fonts_registered = True
+
+
+def get_style(style_name):
+    """
+    returns the pygments style for the syntax highlighting with the given name. The style objects are created only once
+    per name and shared between all widgets.
+    :param style_name: (string) one of 'green', 'orange' and 'monokai', all other names resulting in the green style
+    :return: (pygments.style.Style) the style
+    """
+    if style_name not in ("green", "orange", "monokai"):
+        style_name = "green"
+    if style_name not in _style_cache:
+        from pygments.formatters.html import HtmlFormatter
+        if style_name == "orange":
+            _style_cache[style_name] = HtmlFormatter(style=OrangeStyle).style
+        elif style_name == "monokai":
+            _style_cache[style_name] = HtmlFormatter(style="monokai").style
+        else:
+            _style_cache[style_name] = HtmlFormatter(style=GreenStyle).style
+    return _style_cache[style_name]
+
+
+def get_lexer():
+    """
+    returns the Python3Lexer for the syntax highlighting, which is created on first use and shared between all widgets
+    :return: (pygments.lexers.python.Python3Lexer) the lexer
+    """
+    global _lexer
+    if _lexer is None:
+        from pygments.lexers.python import Python3Lexer
+        _lexer = Python3Lexer()
+    return _lexer
 
 
 class OrangeStyle(Style):
@@ -69,7 +138,16 @@ class GreenStyle(Style):
     }
 
 
-class SimpleConsoleWidget(GridLayout):
+class ConsoleWidgetMetaclass(WidgetMetaclass, abc.ABCMeta):
+    """
+    The metaclass of the SimpleConsoleWidget, which is a kivy widget as well as a ConsoleFrontend. Python requires the
+    metaclass of a class to derive from the metaclasses of all its bases, which are the WidgetMetaclass of kivy and
+    the ABCMeta of the abstract ConsoleFrontend.
+    """
+    pass
+
+
+class SimpleConsoleWidget(GridLayout, ConsoleFrontend, metaclass=ConsoleWidgetMetaclass):
     """
     The SimpleConsoleWidget is a kivy Widget meant to emulate a terminal-like experience, consisting of a single
     GridLayout, containing a SimpleConsoleInputLine Widget at the bottom of the window, providing a single line of
@@ -86,15 +164,19 @@ class SimpleConsoleWidget(GridLayout):
     The output labels support and encourage the use of kivys markup language to generate colored text and BBCode style
     text anchors
 
+    The widget implements the ConsoleFrontend interface, so it can be used as the frontend of a ConsoleEngine.
+
     The input line offers the following additional features, aside from simple text entry:
     - Syntax Highlighting using the Python 3 Lexer, provided by the python module "pygments"(comes with kivy)
     - Multi line code input support. Upon pressing the TAB key the height of the widget will extend by one line and the
       - Pressing the TAB key, when the cursor is positioned right after a ":" will result in a automatic indent of the
         next line. The widget will also keep track of the current indent level, continueing it with every additional new
         line, until the indent is explicitly removed
-    - A cache, storing all previously entered commands, that can be scrolled through by pressing the UP and DOWN key,
-      with the input line focused, changing the input lines text to be the cached command (a command that has been begun
-      will not get lost, but instead be always the latest item of the cache)
+    - A history, storing all previously entered commands, that can be scrolled through by pressing the UP and DOWN
+      key, with the input line focused, changing the input lines text to be the previous command. The history is
+      persisted to the 'history_file' (on default '.pisole_history' within the project folder), keeping the
+      'history_size' most recent distinct commands. The consoles of an application using the same file share a
+      single history
 
     :ivar style: (kivy.ObjectProperty) The pygments style object of which style to be used for syntax highlighting
 
@@ -102,6 +184,22 @@ class SimpleConsoleWidget(GridLayout):
     supposed to have. The higher the value, the blacker the background. Ranges from 0 to 1
 
     :ivar prompt: (kivy.StringProperty) The string, which is to be used as the command prompt of the console
+
+    :ivar output_window: (SimpleConsoleOutput) (RecycleConsoleOutput) The widget displaying the printed output. The
+    'output' parameter of the constructor decides which one is used: 'simple' for the SimpleConsoleOutput, that
+    creates one label per entry or 'recycle' for the RecycleConsoleOutput, that only renders the visible entries
+
+    :ivar input_channel: (InputChannel) The thread safe FIFO channel, in which the entered inputs are buffered until
+    they are fetched by the thread executing the commands
+
+    :ivar output_frame_budget: (kivy.NumericProperty) The amount of seconds per frame, that may be spent on writing the
+    buffered prints onto the output window. The remaining prints are written in the next frame
+
+    :ivar output_channel: (OutputChannel) The buffer of prints, that haven't been written onto the output window
+    yet. Contains tuples (entry id, string), a string of None signaling the creation of a new entry. Prints are put
+    into the channel by any thread, but only the ui thread consumes them
+
+    :ivar history: (History) The history of the entered commands, shared with the input line
     """
     # the style of syntax Highlighting
     style = ObjectProperty()
@@ -112,17 +210,18 @@ class SimpleConsoleWidget(GridLayout):
     # the prompt of the console
     prompt = StringProperty("")
 
-    # the list in which the entered input is being stored
-    entered_strings_list = ListProperty([])
-
     # the font size
     font_size = NumericProperty(13)
 
-    print_buffer = ListProperty([])
+    # the time per frame, that can be spent on writing the buffered prints onto the output window
+    output_frame_budget = NumericProperty(0.008)
 
-    def __init__(self, prompt=">>>", background=1, style="orange", font_size=13, **kwargs):
+    def __init__(self, prompt=">>>", background=1, style="orange", font_size=13, max_entries=None,
+                 max_characters=None, output="simple", history_file=".pisole_history", history_size=10000,
+                 **kwargs):
         # initializing the super class FloatLayout
         super(SimpleConsoleWidget, self).__init__()
+        register_fonts()
         self.cols = 1
         self.padding = 5
         self.spacing = 10
@@ -132,27 +231,47 @@ class SimpleConsoleWidget(GridLayout):
         self.prompt = prompt
         self.background_shade = background
 
+        # the channel in which the entered input is being stored until the console thread fetches it
+        self.input_channel = InputChannel()
+
         # Setting the syntax Highlighting Style for the terminal input, dependant on the style string passed
         # on default "green", corresponding to GreenStyle
-        if style == "green":
-            self.style = HtmlFormatter(style=GreenStyle).style
-        elif style == "orange":
-            self.style = HtmlFormatter(style=OrangeStyle).style
-        elif style == "monokai":
-            self.style = HtmlFormatter(style="monokai").style
-        else:
-            self.style = HtmlFormatter(style=GreenStyle).style
+        self.style = get_style(style)
+
+        # the buffer for the prints, that is written onto the output window once every frame. It is not a kivy
+        # property, as the prints are issued by other threads than the ui thread
+        self.output_channel = OutputChannel()
 
-        # creating the output component of the condole
-        self.output_window = SimpleConsoleOutput(font_size=self.font_size)
+        # the counter providing the ids for the entries of the output window and the id of the entry, that is
+        # currently printed to on default
+        self._entry_counter = itertools.count()
+        self.current_entry = None
+
+        # creating the output component of the condole. The recycle output only renders the visible entries and is
+        # meant for very long histories
+        if output == "recycle":
+            output_class = RecycleConsoleOutput
+        else:
+            output_class = SimpleConsoleOutput
+        # the scrollback limits default to the ones of the output class, as they differ greatly
+        output_kwargs = {"font_size": self.font_size}
+        if max_entries is not None:
+            output_kwargs["max_entries"] = max_entries
+        if max_characters is not None:
+            output_kwargs["max_characters"] = max_characters
+        self.output_window = output_class(**output_kwargs)
         self.output_window.size_hint = (1, 0.9)
         self.add_widget(self.output_window)
 
         # creating the input line of the console
-        self.input_line = SimpleConsoleInputLine(prompt=prompt, font_size=self.font_size)
+        # the history of the entered commands is persisted within the project folder, None keeping it in memory only
+        # the consoles persisting to the same file share one history
+        self.history = get_history(history_file, max_size=history_size)
+        self.input_line = SimpleConsoleInputLine(prompt=prompt, font_size=self.font_size, history=self.history)
         self.input_line.background_shade = self.background_shade - 0.1
         self.input_line.style = self.style
         self.input_line.bind(enter=self.on_text_validate)
+        self.input_line.bind(cancel=self.on_cancel)
         self.add_widget(self.input_line)
 
         # This is apparently pretty fucking important, its the function that checks if there are any print messages in
@@ -168,82 +287,115 @@ class SimpleConsoleWidget(GridLayout):
         :returns: (void)
         """
         entered_string = self.input_line.get_input()
-        self.entered_strings_list.append(entered_string)
+        # putting the string into the channel directly wakes up the console thread in case it is waiting for input
+        self.input_channel.put(entered_string)
+
+    def on_cancel(self, *args):
+        """
+        the callback function, that has been bound to the 'cancel' variable of the input line and thus is called
+        whenever the cancel key (Ctrl-C) is pressed within the input line, cancelling the command currently executed
+        :returns: (void)
+        """
+        self.request_cancel()
 
     def write_output(self, *args):
-        try:
-            if len(self.print_buffer) > 0:
-                self.output_window._print(self.print_buffer.pop(0))
-        except:
-            pass
+        """
+        the callback, that is scheduled once every frame, to write the buffered prints onto the output window. As many
+        prints as fit into the 'output_frame_budget' are written per frame, consecutive prints to the same entry being
+        joined into a single text update of the according label.
+        :returns: (void)
+        """
+        deadline = time.perf_counter() + self.output_frame_budget
+        output_channel = self.output_channel
+        while len(output_channel) > 0 and time.perf_counter() < deadline:
+            entry_id, string = output_channel.get()
+            if string is None:
+                self.output_window.new_label(entry_id)
+                continue
+
+            # collecting all the directly following prints to the same entry, so the label text has to be updated
+            # and rendered just once. A thread printing without pause would keep this loop going, so the collection
+            # stops at the deadline of the frame as well as at the maximum size of a single update
+            strings = [string]
+            length = len(string)
+            following = output_channel.peek()
+            while (following is not None and following[0] == entry_id and following[1] is not None and
+                   length < MAX_COALESCED_CHARACTERS and time.perf_counter() < deadline):
+                strings.append(output_channel.get()[1])
+                length += len(strings[-1])
+                following = output_channel.peek()
+            try:
+                self.output_window._print_chunks(strings, entry_id)
+            except Exception:
+                traceback.print_exc()
 
-    def is_input_available(self):
+    def get_output_backlog(self):
         """
-        returns whether or not there are any entered strings available in the list, that buffers the entered texts until
-        used
-        :return: (bool) the status od the input buffering list
+        returns the amount of prints, that have been issued, but not yet written onto the output window. A growing
+        backlog means, that the prints are issued faster than the ui is able to display them
+        :return: (int) the amount of buffered prints
         """
-        return len(self.entered_strings_list) > 0
+        return len(self.output_channel)
 
-    def _pop_input_at_index(self, index):
+    def is_input_available(self):
         """
-        pops and then returns the item of the entered-inputs-list at the given index, if there is no item at the given
-        index returns None instead
-        :return:(string) the user entered string
+        returns whether or not there are any entered strings available in the channel, that buffers the entered texts
+        until used
+        :return: (bool) the status of the input buffering channel
         """
-        try:
-            return self.entered_strings_list.pop(index)
-        except IndexError:
-            return None
+        return len(self.input_channel) > 0
 
-    def pop_latest_input(self, blocking=False):
+    def pop_latest_input(self, blocking=False, timeout=None):
         """
-        returns the buffered input, that has been entered last and removes it from the list
+        returns the buffered input, that has been entered last and removes it from the channel
         :param blocking: (bool) whether or not the method is supposed to block the flow of the program calling or not.
         If False: the method will return None if there was no item to return.
+        :param timeout: (float) the maximum amount of seconds to block, None meaning to wait forever
         :return:(string) the user entered string
         """
-        if blocking:
-            while not self.is_input_available():
-                time.sleep(0.0001)
-        return self._pop_input_at_index(-1)
+        return self.input_channel.get_latest(blocking=blocking, timeout=timeout)
 
-    def pop_first_input(self, blocking=False):
+    def pop_first_input(self, blocking=False, timeout=None):
         """
-        returns the buffered input, that has been entered first and removes it from the list
+        returns the buffered input, that has been entered first and removes it from the channel
         :param blocking: (bool) whether or not the method is supposed to block the flow of the program calling or not.
         If False: the method will return None if there was no item to return.
+        :param timeout: (float) the maximum amount of seconds to block, None meaning to wait forever
         :return:(string) the user entered string
         """
-        if blocking:
-            while not self.is_input_available():
-                time.sleep(0.0001)
-        return self._pop_input_at_index(0)
+        return self.input_channel.get(blocking=blocking, timeout=timeout)
 
     def new_label(self):
         """
         Since the output window, displaying the printed text, is not only structured by character layouts such as new
         lines and indents within a single Label, but rather consists of multiple Labels to encapsulate logically
         connected bundles of strings/prints, this method creates a new such Label, onto which the following prints are
-        written to.
+        written to. The label itself is created by the ui thread, once the preceding prints have been written.
+        :return: (int) the id of the new entry, which can be used to print onto this label explicitly
         """
-        self.output_window.new_label()
+        entry_id = next(self._entry_counter)
+        self.output_channel.put((entry_id, None))
+        self.current_entry = entry_id
+        return entry_id
 
     def new_command(self, command_string):
         """
         Since the output window, displaying the printed text, is not only structured by character layouts such as new
         lines and indents within a single Label, but rather consists of multiple Labels to encapsulate logically
         connected bundles of strings/prints, this method creates a new such Label, onto which the following prints are
-        written to.
+        written to. The executed command string is printed as the header of the new label.
+        :param command_string: (string) the command, that is being executed
+        :return: (int) the id of the new entry
         """
-        self.output_window.new_label()
+        entry_id = self.new_label()
         self.println(''.join(["[color=808080][EXECUTING]\n", command_string,
                                              "\n[/color]"]))
+        return entry_id
 
     def input_prompt(self, prompt_string, expected_data_type):
         # printing the input prompt
         self.println(prompt_string)
-        self.pop_latest_input(blocking=True)
+        self.pop_first_input(blocking=True)
         """
         # rebinding the enter event of the input line, leading the next command to append to a local variable
         input_buffer_list = []
@@ -273,11 +425,31 @@ class SimpleConsoleWidget(GridLayout):
     def get_font_size(self):
         return self.font_size
 
-    def print(self, string):
-        self.print_buffer.append(string)
+    def print_message(self, message, entry_id=None):
+        """
+        prints the given message, colored by the kivy markup tags
+        :param message: (message.Message) the message of a command
+        :param entry_id: (int) the id of the entry to print to, None meaning the current entry
+        :return: (void)
+        """
+        self.println(message.get_kivy(), entry_id)
+
+    def get_width(self):
+        return self.output_window.width
+
+    def print(self, string, entry_id=None):
+        """
+        buffers the string to be printed onto the output window with the next frame
+        :param string: (string) the content to be printed
+        :param entry_id: (int) the id of the entry to print to, None meaning the current entry
+        :return: (void)
+        """
+        if entry_id is None:
+            entry_id = self.current_entry
+        self.output_channel.put((entry_id, string))
 
-    def println(self, string):
-        self.print(string+"\n")
+    def println(self, string, entry_id=None):
+        self.print(string+"\n", entry_id)
 
 
 class SimpleConsoleComponent(CodeInput):
@@ -296,8 +468,9 @@ class SimpleConsoleComponent(CodeInput):
     def __init__(self, background_shade=0.9, **kwargs):
         # Initializing the super class CodeInput
         super(SimpleConsoleComponent, self).__init__()
-        # Setting the Python3Lexer for Syntax Highlighting
-        self.lexer = Python3Lexer()
+        register_fonts()
+        # Setting the shared Python3Lexer for Syntax Highlighting
+        self.lexer = get_lexer()
 
         # reversing the value of the background shade, as it is meant to indicate how black the background should be,
         # but in kivy a lesser value means blacker
@@ -328,19 +501,25 @@ class SimpleConsoleInputLine(SimpleConsoleComponent):
       - Pressing the TAB key, when the cursor is positioned right after a ":" will result in a automatic indent of the
         next line. The widget will also keep track of the current indent level, continueing it with every additional new
         line, until the indent is explicitly removed
-    - A cache, storing all previously entered commands, that can be scrolled through by pressing the UP and DOWN key,
-      with the input line focused, changing the input lines text to be the cached command (a command that has been begun
-      will not get lost, but instead be always the latest item of the cache)
+    - A history, storing all previously entered commands, that can be scrolled through by pressing the UP and DOWN
+      key, with the input line focused, changing the input lines text to be the previous command (a command that has
+      been begun will not get lost, but instead be restored when scrolling down past the most recent command)
+    - An incremental reverse search through the history: after pressing CTRL-R, the most recent command containing the
+      typed text is shown, pressing CTRL-R again steps to the next older match. Any other key takes over the match into
+      the input line, ESCAPE restores the previous text
 
     :ivar max_lines: (kivy.NumericProperty) The maximum amount of lines supported by multiline commands
 
     :ivar line_count: (kivy.NumericProperty) The counter to keep track of the amount of command lines
 
-    :ivar previous_command_list: (kivy.ListProperty) The list containing the strings of every previous command/
-    validated/entered input of the user
+    :ivar history: (History) The history of all the previous commands/ validated/entered inputs of the user
+
+    :ivar history_position: (int) The position of the command within the history, that the users selection is
+    currently located at. changed by pressing UP and DOWN arrow keys, None while the user is writing a new command
+
+    :ivar draft: (string) The text of the command begun by the user, restored when scrolling back down
 
-    :ivar previous_command_selection_index: (kivy.NumericProperty) The variable keeping track of the index, at which
-    the users selection is located within the previous_command_list. changed by pressing UP and DOWN arrow keys
+    :ivar search_query: (string) The text searched for within the history, None while not searching
 
     :ivar indent_count: (kivy.NumericProperty) The counter keeping track of the indent level, at which the users
     multi line command is currently positioned
@@ -355,11 +534,6 @@ class SimpleConsoleInputLine(SimpleConsoleComponent):
     max_lines = NumericProperty(12)
     line_count = NumericProperty(0)
 
-    # The Cache for previous commands/ validated inputs and the pointer for the index at which the current selection
-    # is located relative within the list
-    previous_command_list = ListProperty([""])
-    previous_command_selection_index = NumericProperty(0)
-
     # a counting value to keep track of the current indent level of a multiline input. Has to be reset after validate
     indent_count = NumericProperty(0)
 
@@ -367,11 +541,23 @@ class SimpleConsoleInputLine(SimpleConsoleComponent):
     # mainly serving as the signal for input validation on the ConsoleWidget level
     enter = NumericProperty(0)
 
+    # A counter for the amount of times the cancel key combination (Ctrl-C) has been pressed. Serving as the signal to
+    # cancel the running command on the ConsoleWidget level
+    cancel = NumericProperty(0)
+
     # The prompt for the console input
     prompt = StringProperty("")
 
-    def __init__(self, prompt=">>>", indent_length=4, font_size=13, **kwargs):
+    def __init__(self, prompt=">>>", indent_length=4, font_size=13, history=None, **kwargs):
         super(SimpleConsoleInputLine, self).__init__(multline=False)
+        # The history of the previous commands/ validated inputs and the position at which the current selection is
+        # located within it
+        self.history = history if history is not None else History()
+        self.history_position = None
+        self.draft = ""
+        self.search_query = None
+        self._search_match = None
+        self._text_before_search = ""
         # setting the height initially to the Font's size and some extra pixels for the borders
         self.height = self.font_size + 14
         # setting the height hint to None, so it is being recessive, when it comes to space distribution, letting the
@@ -419,6 +605,10 @@ class SimpleConsoleInputLine(SimpleConsoleComponent):
         :param from_undo:
         :return:
         """
+        # while searching through the history, the entered characters extend the search query
+        if self.search_query is not None:
+            self._update_search(self.search_query + substring)
+            return ""
         # Not letting any text be inserted while the cursor is within the prompt string
         if not(self.cursor_row == 0 and self.cursor_col < len(self.prompt)):
             # protecting the command prompt from getting deleted
@@ -436,7 +626,11 @@ class SimpleConsoleInputLine(SimpleConsoleComponent):
         - B_SPACE:  simply deleting the last character. Detects whole indent blocks and deletes them in one go.
                     Deletes linebreaks
         - ENTER:    Increments the enter counter, causing the text validate event/callback
+        - CTRL-C:   Copies the selected text or, without a selection, increments the cancel counter, causing the
+                    running command to be cancelled
         - ARROWS:   Switches the text between the previous commands
+        - CTRL-R:   Searches the history for the most recent command containing the typed text, respectively the next
+                    older one, when already searching
         :param window:
         :param keycode: Keycode[1] is the string format of the passed string
         :param text:
@@ -445,6 +639,11 @@ class SimpleConsoleInputLine(SimpleConsoleComponent):
         """
         # Keycode[1] is the string format of the passed string
 
+        # while searching through the history the keys control the search, the keys ending the search are then
+        # processed as usual
+        if self.search_query is not None and self._on_search_key(keycode, modifiers):
+            return True
+
         # Inside the InputLine environment a tab press signals the users need to write a multiline command. Therefore
         # a newline character will be appended to the text and the line count will be incremented by one. In case the
         # tab is pressed, right after a ':' this probably means, the user wants to begin a indented code segment in the
@@ -501,29 +700,33 @@ class SimpleConsoleInputLine(SimpleConsoleComponent):
                     self.text = self.prompt
 
         elif keycode[1] == "up":
-
-            if len(self.previous_command_list) > self.previous_command_selection_index + 1:
-                self.previous_command_selection_index += 1
-                self.text = self.previous_command_list[self.previous_command_selection_index]
-                # adjusting the height of the widget to the height of the previous command
-                self._adjust_height_to_text()
-                # setting up the right cursor position
-                self.scroll_x = 0
-                self.do_cursor_movement("cursor_home")
-                for i in range(len(self.prompt)):
-                    self.do_cursor_movement("cursor_right")
+            previous = self.history.previous(self.history_position)
+            if previous is not None:
+                self.history_position, command = previous
+                self._show_command(command)
 
         elif keycode[1] == "down":
-            if self.previous_command_selection_index > 0:
-                self.previous_command_selection_index -= 1
-                self.text = self.previous_command_list[self.previous_command_selection_index]
-                # adjusting the height of the widget to the height of the previous command
-                self._adjust_height_to_text()
-                # setting up the right cursor position
-                self.scroll_x = 0
-                self.do_cursor_movement("cursor_home")
-                for i in range(len(self.prompt)):
-                    self.do_cursor_movement("cursor_right")
+            if self.history_position is not None:
+                following = self.history.next(self.history_position)
+                if following is not None:
+                    self.history_position, command = following
+                    self._show_command(command)
+                else:
+                    # scrolling down past the most recent command restores the command begun by the user
+                    self.history_position = None
+                    self._show_text(self.draft)
+
+        # Ctrl-C cancels the running command, unless there is text selected to be copied
+        elif keycode[1] == "c" and "ctrl" in modifiers:
+            if len(self.selection_text) > 0:
+                self.copy()
+            else:
+                self.cancel += 1
+
+        # Ctrl-R starts the reverse search through the history
+        elif keycode[1] == "r" and "ctrl" in modifiers:
+            self._text_before_search = self.text
+            self._update_search("")
 
         # Moving the cursor around with the arrow keys
         elif keycode[1] == "left" or keycode[1] == "right":
@@ -534,14 +737,13 @@ class SimpleConsoleInputLine(SimpleConsoleComponent):
     def on_text(self, *args):
         """
         Callback for text change event.
-        - Updates the first element of the previous command list to be the text currently in the input line.
+        - Saves the text currently in the input line as the draft, while the user isn't scrolling through the history
         :param args:
         :return:
         """
-        # Updating the first element of the previous command list to be the current input, so it will be cached saved
-        # in case the user decides he wants to continue writing it
-        if self.previous_command_selection_index == 0:
-            self.previous_command_list[0] = self.text
+        # Saving the current input, so it will be restored in case the user decides he wants to continue writing it
+        if self.history_position is None and self.search_query is None:
+            self.draft = self.text
 
     def on_enter(self, *args):
         """
@@ -549,28 +751,91 @@ class SimpleConsoleInputLine(SimpleConsoleComponent):
         the user pressing the 'Enter' key, therefore manly signaling the main ConsoleWidget, that the command input
         can now be fetched to be processed further.
         The contents of this method are always executed before extern bound callbacks and include:
-        - The just finished entered command will be added to the cache of previous commands
+        - The just finished entered command will be added to the history of previous commands
         - All to one temporary input session bound variables like the line count(therefore also the widget height),
-          the previous command selection index and the indent level are being reset
+          the history position and the indent level are being reset
         :param args: dunno
         :return: (void)
         """
-        # adding the entered input as the second element of the previous commands list, if it isn't already in there
-        # Preventing multiple command issues to jam the cache list
-        if self.text not in self.previous_command_list[1:]:
-            self.previous_command_list.insert(1, self.text)
-        else:
-            # This is implements behaviour, that if a command was entered for the second, third... etc time, it will
-            # move to the top of the list instead of staying in its original position
-            self.previous_command_list.remove(self.text)
-            self.previous_command_list.insert(1, self.text)
+        # adding the entered input as the most recent command of the history. A command entered for the second,
+        # third... etc time moves to the top instead of staying in its original position, without jamming the history
+        self.history.add(self.get_input())
 
         # resetting all temporary values of the input line
-        self.previous_command_selection_index = 0
+        self.history_position = None
         self.height -= self.font_size * self.line_count
         self.line_count = 0
         self.indent_count = 0
 
+    def _on_search_key(self, keycode, modifiers):
+        """
+        handles a key pressed while searching through the history
+        :param keycode: Keycode[1] is the string format of the passed string
+        :param modifiers:
+        :return: (bool) whether the key has been handled, False for the keys ending the search, which are then
+        processed as usual
+        """
+        if keycode[1] == "r" and "ctrl" in modifiers:
+            # stepping to the next older match, staying at the oldest one
+            if self._search_match is not None:
+                self._update_search(self.search_query, before=self._search_match[0])
+        elif keycode[1] == "backspace":
+            self._update_search(self.search_query[:-1])
+        elif keycode[1] == "escape" or (keycode[1] == "c" and "ctrl" in modifiers):
+            # cancelling the search, restoring the text from before
+            self.search_query = None
+            self._show_text(self._text_before_search)
+        elif keycode[1] in ("enter", "tab", "up", "down", "left", "right"):
+            # taking over the match into the input line
+            self.search_query = None
+            if self._search_match is not None:
+                self.history_position, command = self._search_match
+                self._show_command(command)
+            else:
+                self._show_text(self._text_before_search)
+            return False
+        return True
+
+    def _update_search(self, query, before=None):
+        """
+        searches the history for the most recent command containing the query and shows it within the input line
+        :param query: (string) the text to search for
+        :param before: (int) the position of the previous match, to search for an older one. None meaning to search
+        the whole history
+        :return: (void)
+        """
+        self.search_query = query
+        if query == "":
+            self._search_match = None
+        else:
+            match = self.history.search(query, before)
+            # when there is no older match, the previous one stays
+            if match is not None or before is None:
+                self._search_match = match
+        command = self._search_match[1] if self._search_match is not None else ""
+        self.text = "(search)'{}': {}".format(query, command)
+        self._adjust_height_to_text()
+
+    def _show_command(self, command):
+        """
+        replaces the text of the input line with the given command from the history, adding the prompts
+        :param command: (string) the command without the prompts, as returned by 'get_input'
+        :return: (void)
+        """
+        lines = command.split("\n")
+        # 'get_input' leaves a whitespace at the beginning of the continued lines, completing the '>> ' prompt
+        self._show_text(self.prompt + lines[0] + ''.join("\n>> " + line for line in lines[1:]))
+
+    def _show_text(self, text):
+        self.text = text
+        # adjusting the height of the widget to the height of the previous command
+        self._adjust_height_to_text()
+        # setting up the right cursor position
+        self.scroll_x = 0
+        self.do_cursor_movement("cursor_home")
+        for i in range(len(self.prompt)):
+            self.do_cursor_movement("cursor_right")
+
     def _adjust_height_to_text(self):
         """
         This function adjusts the height variable of the widget to match the height of the text in the text variable
@@ -648,13 +913,31 @@ class SimpleConsoleOutput(ScrollView):
 
     The widget extends the ScrollView class contains a Gridlayout as only child widget (since the ScrollView cant
     consist of more than one child). Every time the output window is issued to print a logically connected bundle of
-    strings (such as a new command being issued), a new MultiLineLabel will be created and added to the internal
-    'labels' list. Text will by default only be printed onto the last item of this list, the active label.
+    strings (such as a new command being issued), a new OutputEntry will be created and added to the internal
+    'output_entries' list. Text will by default only be printed onto the last item of this list, the active entry.
+    The text of an entry is split into blocks of lines (see OutputEntry) and every block is displayed by its own
+    MultiLineLabel, so a print only re-renders the label of the block it has been appended to.
+
+    The scrollback of the output window is limited by the amount of entries as well as the total amount of characters
+    displayed. Once either of the limits is exceeded, the oldest entries are removed from the window. The labels of
+    removed entries are kept in a pool and reused for the following blocks, instead of creating new label widgets.
+
+    :ivar max_entries: (kivy.NumericProperty) The maximum amount of entries displayed at the same time
+
+    :ivar max_characters: (kivy.NumericProperty) The maximum amount of characters displayed by all labels together
+
+    :ivar block_lines: (int) The amount of lines displayed by a single label, before the next one is started
+
+    :ivar character_count: (int) The amount of characters currently displayed by all the labels
+
+    :ivar label_pool_size: (int) The maximum amount of removed labels kept for reuse
     """
-    labels = ListProperty([])
+    max_entries = NumericProperty(1000)
+    max_characters = NumericProperty(2000000)
 
-    def __init__(self, font_size=13,**kwargs):
+    def __init__(self, font_size=13, max_entries=1000, max_characters=2000000, block_lines=200, **kwargs):
         super(SimpleConsoleOutput, self).__init__()
+        register_fonts()
         # Creating the Gridlayout, that'll later contain all the labels, representing the output of the different
         # commands, because the ScrollView itself can only contain one child widget, which will be the layout
         self.grid_layout = GridLayout(cols=1, padding=2, spacing=-2)
@@ -666,32 +949,114 @@ class SimpleConsoleOutput(ScrollView):
         self.add_widget(self.grid_layout)
         self.font_size = font_size
 
-    def _print(self, string):
+        # the entries in the order they were added and the entries by their ids. The entries are kept in a deque, as
+        # the oldest entries are removed from the front once the scrollback limit has been reached
+        self.output_entries = collections.deque()
+        self.entries = {}
+
+        self.max_entries = max_entries
+        self.max_characters = max_characters
+        self.block_lines = block_lines
+        self.character_count = 0
+
+        # the labels, that have been removed from the window and can be reused
+        self.label_pool_size = 32
+        self._label_pool = []
+
+    def _print(self, string, entry_id=None):
         """
-        adds the text given by 'string' to the text variable of the currently active label of the layout, which is the
-        the last label added
+        adds the text given by 'string' to the entry with the given id or in case no entry is given, to the currently
+        active entry of the layout, which is the the last entry added
         :param string: (string) the content to be printed onto the widget
+        :param entry_id: (int) the id of the entry to print to
         :return: (void)
         """
-        self.labels[-1].text += string
-        self.labels[-1].texture_update()
+        self._print_chunks([string], entry_id)
 
-    def _println(self, string):
+    def _print_chunks(self, chunks, entry_id=None):
+        """
+        adds the given strings to the entry with the given id or in case no entry is given, to the currently active
+        entry. Only the labels of the blocks, that have been changed by the new strings are rendered again. The strings
+        for an entry, that has already been removed from the history, are dropped.
+        :param chunks: (list) the strings to be printed onto the widget
+        :param entry_id: (int) the id of the entry to print to
+        :return: (void)
+        """
+        if entry_id in self.entries:
+            entry = self.entries[entry_id]
+        elif entry_id is not None and len(self.output_entries) > 0:
+            # the entry has already been removed from the history. Its late prints (of a background job for example)
+            # are dropped, as appending them to the most recent entry would attribute them to another command
+            return
+        else:
+            if len(self.output_entries) == 0:
+                self.new_label(entry_id)
+            entry = self.output_entries[-1]
+
+        first_changed = entry.extend(chunks)
+        for index in range(first_changed, len(entry)):
+            if index == len(entry.views):
+                self._add_block_label(entry)
+            label = entry.views[index]
+            label.text = entry.get_block_text(index)
+            label.texture_update()
+
+        self.character_count += sum(len(chunk) for chunk in chunks)
+        if self.character_count > self.max_characters:
+            self._evict_entries()
+
+    def _println(self, string, entry_id=None):
         """
         calls the '_print' method, but adds a newline character to the end of the content string
         :param string: (string) the content to be printed onto the next line of the widget
+        :param entry_id: (int) the id of the entry to print to
         :return: (void)
         """
-        self._print(string + "\n")
+        self._print(string + "\n", entry_id)
 
-    def new_label(self):
+    def new_label(self, entry_id=None):
         """
         Since the output widget for text display is not only being structured by character layout such as newlines or
-        indents, but also by separating every logically connected unit of string prints into a different label, this
-        function creates a new such label, to which every following text is being printed on. The Labels reference will
-        be stored inside the 'labels' list.
+        indents, but also by separating every logically connected unit of string prints into a different entry, this
+        function creates a new such entry, to which every following text is being printed on. The entry will be stored
+        inside the 'output_entries' list and under the given entry id inside the 'entries' dict.
+        :param entry_id: (int) the id under which the entry can be addressed by later prints
+        :return: (void)
+        """
+        entry = OutputEntry(entry_id, block_lines=self.block_lines)
+        self._add_block_label(entry)
+        self.output_entries.append(entry)
+        if entry_id is not None:
+            self.entries[entry_id] = entry
+
+        if len(self.output_entries) > self.max_entries:
+            self._evict_entries()
+
+    def _add_block_label(self, entry):
+        """
+        adds a label for the next block of the given entry to the layout, right below the last label of the entry
+        :param entry: (OutputEntry) the entry
         :return: (void)
         """
+        # reusing one of the previously removed labels if possible, as creating a new widget is expensive
+        if len(self._label_pool) > 0:
+            label = self._label_pool.pop()
+        else:
+            label = self._create_label()
+
+        if len(entry.views) == 0 or entry.views[-1] is self.grid_layout.children[0]:
+            self.grid_layout.add_widget(label)
+        else:
+            # the children of a layout are stored in reverse order, so inserting the label at the index of the last
+            # label of the entry displays it right below that label
+            self.grid_layout.add_widget(label, index=self.grid_layout.children.index(entry.views[-1]))
+        entry.views.append(label)
+
+    def _create_label(self):
+        """
+        creates a new label widget, configured to display the output of the console
+        :return: (MultiLineLabel) the new label
+        """
         label = MultiLineLabel(markup=True)
         label.size_hint_y = None
         label.size_hint_x = 1
@@ -707,14 +1072,32 @@ class SimpleConsoleOutput(ScrollView):
         # For information on how to add custom fonts visit 'http://cheparev.com/kivy-connecting-font/'
         label.font_name = "Inconsolata"
         label.font_size = self.font_size
+        return label
 
-        self.grid_layout.add_widget(label)
-        self.labels.append(label)
+    def _evict_entries(self):
+        """
+        removes the oldest entries from the window, until the amount of entries as well as the amount of characters
+        are within the scrollback limits again. The active entry is never removed. The labels of the removed entries
+        are cleared and kept in the pool for reuse
+        :return: (void)
+        """
+        while len(self.output_entries) > 1 and (len(self.output_entries) > self.max_entries or
+                                                self.character_count > self.max_characters):
+            entry = self.output_entries.popleft()
+            self.character_count -= entry.character_count
+            if entry.entry_id is not None:
+                self.entries.pop(entry.entry_id, None)
+
+            for label in entry.views:
+                self.grid_layout.remove_widget(label)
+                if len(self._label_pool) < self.label_pool_size:
+                    label.text = ""
+                    self._label_pool.append(label)
 
     def input_prompt_issued(self):
-        if len(self.labels) >= 1:
-            lines_last_label = self.labels[-1].text.split("\n")
-            if len(lines_last_label) >= 1:
+        if len(self.output_entries) >= 1:
+            lines_last_label = self.output_entries[-1].views[-1].text.split("\n")
+            if len(lines_last_label) >= 2:
                 return "[INPUT]" in lines_last_label[-2] or "[IN]" in lines_last_label[-2]
         return False
 
@@ -748,4 +1131,230 @@ class MultiLineLabel(Label):
             self.width  = self.texture_size[0]
 
     def on_text_changed(self, widget, text):
-        self.on_size(self, self.size)
\ No newline at end of file
+        self.on_size(self, self.size)
+
+
+class RecycleConsoleOutput(RecycleView):
+    """
+    An alternative to the SimpleConsoleOutput widget, based on the kivy RecycleView, meant for consoles displaying a
+    very long history of output. The printed text is not stored within the label widgets, but in the 'data' list of the
+    RecycleView, with one dict per block of an OutputEntry containing its text and size. Only the blocks currently
+    visible in the window are displayed by label widgets (RecycleConsoleLabel), which are reused for other blocks while
+    scrolling. Therefore only the visible blocks own a texture and a resize of the window only reflows the visible
+    blocks, the sizes of the others being updated once they become visible again.
+
+    The widget offers the same methods as the SimpleConsoleOutput, so both can be used by the SimpleConsoleWidget.
+
+    :ivar max_entries: (kivy.NumericProperty) The maximum amount of entries kept in the history
+
+    :ivar max_characters: (kivy.NumericProperty) The maximum amount of characters kept by all entries together
+
+    :ivar block_lines: (int) The amount of lines displayed by a single label, before the next one is started
+
+    :ivar character_count: (int) The amount of characters currently kept by all the entries
+    """
+    max_entries = NumericProperty(100000)
+    max_characters = NumericProperty(20000000)
+
+    def __init__(self, font_size=13, max_entries=100000, max_characters=20000000, block_lines=200, **kwargs):
+        super(RecycleConsoleOutput, self).__init__()
+        register_fonts()
+        self.font_size = font_size
+        self.max_entries = max_entries
+        self.max_characters = max_characters
+        self.block_lines = block_lines
+        self.character_count = 0
+
+        # The layout positioning the visible labels. The sizes of the blocks are read from the 'size' key of their
+        # dicts, the blocks, that haven't been displayed yet, having the default size of a single line
+        layout = RecycleBoxLayout(orientation="vertical", padding=2, spacing=-2)
+        layout.size_hint_y = None
+        layout.default_size = (None, self.font_size + 10)
+        layout.default_size_hint = (1, None)
+        layout.key_size = "size"
+        layout.bind(minimum_height=layout.setter("height"))
+        self.add_widget(layout)
+        self.viewclass = RecycleConsoleLabel
+
+        # the entries in the order they were added and the entries by their ids. The views of an entry are the dicts
+        # of its blocks within the data list
+        self.output_entries = collections.deque()
+        self.entries = {}
+        # the amount of blocks removed from the front of the data list. The first rows of the entries count the blocks
+        # from the start of the history, so they stay valid, when the oldest entries are removed
+        self._removed_rows = 0
+
+    def _print(self, string, entry_id=None):
+        """
+        adds the text given by 'string' to the entry with the given id or in case no entry is given, to the last entry
+        :param string: (string) the content to be printed onto the widget
+        :param entry_id: (int) the id of the entry to print to
+        :return: (void)
+        """
+        self._print_chunks([string], entry_id)
+
+    def _print_chunks(self, chunks, entry_id=None):
+        """
+        adds the given strings to the entry with the given id or in case no entry is given, to the last entry. Only the
+        dicts of the blocks, that have been changed by the new strings are replaced within the data list. The strings
+        for an entry, that has already been removed from the history, are dropped.
+        :param chunks: (list) the strings to be printed onto the widget
+        :param entry_id: (int) the id of the entry to print to
+        :return: (void)
+        """
+        if entry_id in self.entries:
+            entry = self.entries[entry_id]
+        elif entry_id is not None and len(self.output_entries) > 0:
+            # the entry has already been removed from the history, just like the SimpleConsoleOutput the late prints
+            # to it are dropped instead of being appended to another entry
+            return
+        else:
+            if len(self.output_entries) == 0:
+                self.new_label(entry_id)
+            entry = self.output_entries[-1]
+
+        first_changed = entry.extend(chunks)
+        for index in range(first_changed, len(entry)):
+            if index == len(entry.views):
+                self._add_block_row(entry)
+            # assigning the modified dict of the block to its index again, so the RecycleView is notified about the
+            # modification of this very block
+            row = entry.views[index]
+            row["text"] = entry.get_block_text(index)
+            self.data[self._get_row_index(entry, index)] = row
+
+        self.character_count += sum(len(chunk) for chunk in chunks)
+        if self.character_count > self.max_characters:
+            self._evict_entries()
+
+    def _println(self, string, entry_id=None):
+        """
+        calls the '_print' method, but adds a newline character to the end of the content string
+        :param string: (string) the content to be printed onto the next line of the widget
+        :param entry_id: (int) the id of the entry to print to
+        :return: (void)
+        """
+        self._print(string + "\n", entry_id)
+
+    def new_label(self, entry_id=None):
+        """
+        adds a new empty entry to the end of the history, onto which the following prints are written
+        :param entry_id: (int) the id under which the entry can be addressed by later prints
+        :return: (void)
+        """
+        entry = OutputEntry(entry_id, block_lines=self.block_lines)
+        entry.first_row = self._removed_rows + len(self.data)
+        row = {"text": "", "font_size": self.font_size}
+        self.data.append(row)
+        entry.views.append(row)
+        self.output_entries.append(entry)
+        if entry_id is not None:
+            self.entries[entry_id] = entry
+
+        if len(self.output_entries) > self.max_entries:
+            self._evict_entries()
+
+    def _get_row_index(self, entry, index):
+        """
+        returns the index of a block within the data list, calculated from the position of the first block of its
+        entry, so finding a block doesn't depend on the length of the history
+        :param entry: (OutputEntry) the entry of the block
+        :param index: (int) the index of the block within the entry
+        :return: (int) the index within the data list
+        """
+        return entry.first_row - self._removed_rows + index
+
+    def _add_block_row(self, entry):
+        """
+        inserts the dict of a new block after the last block of the given entry and moves the first rows of the
+        following entries accordingly. The prints almost always go to the most recent entries, so there are hardly
+        ever any entries to move
+        :param entry: (OutputEntry) the entry, whose last block has been closed
+        :return: (void)
+        """
+        row = {"text": "", "font_size": self.font_size}
+        self.data.insert(self._get_row_index(entry, len(entry.views)), row)
+        entry.views.append(row)
+        for following_entry in reversed(self.output_entries):
+            if following_entry is entry:
+                break
+            following_entry.first_row += 1
+
+    def _evict_entries(self):
+        """
+        removes the oldest entries from the history until the amount of entries as well as the amount of characters
+        are within the limits again. The last entry is never removed.
+        :return: (void)
+        """
+        amount = 0
+        while len(self.output_entries) > 1 and (len(self.output_entries) > self.max_entries or
+                                                self.character_count > self.max_characters):
+            entry = self.output_entries.popleft()
+            self.character_count -= entry.character_count
+            if entry.entry_id is not None:
+                self.entries.pop(entry.entry_id, None)
+            amount += len(entry.views)
+        # removing the blocks of all the entries in one go, as every modification of the data list causes a refresh.
+        # The blocks of the oldest entries are always at the front of the list
+        if amount > 0:
+            del self.data[:amount]
+            self._removed_rows += amount
+
+    def input_prompt_issued(self):
+        if len(self.output_entries) >= 1:
+            lines_last_label = self.output_entries[-1].views[-1]["text"].split("\n")
+            if len(lines_last_label) >= 2:
+                return "[INPUT]" in lines_last_label[-2] or "[IN]" in lines_last_label[-2]
+        return False
+
+
+class RecycleConsoleLabel(RecycleDataViewBehavior, Label):
+    """
+    The label displaying a single block of the RecycleConsoleOutput. After the label has been assigned a block or
+    its width changed, its height is adjusted to the height of the text and stored within the data of the block, so the
+    layout of the RecycleView can position the following blocks accordingly.
+
+    :ivar index: (int) The index of the block within the data of the RecycleView currently displayed by the label
+    """
+    def __init__(self, **kwargs):
+        super(RecycleConsoleLabel, self).__init__()
+        self.index = None
+        self.recycle_view = None
+        self.size_hint_y = None
+        self.halign = "left"
+        self.markup = True
+        # the font is the same as the one of the labels of the SimpleConsoleOutput
+        self.font_name = "Inconsolata"
+        self.bind(width=self._update_height)
+
+    def refresh_view_attrs(self, recycle_view, index, data):
+        """
+        called by the RecycleView, whenever the label is assigned to display the block at the given index.
+        :param recycle_view: (RecycleView) the output window
+        :param index: (int) the index of the block
+        :param data: (dict) the data of the block
+        :return: the return of the super method
+        """
+        self.index = index
+        self.recycle_view = recycle_view
+        result = super(RecycleConsoleLabel, self).refresh_view_attrs(recycle_view, index, data)
+        self._update_height()
+        return result
+
+    def _update_height(self, *args):
+        """
+        renders the text with the current width and stores the resulting size within the data of the block, in case it
+        has changed
+        :return: (void)
+        """
+        self.text_size = self.width, None
+        self.texture_update()
+        height = max(self.texture_size[1], self.line_height)
+        self.height = height
+
+        if self.recycle_view is not None and self.index is not None and self.index < len(self.recycle_view.data):
+            row = self.recycle_view.data[self.index]
+            if row.get("size") != [self.width, height]:
+                # modifying the dict in place, as the output window identifies the blocks by their dict objects
+                row["size"] = [self.width, height]
+                self.recycle_view.data[self.index] = row
@@ -0,0 +1,327 @@
+__author__ = 'Jonas'
+from pisole.commandindex import command_index
+import pisole.translate as translate
+import pisole.fastpath as fastpath
+import pisole.message as message
+from pisole.background import JobManager, BACKGROUND_PREFIX, CO_COROUTINE
+from pisole.cancellation import CancellationToken, CommandCancelled
+from pisole.session import Session
+import pisole.background as background
+import collections
+import asyncio
+import traceback
+import threading
+import sys
+
+
+class ConsoleEngine(threading.Thread):
+    """
+    The core of the console, independent of any graphical user interface. The engine is a thread, which fetches the
+    inputs of the user from its frontend, translates them, so that the engine itself is passed as the first parameter
+    to every command call, executes them and reports the outcome of the commands as messages back to the frontend.
+
+    The frontend is any object implementing the ConsoleFrontend interface (see the frontend module), for example the
+    SimpleConsoleWidget kivy widget or the StreamFrontend reading from stdin and writing to stdout. Since this module
+    doesn't import kivy, the engine can be driven, tested and benchmarked on machines without a display.
+
+    The engine object is the console object the commands interact with, providing the methods print_info,
+    print_result, print_error and prompt_input.
+
+    The console thread hosts an asyncio event loop. Plain commands are executed directly, blocking the loop until
+    they return, while coroutine commands ('async def') are started as tasks within the loop, so any amount of I/O
+    bound commands can run concurrently while the console accepts new inputs. Within a coroutine command, the input
+    of the user can be awaited with 'await console.prompt_input_async(prompt)'.
+
+    Every input gets a new cancellation token, which is cancelled, when the user presses the cancel key of the
+    frontend or the command timeout expires. The commands check it through 'console.cancellation_token', the console
+    reports how long it took for the cancellation to take effect.
+
+    :ivar frontend: (ConsoleFrontend) The frontend providing the inputs and displaying the output
+
+    :ivar translation_engine: (string) The name of the algorithm used to translate the inputs, one of the translate
+    modules engines ('tokenize', 'ast', 'legacy'). None meaning the default engine of the translate module
+
+    :ivar namespace: (dict) The namespace the session of the console is seeded with. On default the functions of the
+    command index
+
+    :ivar session: (Session) The persistent namespace, the inputs are executed in. Variables assigned by an input stay
+    available for the following inputs
+
+    :ivar job_manager: (JobManager) Executes the inputs prefixed with an exclamation mark '!' as background jobs
+
+    :ivar loop: (asyncio.AbstractEventLoop) The event loop of the console thread, None until the thread is started
+
+    :ivar command_timeout: (float) The amount of seconds after which every input is cancelled, None meaning no timeout
+
+    :ivar cancellation_token: (CancellationToken) The token of the input currently executed
+
+    :ivar cancellation_latencies: (collections.deque) The amount of seconds, that the last cancellations took to take
+    effect
+
+    :ivar fast_path: (bool) Whether inputs consisting of a single command call with literal arguments are executed by
+    calling the command directly, instead of translating, compiling and executing them
+
+    :param cache_size: (int) The maximum amount of translated and compiled inputs to be cached
+    :param max_jobs: (int) The maximum amount of background jobs running at the same time
+    """
+    def __init__(self, frontend, namespace=None, cache_size=256, translation_engine=None, max_jobs=4,
+                 command_timeout=None, fast_path=True):
+        # Initializing the threading.Thread super class
+        super(ConsoleEngine, self).__init__()
+        self.frontend = frontend
+        # the maximum amount of compiled inputs to be cached
+        translate.set_cache_size(cache_size)
+        self.translation_engine = translation_engine
+        if namespace is None:
+            namespace = background.wrap_commands(command_index.functions)
+        self.namespace = namespace
+        self.session = Session(namespace, self)
+        self.job_manager = JobManager(max_workers=max_jobs)
+        self.loop = None
+        # the thread running the event loop, usually the engine thread itself, unless 'run' is called directly
+        self._loop_thread = None
+
+        # the input currently executed and the id of its output entry
+        self.current_input = None
+        self.current_entry_id = None
+        # the awaitables, that the console awaits after the current input, before executing the next one
+        self._deferred = []
+
+        self.command_timeout = command_timeout
+        self.fast_path = fast_path
+        self.cancellation_token = CancellationToken()
+        self.cancellation_latencies = collections.deque(maxlen=100)
+        self._command_running = False
+        self._timeout_timer = None
+        # the cancel key of the frontend cancels the input currently executed
+        self.frontend.cancel_handler = self.cancel_command
+
+    def run(self):
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+        self._loop_thread = threading.current_thread()
+        try:
+            self.loop.run_until_complete(self._main())
+        finally:
+            self.loop.close()
+            self.job_manager.shutdown()
+
+    async def _main(self):
+        # The main loop of the Thread, waiting for user input inside the input channel of the frontend and executing
+        # the respective command functions. The coroutine is suspended while waiting, so an idle console uses no cpu
+        # time, but the coroutine jobs keep running within the event loop
+        while True:
+            # fetching the inputs in the same order they were entered by the user
+            input_string = await self.frontend.input_channel.get_async()
+            # the frontend signals, that it has been closed and there will be no more input
+            if input_string is None:
+                break
+            self.execute(input_string)
+            await self._await_deferred()
+        # letting the remaining jobs finish, before the event loop is closed
+        await self.job_manager.wait_async(list(self.job_manager.jobs.keys()))
+
+    async def _await_deferred(self):
+        # letting the coroutine jobs started by the input run up to their first suspension, so a job prompting for
+        # input registers before the next input is fetched. Starting a job takes two iterations of the event loop:
+        # one creating the task and one running its first step
+        for _ in range(2):
+            await asyncio.sleep(0)
+        if len(self._deferred) == 0:
+            return
+        token = self.cancellation_token
+        while len(self._deferred) > 0:
+            task = asyncio.ensure_future(self._deferred.pop(0))
+
+            # cancelling the input cancels the awaited task from whatever thread the cancellation was requested in
+            def cancel_task():
+                self.loop.call_soon_threadsafe(task.cancel)
+            token.add_callback(cancel_task)
+            try:
+                await task
+            except CommandCancelled:
+                pass
+            except (Exception, asyncio.CancelledError) as exception:
+                if not token.cancelled:
+                    traceback.print_tb(sys.exc_info()[2])
+                    self.print_error(exception)
+            finally:
+                token.remove_callback(cancel_task)
+        self._finish_command()
+
+    def execute(self, input_string):
+        """
+        translates and executes the given input, as if it had been entered by the user. Exceptions raised by the input
+        are printed as error messages. Inputs prefixed with an exclamation mark '!' are executed as background jobs,
+        the console being ready for the next input right away
+        :param input_string: (string) the input to be executed
+        :return: (void)
+        """
+        entry_id = self.frontend.new_command(input_string)
+        self.current_input = input_string
+        self.current_entry_id = entry_id
+        if input_string.lstrip().startswith(BACKGROUND_PREFIX):
+            self.execute_background(input_string.lstrip()[len(BACKGROUND_PREFIX):], entry_id)
+            return
+
+        self.cancellation_token = CancellationToken()
+        if self.command_timeout is not None:
+            self._timeout_timer = self.cancellation_token.cancel_after(self.command_timeout)
+        self._command_running = True
+        # taking over the commands, in case the commands module has been reloaded
+        self.session.refresh()
+        try:
+            # most inputs are a single command call with literal arguments, the command can be called directly then
+            call = fastpath.parse_call(input_string) if self.fast_path else None
+            if call is not None:
+                name, arguments, keywords = call
+                # the namespace holds the commands as the general path would call them (coroutine commands wrapped)
+                function = self.session.namespace.get(name) or command_index.get_function(name)
+                function(self, *arguments, **keywords)
+            else:
+                self._execute_compiled(input_string)
+        except CommandCancelled:
+            pass
+        except Exception as exception:
+            traceback.print_tb(sys.exc_info()[2])
+            self.print_error(exception)
+        # in case the input has to be awaited, it is finished by the main loop
+        if len(self._deferred) == 0:
+            self._finish_command()
+
+    def _execute_compiled(self, input_string):
+        # translating the user input string, so that the first parameter of every command call is this very
+        # engine object itself, so that the command can properly interact with the frontend. The compiled
+        # code object is cached, so repeated inputs only have to be translated and compiled once
+        compiled_input = translate.compile_input(input_string, "self", self.translation_engine)
+        # executing within the namespace of the session, so the variables assigned stay available for the following
+        # inputs. Using a single dict for globals and locals lets comprehensions and functions see them as well
+        result = eval(compiled_input, self.session.namespace)
+        # an input containing a top level 'await' evaluates to a coroutine, which the main loop awaits
+        if compiled_input.co_flags & CO_COROUTINE:
+            self.await_before_next_input(result)
+
+    def _finish_command(self):
+        # stopping the timeout and reporting the cancellation of the input
+        if self._timeout_timer is not None:
+            self._timeout_timer.cancel()
+            self._timeout_timer = None
+        self._command_running = False
+        token = self.cancellation_token
+        if token.cancelled:
+            latency = token.get_latency()
+            self.cancellation_latencies.append(latency)
+            self.print_info("{}, the cancellation took effect after {:.1f} ms".format(token.reason, latency * 1000))
+
+    def cancel_command(self, reason="cancelled by the user"):
+        """
+        cancels the input, that is currently executed. Can be called from any thread, the ui thread for example
+        :param reason: (string) the reason of the cancellation, reported to the user
+        :return: (bool) whether there was an input running, that hadn't been cancelled already
+        """
+        if not self._command_running:
+            return False
+        return self.cancellation_token.cancel(reason)
+
+    def execute_background(self, input_string, entry_id):
+        """
+        translates the given input and submits it to the thread pool of the job manager. All the output of the job is
+        printed into the given entry, even after other inputs have been executed
+        :param input_string: (string) the input to be executed, without the background prefix
+        :param entry_id: (int) the id of the output entry of the job
+        :return: (Job) the started job or None in case the input couldn't be translated
+        """
+        try:
+            # compiling within the engine thread, so syntax errors are reported right away
+            compiled_input = translate.compile_input(input_string, "self", self.translation_engine)
+        except Exception as exception:
+            traceback.print_tb(sys.exc_info()[2])
+            self.print_error(exception)
+            return None
+        return self.job_manager.submit(self, compiled_input, input_string, entry_id)
+
+    def start_coroutine(self, function, args, kwargs, input_string=None, entry_id=None):
+        """
+        starts the given coroutine command as a job within the event loop of the console thread
+        :param function: (function) the coroutine function of the command
+        :param args: (tuple) the positional parameters for the command, without the console
+        :param kwargs: (dict) the keyword parameters for the command
+        :param input_string: (string) the input, that started the command. None meaning the current input
+        :param entry_id: (int) the id of the output entry for the prints of the command. None meaning the entry of
+        the current input
+        :return: (Job) the job, which can be awaited to get the result of the command
+        """
+        if self.loop is None:
+            raise RuntimeError("coroutine commands can only be executed, once the console thread has been started")
+        input_string = input_string if input_string is not None else self.current_input
+        entry_id = entry_id if entry_id is not None else self.current_entry_id
+        return self.job_manager.submit_coroutine(self, function, args, kwargs, input_string, entry_id)
+
+    def await_before_next_input(self, awaitable):
+        """
+        lets the console await the given awaitable within its event loop, after the current input has been executed
+        and before the next input is. Exceptions are printed as error messages
+        :param awaitable: (awaitable) the coroutine, task or job
+        :return: (void)
+        """
+        self._deferred.append(awaitable)
+
+    def in_console_thread(self):
+        """
+        :return: (bool) whether the calling code runs within the console thread and thus within its event loop
+        """
+        return threading.current_thread() is self._loop_thread
+
+    def print_info(self, string):
+        self.frontend.print_message(message.InfoMessage(string))
+
+    def print_result(self, string):
+        self.frontend.print_message(message.ResultMessage(string))
+
+    def print_error(self, exception):
+        self.frontend.print_message(message.ErrorMessage(exception))
+
+    def print_message(self, message_object):
+        self.frontend.print_message(message_object)
+
+    def prompt_input(self, prompt_string, timeout=None):
+        """
+        prints the prompt and waits for the user to enter the answer
+        :param prompt_string: (string) the question for the user
+        :param timeout: (float) the maximum amount of seconds to wait, None meaning to wait forever
+        :return: (string) the entered answer, None in case the frontend has been closed
+        """
+        self.frontend.print_message(message.InputPromptMessage(prompt_string))
+        # the console thread is the only consumer of the input channel, so the next entered string is the answer
+        answer = self.frontend.input_channel.get(blocking=True, timeout=timeout,
+                                                 cancellation_token=self.cancellation_token)
+        if answer is None:
+            self.cancellation_token.check()
+            if not self.frontend.input_channel.closed:
+                raise TimeoutError("no input within {} s".format(timeout))
+            # the frontend has been closed, leaving the signal for the main loop
+            self.frontend.input_channel.put(None)
+        return answer
+
+    async def prompt_input_async(self, prompt_string, timeout=None):
+        """
+        prints the prompt and waits for the user to enter the answer, without blocking the event loop
+        :param prompt_string: (string) the question for the user
+        :param timeout: (float) the maximum amount of seconds to wait, None meaning to wait forever
+        :return: (string) the entered answer
+        """
+        self.frontend.print_message(message.InputPromptMessage(prompt_string))
+        # awaiting with priority, so the answer isn't taken by the main loop waiting for the next input meanwhile
+        return await asyncio.wait_for(self.frontend.input_channel.get_async(priority=True), timeout)
+
+    def get_width(self):
+        return self.frontend.get_width()
+
+    def get_font_size(self):
+        return self.frontend.get_font_size()
+
+    def _print(self, string):
+        self.frontend.print(string)
+
+    def _println(self, string):
+        self.frontend.println(string)
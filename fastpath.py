@@ -0,0 +1,121 @@
+__author__ = 'Jonas'
+from pisole.commandindex import command_index
+from pisole.cache import LRUCache
+import threading
+import ast
+import re
+
+
+# The pattern every input has to match to be considered for the fast path: a name followed by brackets enclosing the
+# rest of the input. Inputs not matching are handed to the general path without being parsed
+SINGLE_CALL_REGEX = re.compile(r"\s*([A-Za-z_]\w*)\s*\(.*\)\s*\Z", re.DOTALL)
+
+# The cache of the parsed inputs, keyed on the input string and bound to the version of the command index. Inputs,
+# that can't take the fast path, are cached as well (as False), so they are only parsed once
+call_cache = LRUCache(max_size=256)
+
+# The counters of how many inputs took the fast path and how many had to take the general path
+_statistics = {"hits": 0, "misses": 0}
+_statistics_lock = threading.Lock()
+
+# The namespace the mutable literals are evaluated in, without access to any builtins
+_LITERAL_NAMESPACE = {"__builtins__": {}}
+
+
+def parse_call(input_string):
+    """
+    checks, whether the given input is a single call of a command with nothing but literals as arguments, like
+    'load("data.csv", columns=[1, 2], verbose=True)'. Such an input doesn't have to be translated, compiled and
+    executed, the command function can be called directly.
+
+    :param input_string: (string) the input of the user
+    :return: (tuple) the name of the command, the list of positional arguments and the dict of keyword arguments or
+    None, in case the input has to take the general path
+    """
+    call = call_cache.get(input_string, version=command_index.version)
+    if call is None:
+        call = _parse_call_uncached(input_string)
+        call_cache.put(input_string, call, version=command_index.version)
+
+    with _statistics_lock:
+        _statistics["hits" if call is not False else "misses"] += 1
+    if call is False:
+        return None
+
+    name, arguments, keywords, literal_code = call
+    if literal_code is not None:
+        # mutable literals (a list for example) are created anew for every call, so a modification by one call of
+        # the command doesn't affect the next one
+        return (name, ) + eval(literal_code, _LITERAL_NAMESPACE)
+    return name, arguments, dict(keywords)
+
+
+def _parse_call_uncached(input_string):
+    """
+    parses the input into the name of the command and the values of the arguments
+    :param input_string: (string) the input of the user
+    :return: (tuple) the name, the tuple of argument values, the dict of keyword argument values and, in case any of
+    the values is mutable, the code object creating the (arguments, keywords) tuple anew. False in case the input is no
+    single command call with literal arguments
+    """
+    match = SINGLE_CALL_REGEX.match(input_string)
+    if match is None or match.group(1) not in command_index:
+        return False
+    try:
+        tree = ast.parse(input_string.strip(), mode="eval")
+    except SyntaxError:
+        # the general path reports the error
+        return False
+
+    call = tree.body
+    if not isinstance(call, ast.Call) or not isinstance(call.func, ast.Name):
+        # for example 'command(1)(2)' or 'command(1) + other(2)'
+        return False
+    argument_nodes = call.args
+    keyword_nodes = [(keyword.arg, keyword.value) for keyword in call.keywords]
+    # '*args' and '**kwargs' unpacking isn't supported
+    if any(isinstance(node, ast.Starred) for node in argument_nodes) or any(keyword is None for keyword, _ in
+                                                                           keyword_nodes):
+        return False
+    # every argument has to be a literal
+    try:
+        arguments = tuple(ast.literal_eval(node) for node in argument_nodes)
+        keywords = {keyword: ast.literal_eval(node) for keyword, node in keyword_nodes}
+    except (ValueError, TypeError, SyntaxError, MemoryError, RecursionError):
+        return False
+    if all(_is_immutable(value) for value in arguments + tuple(keywords.values())):
+        return call.func.id, arguments, keywords, None
+    # compiling the literals into a single expression, which evaluates much faster than walking the syntax trees
+    expression = ast.Tuple(elts=[ast.Tuple(elts=argument_nodes, ctx=ast.Load()),
+                                 ast.Dict(keys=[ast.Constant(keyword) for keyword, _ in keyword_nodes],
+                                          values=[node for _, node in keyword_nodes])], ctx=ast.Load())
+    literal_code = compile(ast.fix_missing_locations(ast.Expression(expression)), "<fastpath>", "eval")
+    return call.func.id, arguments, keywords, literal_code
+
+
+def _is_immutable(value):
+    if isinstance(value, (tuple, frozenset)):
+        return all(_is_immutable(item) for item in value)
+    return isinstance(value, (str, bytes, int, float, complex, bool, type(None), type(Ellipsis)))
+
+
+def get_statistics():
+    """
+    returns how often inputs could take the fast path
+    :return: (dict) with the keys 'hits', 'misses' and 'hit_rate' (the share of hits, between 0 and 1)
+    """
+    with _statistics_lock:
+        statistics = dict(_statistics)
+    total = statistics["hits"] + statistics["misses"]
+    statistics["hit_rate"] = statistics["hits"] / total if total > 0 else 0.0
+    return statistics
+
+
+def reset_statistics():
+    """
+    resets the hit and miss counters
+    :return: (void)
+    """
+    with _statistics_lock:
+        _statistics["hits"] = 0
+        _statistics["misses"] = 0
@@ -0,0 +1,173 @@
+__author__ = 'Jonas'
+from pisole.channel import InputChannel
+import itertools
+import threading
+import shutil
+import signal
+import abc
+import sys
+import re
+
+
+# The regular expression matching the kivy markup tags, like '[color=808080]' or '[/b]'
+KIVY_MARKUP_REGEX = re.compile(r"\[/?(?:b|i|u|s|sub|sup|color|font|size|ref|anchor)(?:=[^\]]*)?\]")
+
+
+class ConsoleFrontend(abc.ABC):
+    """
+    The interface between the ConsoleEngine and whatever is used to interact with the user. The frontend puts the
+    strings entered by the user into its 'input_channel', which the engine consumes, and displays the output of the
+    executed commands. Putting None into the channel stops the engine.
+
+    The output is organized in entries: every executed input creates a new entry by calling 'new_command' and the
+    following prints are appended to that entry, unless an entry id is given explicitly.
+
+    The frontend offers the user a way to cancel the running command (like a key binding), calling 'request_cancel'.
+
+    The methods creating the entries, printing and measuring the output are abstract and have to be implemented by
+    every frontend.
+
+    :ivar input_channel: (InputChannel) The channel the entered strings are put into
+    :ivar cancel_handler: (callable) The function cancelling the running command, set by the engine
+    """
+    input_channel = None
+    cancel_handler = None
+
+    def request_cancel(self):
+        """
+        cancels the command, that is currently executed by the engine
+        :return: (bool) whether there was a running command, that hasn't been cancelled already
+        """
+        if self.cancel_handler is None:
+            return False
+        return self.cancel_handler()
+
+    @abc.abstractmethod
+    def new_command(self, command_string):
+        """
+        starts a new entry of the output for the given command, which is about to be executed
+        :param command_string: (string) the command, that is being executed
+        :return: (int) the id of the new entry
+        """
+
+    @abc.abstractmethod
+    def print(self, string, entry_id=None):
+        """
+        displays the given string
+        :param string: (string) the content to be printed
+        :param entry_id: (int) the id of the entry to print to, None meaning the current entry
+        :return: (void)
+        """
+
+    def println(self, string, entry_id=None):
+        self.print(string + "\n", entry_id)
+
+    def print_message(self, message, entry_id=None):
+        """
+        displays the given message in the format suitable for the frontend
+        :param message: (message.Message) the message of a command
+        :param entry_id: (int) the id of the entry to print to, None meaning the current entry
+        :return: (void)
+        """
+        self.println(message.get_string(), entry_id)
+
+    @abc.abstractmethod
+    def get_width(self):
+        """
+        :return: (int) the width of the output, measured in the same unit as the font size
+        """
+
+    @abc.abstractmethod
+    def get_font_size(self):
+        """
+        :return: (int) the font size of the output
+        """
+
+
+class StreamFrontend(ConsoleFrontend):
+    """
+    A frontend, that reads the input from a text stream and writes the output to another, on default stdin and stdout,
+    so the console can be used within a terminal or driven by another process. Kivy markup tags are removed from the
+    output.
+
+    Every line read is a separate input, except for lines ending with ':', which start a block of lines, that is
+    finished by an empty line, just like within the interactive python interpreter.
+
+    Started from the main thread, the frontend cancels the running command on Ctrl-C. Pressing Ctrl-C again, while
+    the command ignores its cancellation, or while no command is running, raises the KeyboardInterrupt as usual.
+
+    :ivar input_stream: (file) The stream the inputs are read from
+    :ivar output_stream: (file) The stream the output is written to
+    """
+    def __init__(self, input_stream=None, output_stream=None):
+        self.input_stream = input_stream if input_stream is not None else sys.stdin
+        self.output_stream = output_stream if output_stream is not None else sys.stdout
+        self.input_channel = InputChannel()
+
+        self._entry_counter = itertools.count()
+        self._output_lock = threading.Lock()
+        self._reader = None
+        # the SIGINT handler, that was installed before the frontend has been started
+        self._previous_handler = None
+
+    def start(self):
+        """
+        starts the daemon thread reading the input stream and putting the inputs into the input channel
+        :return: (void)
+        """
+        self._reader = threading.Thread(target=self.read_inputs, daemon=True)
+        self._reader.start()
+        # signal handlers can only be installed by the main thread
+        if threading.current_thread() is threading.main_thread():
+            self._previous_handler = signal.signal(signal.SIGINT, self._on_interrupt)
+
+    def stop(self):
+        """
+        restores the SIGINT handler, that was installed before the frontend has been started
+        :return: (void)
+        """
+        if self._previous_handler is not None and threading.current_thread() is threading.main_thread():
+            signal.signal(signal.SIGINT, self._previous_handler)
+            self._previous_handler = None
+
+    def _on_interrupt(self, signal_number, frame):
+        if not self.request_cancel():
+            raise KeyboardInterrupt()
+
+    def read_inputs(self):
+        """
+        reads the input stream until its end, putting every input into the input channel
+        :return: (void)
+        """
+        block_lines = []
+        for line in self.input_stream:
+            line = line.rstrip("\n")
+            if len(block_lines) > 0:
+                if line.strip() == "":
+                    self.input_channel.put("\n".join(block_lines))
+                    block_lines = []
+                else:
+                    block_lines.append(line)
+            elif line.rstrip().endswith(":"):
+                block_lines.append(line)
+            elif line.strip() != "":
+                self.input_channel.put(line)
+        if len(block_lines) > 0:
+            self.input_channel.put("\n".join(block_lines))
+        # signaling the engine, that there will be no more input
+        self.input_channel.put(None)
+
+    def new_command(self, command_string):
+        return next(self._entry_counter)
+
+    def print(self, string, entry_id=None):
+        with self._output_lock:
+            self.output_stream.write(KIVY_MARKUP_REGEX.sub("", string))
+            self.output_stream.flush()
+
+    def get_width(self):
+        # the help command calculates the amount of columns as width / font size * 1.8
+        return shutil.get_terminal_size().columns / 1.8
+
+    def get_font_size(self):
+        return 1
@@ -0,0 +1,228 @@
+__author__ = 'Jonas'
+from pisole.commandindex import command_index
+from pisole.cache import LRUCache
+
+
+class CommandInfo:
+    """
+    The documentation of a single command, extracted from the docstring of its function once, when the help index is
+    built.
+
+    :ivar name: (string) The name of the command
+    :ivar summary: (string) The explanation of the command as a single line, everything before the first ':param'
+    :ivar parameters: (list) The (name, description) tuples of the parameters, without the console parameter
+    :ivar returns: (string) The description of the return value, empty if there is none
+    """
+    def __init__(self, name, function):
+        self.name = name
+        # the lazily imported commands of a package carry the documentation extracted when their source was scanned
+        help_info = getattr(function, "help_info", None)
+        if help_info is None:
+            # the docstring of a function is cleaned up by inspect, which isn't needed until the help index is built
+            import inspect
+            help_info = parse_docstring(inspect.getdoc(function) or "")
+        self.summary, self.parameters, self.returns = help_info
+
+    def matches(self, query):
+        """
+        returns how well the command matches the given search query, considering its name first and then its summary
+        :param query: (string) the search query
+        :return: (tuple) the score, lower meaning a better match, None if the command doesn't match at all
+        """
+        query = query.lower()
+        name = self.name.lower()
+        if query in name:
+            return 0, name.find(query), len(name)
+        span = _fuzzy_span(query, name)
+        if span is not None:
+            return 1, span, len(name)
+        if query in self.summary.lower():
+            return 2, 0, len(name)
+        return None
+
+
+def parse_docstring(doc_string):
+    """
+    extracts the documentation of a command from the docstring of its function
+    :param doc_string: (string) the docstring, with the indentation already removed
+    :return: (tuple) the summary, the list of the (name, description) tuples of the parameters without the console
+    parameter and the description of the return value
+    """
+    explanation_lines = []
+    parameters = []
+    returns = ""
+    for line in doc_string.split("\n"):
+        if line.startswith(":param "):
+            # ':param name: (type) description'
+            parameter_name, _, description = line[7:].partition(":")
+            parameters.append((parameter_name.strip(), description.strip()))
+        elif line.startswith(":return:"):
+            returns = line[8:].strip()
+        elif len(parameters) == 0 and returns == "":
+            explanation_lines.append(line.strip())
+        elif len(parameters) > 0 and line.strip() != "" and not line.startswith(":"):
+            # the description of a parameter continuing in the next line
+            parameter_name, description = parameters[-1]
+            parameters[-1] = (parameter_name, description + " " + line.strip())
+    summary = " ".join(line for line in explanation_lines if line != "")
+    # the first parameter of every command is the console, which isn't passed by the user
+    return summary, parameters[1:], returns
+
+
+def _fuzzy_span(query, text):
+    """
+    checks, whether all the characters of the query occur within the text in the same order, like 'ldat' within
+    'load_data'
+    :param query: (string) the search query
+    :param text: (string) the text to be searched
+    :return: (int) the amount of characters between the first and the last matching character, the more compact the
+    better the match. None if the query isn't contained
+    """
+    start = None
+    position = -1
+    for character in query:
+        position = text.find(character, position + 1)
+        if position == -1:
+            return None
+        if start is None:
+            start = position
+    return position - start if start is not None else 0
+
+
+class HelpIndex:
+    """
+    The documentation of all the commands, extracted once from the docstrings of the functions within the command
+    index. The markup of the help texts is rendered once per width of the output and cached, until the set of
+    commands changes: the index and the cache are bound to the version of the command index. When the commands have
+    been reloaded, only the entries of the changed and added commands are extracted again.
+
+    :ivar entries: (dict) The CommandInfo objects of the commands by their names
+    :ivar version: (int) The version of the command index, the entries have been built from
+    """
+    def __init__(self, cache_size=64):
+        self.entries = {}
+        self.version = None
+        self._rendered = LRUCache(max_size=cache_size)
+        # the fingerprints of the functions, the entries have been extracted from
+        self._fingerprints = {}
+
+    def get_entries(self):
+        """
+        returns the documentation of all the commands, (re)building the index, in case the commands have changed
+        :return: (dict) the CommandInfo objects by the names of the commands
+        """
+        if self.version != command_index.version:
+            version = command_index.version
+            functions = command_index.functions
+            fingerprints = command_index.fingerprints
+            entries = {}
+            for name in sorted(functions.keys()):
+                if name in self.entries and self._fingerprints.get(name) == fingerprints.get(name):
+                    entries[name] = self.entries[name]
+                else:
+                    entries[name] = CommandInfo(name, functions[name])
+            self.entries = entries
+            self._fingerprints = dict(fingerprints)
+            self.version = version
+        return self.entries
+
+    def get_entry(self, name):
+        """
+        :param name: (string) the name of the command
+        :return: (CommandInfo) the documentation of the command, None if there is no such command
+        """
+        return self.get_entries().get(name)
+
+    def search(self, query):
+        """
+        returns the commands matching the given query, the best matches first
+        :param query: (string) the search query
+        :return: (list) the CommandInfo objects of the matching commands
+        """
+        scored = []
+        for entry in self.get_entries().values():
+            score = entry.matches(query)
+            if score is not None:
+                scored.append((score, entry.name, entry))
+        scored.sort(key=lambda item: item[:2])
+        return [entry for _, _, entry in scored]
+
+    def render_list(self, width, search="", max_column_width=30):
+        """
+        returns the markup of the list of all commands, or the commands matching the search query, with their summaries
+        :param width: (int) the width of the output in characters
+        :param search: (string) the search query, empty for all commands
+        :param max_column_width: (int) the maximum width of the column of the command names
+        :return: (string)
+        """
+        key = ("list", width, search, max_column_width)
+        markup = self._rendered.get(key, version=command_index.version)
+        if markup is None:
+            entries = self.search(search) if search != "" else list(self.get_entries().values())
+            markup = _render_list(entries, width, search, max_column_width)
+            self._rendered.put(key, markup, version=command_index.version)
+        return markup
+
+    def render_command(self, name):
+        """
+        returns the markup of the documentation of a single command
+        :param name: (string) the name of the command
+        :return: (string) the markup, None if there is no such command
+        """
+        key = ("command", name)
+        markup = self._rendered.get(key, version=command_index.version)
+        if markup is None:
+            entry = self.get_entry(name)
+            if entry is None:
+                return None
+            markup = render_command(entry)
+            self._rendered.put(key, markup, version=command_index.version)
+        return markup
+
+
+def _render_list(entries, width, search, max_column_width):
+    import textwrap
+    if search != "":
+        if len(entries) == 0:
+            return "There are no commands matching '{}'".format(search)
+        print_string_list = ["The following commands match '{}'\n\n".format(search)]
+    else:
+        print_string_list = ["The following commands are available\n\n"]
+
+    # since the list of functions should be properly indented, meaning there should be clearly separated columns,
+    # the width of the first column is given by the longest command name, that fits into the maximum column width
+    column_width = max([len(entry.name) for entry in entries if len(entry.name) < max_column_width - 2] + [0]) + 2
+    column_indent = " " * column_width
+    # the summaries are wrapped to the space left beside the column of the names
+    space_left = max(width - column_width, 20)
+    for entry in entries:
+        lines = textwrap.wrap(entry.summary, space_left) or [""]
+        if len(entry.name) >= column_width:
+            # the name doesn't fit into the column, the summary starts in the next line
+            print_string_list.append("[color=3AD126]{}[/color]\n{}".format(entry.name, column_indent))
+        else:
+            print_string_list.append("[color=3AD126]{}[/color]{}".format(entry.name,
+                                                                         " " * (column_width - len(entry.name))))
+        print_string_list.append("[color=808080]")
+        print_string_list.append(("\n" + column_indent).join(lines))
+        print_string_list.append("[/color]\n\n")
+    return ''.join(print_string_list)
+
+
+def render_command(entry):
+    """
+    returns the markup of the documentation of the given command
+    :param entry: (CommandInfo) the documentation of the command
+    :return: (string)
+    """
+    print_string_list = ["\n\n[color=3AD126]", entry.name, "[/color]\n",
+                         "[color=808080]{}[/color]\n".format(entry.summary)]
+    for parameter_name, description in entry.parameters:
+        print_string_list.append("-- {} [color=808080]{}[/color]\n".format(parameter_name, description))
+    if entry.returns != "":
+        print_string_list.append("returns: [color=808080]{}[/color]".format(entry.returns))
+    return ''.join(print_string_list)
+
+
+# The help index of the commands, used by the help command
+help_index = HelpIndex()
@@ -0,0 +1,349 @@
+__author__ = 'Jonas'
+import threading
+import itertools
+import bisect
+import atexit
+import queue
+import json
+import os
+
+
+# The amount of bytes read at once, when the history file is read backwards from its end
+READ_BLOCK_SIZE = 65536
+
+# The maximum amount of lines read from the history file per command of the maximum size. Reading stops at this
+# limit, even if the lines contain fewer distinct commands, as the lines of a history file consist mostly of repeated
+# commands
+MAX_LINES_PER_COMMAND = 2
+
+# The character separating the commands within the text searched by 'History.search', which can't be typed
+SEARCH_SEPARATOR = "\0"
+
+# The histories persisted to a file by the resolved paths of their files, shared by all the consoles of the process
+_histories = {}
+_histories_lock = threading.Lock()
+
+
+class History:
+    """
+    The history of the commands entered into the console, ordered from the oldest to the most recent command and
+    without duplicates: entering a command again moves it to the most recent position.
+
+    The commands are stored in a list in the order they have been entered, with a dict mapping every command to its
+    position, so checking whether a command is already contained and moving it are done in constant time. Moving a
+    command leaves a tombstone (None) at its old position, the list is compacted once half of it consists of
+    tombstones. The amount of commands is limited to the maximum size, the oldest ones being dropped.
+
+    In case a path is given, the history is persisted to an append-only file with one json encoded command per line.
+    The lines are written by a separate thread, so entering a command never waits for the disk. On startup the file is
+    read backwards from its end, until the maximum amount of distinct commands has been found or twice as many lines
+    have been read, so the startup time doesn't depend on how long the history has been used. Whenever the file
+    contains more lines than distinct commands have been loaded, it is rewritten with just the loaded commands, unless
+    another process has appended to the file meanwhile. Within a process the consoles using the same file share one
+    history (see 'get_history'), so they don't overwrite each other's commands.
+
+    The history can be searched for commands containing a query, the most recent match first. The search is backed by
+    a text index: all the commands joined into a single string, with the offset of every command within it. Searching
+    that string backwards is done by a single call of 'str.rfind', which compares the query with the commands at the
+    speed of c code, instead of looping over the commands in python. The index is built on the first search, the
+    commands added afterwards are appended to it and moved commands leave their text behind as a tombstone. It is only
+    rebuilt after the history has been compacted.
+
+    :ivar path: (string) The path of the history file, None meaning the history is kept in memory only
+    :ivar max_size: (int) The maximum amount of commands kept
+    """
+    def __init__(self, path=None, max_size=10000):
+        self.path = path
+        self.max_size = max_size
+        # the commands with tombstones for the moved ones and the positions of the commands within that list
+        self._entries = []
+        self._positions = {}
+        self._tombstones = 0
+        # the position before which there are only tombstones, where the search for the oldest command starts
+        self._start = 0
+        # the version of the history, incremented with every change, so the users of positions can detect them
+        self.version = 0
+        self._lock = threading.Lock()
+        # the text of all the commands, the offsets of the commands within it and the amount of positions, that have
+        # been indexed. None meaning the index has to be rebuilt
+        self._search_text = ""
+        self._search_offsets = []
+        self._search_count = None
+
+        self._writer = None
+        self._write_queue = None
+        # the size of the history file before it has been read, None in case it didn't exist
+        self._loaded_size = None
+        if path is not None:
+            self._load()
+
+    def add(self, command):
+        """
+        adds the command as the most recent one, removing it from its previous position, in case it has been entered
+        before
+        :param command: (string) the entered command
+        :return: (void)
+        """
+        with self._lock:
+            self._append(command)
+            self.version += 1
+        self._write(command)
+
+    def _append(self, command):
+        position = self._positions.get(command)
+        if position is not None:
+            self._entries[position] = None
+            self._tombstones += 1
+        self._positions[command] = len(self._entries)
+        self._entries.append(command)
+        # dropping the oldest commands, that exceed the maximum size
+        while len(self._positions) > self.max_size:
+            self._start = self._find(self._start, 1)
+            self._positions.pop(self._entries[self._start])
+            self._entries[self._start] = None
+            self._tombstones += 1
+        if self._tombstones > len(self._entries) // 2:
+            self._compact()
+
+    def _compact(self):
+        self._entries = [command for command in self._entries if command is not None]
+        self._positions = {command: position for position, command in enumerate(self._entries)}
+        self._tombstones = 0
+        self._start = 0
+        self._search_count = None
+
+    def _find(self, position, step):
+        # the position of the first command starting from the given position in the given direction, skipping the
+        # tombstones. None in case there is none
+        while 0 <= position < len(self._entries):
+            if self._entries[position] is not None:
+                return position
+            position += step
+        return None
+
+    def previous(self, position=None):
+        """
+        returns the command entered before the one at the given position, used to step through the history
+        :param position: (int) the position of the current command, None meaning to start with the most recent one
+        :return: (tuple) the position and the command, None in case there is no earlier command
+        """
+        with self._lock:
+            position = self._find(len(self._entries) - 1 if position is None else position - 1, -1)
+            return (position, self._entries[position]) if position is not None else None
+
+    def next(self, position):
+        """
+        returns the command entered after the one at the given position
+        :param position: (int) the position of the current command
+        :return: (tuple) the position and the command, None in case the given one is the most recent command
+        """
+        with self._lock:
+            position = self._find(position + 1, 1)
+            return (position, self._entries[position]) if position is not None else None
+
+    def get_recent(self, amount=None):
+        """
+        :param amount: (int) the maximum amount of commands, None meaning all of them
+        :return: (list) the most recent commands, starting with the most recent one
+        """
+        with self._lock:
+            commands = []
+            for command in reversed(self._entries):
+                if amount is not None and len(commands) >= amount:
+                    break
+                if command is not None:
+                    commands.append(command)
+            return commands
+
+    def search(self, query, before=None):
+        """
+        returns the most recent command containing the query. Searching again with the position of the match returns
+        the next older match
+        :param query: (string) the text to search for
+        :param before: (int) the position of the previous match, None meaning to search the whole history
+        :return: (tuple) the position and the command, None in case no (further) command contains the query
+        """
+        with self._lock:
+            self._update_search_index()
+            end = len(self._search_text) if before is None else self._search_offsets[before]
+            while True:
+                offset = self._search_text.rfind(query, 0, end)
+                if offset == -1:
+                    return None
+                position = bisect.bisect_right(self._search_offsets, offset) - 1
+                command = self._entries[position]
+                # the text of the commands, that have been moved or dropped since they were indexed, is still
+                # contained, their positions being tombstones. The query may not span two commands either
+                if command is not None and offset + len(query) <= self._search_offsets[position] + len(command):
+                    return position, command
+                end = offset + len(query) - 1
+
+    def _update_search_index(self):
+        # appending the commands added since the last search to the text index. The index is only rebuilt as a whole
+        # after the history has been compacted, as that changes the positions of the commands
+        if self._search_count is None:
+            self._search_text = ""
+            self._search_offsets = []
+            self._search_count = 0
+        if self._search_count == len(self._entries):
+            return
+        # the tombstones are joined as empty strings, so the offsets correspond to the positions of the commands
+        commands = [command if command is not None else "" for command in self._entries[self._search_count:]]
+        start = len(self._search_text) + 1 if self._search_count > 0 else 0
+        self._search_offsets.extend(itertools.accumulate((len(command) + 1 for command in commands[:-1]),
+                                                         initial=start))
+        prefix = self._search_text + SEARCH_SEPARATOR if self._search_count > 0 else ""
+        self._search_text = prefix + SEARCH_SEPARATOR.join(commands)
+        self._search_count = len(self._entries)
+
+    def __contains__(self, command):
+        return command in self._positions
+
+    def __len__(self):
+        return len(self._positions)
+
+    def _load(self):
+        """
+        reads the most recent distinct commands from the end of the history file and starts the writer thread
+        :return: (void)
+        """
+        self._loaded_size = _get_size(self.path)
+        commands = []
+        seen = set()
+        # the amount of lines read, counting the lines beyond the limits as well, that aren't read anymore
+        line_count = 0
+        for line in _read_lines_backwards(self.path):
+            if len(seen) >= self.max_size or line_count >= self.max_size * MAX_LINES_PER_COMMAND:
+                line_count += 1
+                break
+            line_count += 1
+            try:
+                command = json.loads(line)
+            except ValueError:
+                # a line, that has been cut off by a crash while it was written
+                continue
+            if isinstance(command, str) and command not in seen:
+                seen.add(command)
+                commands.append(command)
+        for command in reversed(commands):
+            self._append(command)
+
+        self._write_queue = queue.Queue()
+        self._writer = threading.Thread(target=self._write_entries, daemon=True)
+        self._writer.start()
+        # writing the remaining commands, before the interpreter exits
+        atexit.register(self.close)
+        if line_count > len(commands):
+            # the file contains repeated or older commands, that are no longer needed, replacing it with the loaded
+            # commands
+            self._write_queue.put(list(reversed(commands)))
+
+    def _write(self, command):
+        if self._write_queue is not None:
+            self._write_queue.put(command)
+
+    def _write_entries(self):
+        # The main loop of the writer thread: appending all the commands, that have been added since the last write,
+        # at once. A list of commands replaces the whole file
+        while True:
+            items = [self._write_queue.get()]
+            while not self._write_queue.empty():
+                items.append(self._write_queue.get_nowait())
+            lines = []
+            for item in items:
+                if item is None:
+                    self._append_lines(lines)
+                    return
+                if isinstance(item, list):
+                    self._append_lines(lines)
+                    lines = []
+                    self._replace_file(item)
+                else:
+                    lines.append(json.dumps(item) + "\n")
+            self._append_lines(lines)
+
+    def _append_lines(self, lines):
+        if len(lines) == 0:
+            return
+        try:
+            with open(self.path, "a", encoding="utf-8") as file:
+                file.writelines(lines)
+        except OSError:
+            # the history of the session is still available, it just won't be persisted
+            pass
+
+    def _replace_file(self, commands):
+        # the file has grown since it was read, in case another console process has appended its commands meanwhile.
+        # Replacing it would lose them, the repeated lines are removed by a later start instead
+        if _get_size(self.path) != self._loaded_size:
+            return
+        temporary_path = "{}.{}.tmp".format(self.path, os.getpid())
+        try:
+            with open(temporary_path, "w", encoding="utf-8") as file:
+                file.writelines(json.dumps(command) + "\n" for command in commands)
+            os.replace(temporary_path, self.path)
+        except OSError:
+            pass
+
+    def close(self):
+        """
+        waits until all the added commands have been written to the history file and stops the writer thread
+        :return: (void)
+        """
+        if self._writer is not None and self._writer.is_alive():
+            self._write_queue.put(None)
+            self._writer.join()
+
+
+def get_history(path=None, max_size=10000):
+    """
+    returns the history persisted to the given file. All the consoles of the process using the same file share a
+    single history, with one writer thread appending to the file, the maximum size of the first one being used. A
+    history without a file is never shared
+    :param path: (string) the path of the history file, None meaning the history is kept in memory only
+    :param max_size: (int) the maximum amount of commands kept
+    :return: (History)
+    """
+    if path is None:
+        return History(max_size=max_size)
+    path = os.path.realpath(path)
+    with _histories_lock:
+        history = _histories.get(path)
+        if history is None:
+            history = History(path, max_size=max_size)
+            _histories[path] = history
+        return history
+
+
+def _get_size(path):
+    try:
+        return os.stat(path).st_size
+    except OSError:
+        return None
+
+
+def _read_lines_backwards(path):
+    """
+    yields the lines of the file starting with the last one, reading the file in blocks from its end
+    :param path: (string) the path of the file
+    :return: (generator) the lines without the line breaks
+    """
+    try:
+        file = open(path, "rb")
+    except OSError:
+        return
+    with file:
+        position = file.seek(0, os.SEEK_END)
+        remainder = b""
+        while position > 0:
+            size = min(READ_BLOCK_SIZE, position)
+            position -= size
+            file.seek(position)
+            lines = (file.read(size) + remainder).split(b"\n")
+            # the first line of the block may continue within the previous block
+            remainder = lines.pop(0)
+            for line in reversed(lines):
+                if line.strip() != b"":
+                    yield line.decode("utf-8", "replace")
+        if remainder.strip() != b"":
+            yield remainder.decode("utf-8", "replace")
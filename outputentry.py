@@ -0,0 +1,84 @@
+__author__ = 'Jonas'
+
+
+class OutputEntry:
+    """
+    The model of a single entry of the output window, meaning all the text printed by one issued command. Instead of
+    one ever growing string, the text is stored as a list of chunks (the individual prints), which are grouped into
+    blocks. A block is closed, once it contains 'block_lines' lines or 'block_characters' characters, and the
+    following chunks start a new block. Each block is meant to be displayed by its own label, so that a new print only
+    requires the text of the last block to be assembled and rendered again, instead of the whole entry, and no single
+    texture exceeds the size limits of the graphics card.
+
+    The blocks are only ever split between two chunks, never within a chunk, so the kivy markup tags of a print, that
+    can span multiple lines, always stay within the same block.
+
+    :ivar entry_id: (int) The id of the entry, by which the prints address it
+    :ivar block_lines: (int) The amount of lines after which a block is closed
+    :ivar block_characters: (int) The amount of characters after which a block is closed
+    :ivar blocks: (list) The list of blocks, each block being a list of chunk strings
+    :ivar character_count: (int) The amount of characters of the whole entry
+    :ivar views: (list) The ui objects displaying the blocks, one per block. Managed by the output window
+    :ivar first_row: (int) The position of the first block within the output window, in case the window needs it to
+    locate the views. Managed by the output window
+    """
+    def __init__(self, entry_id=None, block_lines=200, block_characters=20000):
+        self.entry_id = entry_id
+        self.block_lines = block_lines
+        self.block_characters = block_characters
+
+        self.blocks = [[]]
+        self.character_count = 0
+        self.views = []
+        self.first_row = None
+
+        # the line and character counts of the last block, the only one that can still grow
+        self._block_line_count = 0
+        self._block_character_count = 0
+
+    def extend(self, chunks):
+        """
+        appends the given chunks to the end of the entry
+        :param chunks: (list) the strings to be appended
+        :return: (int) the index of the first block, that has been changed. All the following blocks have changed as
+        well or are new
+        """
+        first_changed = len(self.blocks) - 1
+        for chunk in chunks:
+            # closing the last block, in case it is full, but never leaving an empty block behind
+            if len(self.blocks[-1]) > 0 and (self._block_line_count >= self.block_lines or
+                                             self._block_character_count >= self.block_characters):
+                self.blocks.append([])
+                self._block_line_count = 0
+                self._block_character_count = 0
+            self.blocks[-1].append(chunk)
+            self._block_line_count += chunk.count("\n")
+            self._block_character_count += len(chunk)
+            self.character_count += len(chunk)
+        return first_changed
+
+    def append(self, chunk):
+        """
+        appends a single chunk to the end of the entry
+        :param chunk: (string) the string to be appended
+        :return: (int) the index of the first block, that has been changed
+        """
+        return self.extend([chunk])
+
+    def get_block_text(self, index):
+        """
+        returns the text of the block at the given index
+        :param index: (int) the index of the block
+        :return: (string)
+        """
+        return ''.join(self.blocks[index])
+
+    def get_text(self):
+        """
+        returns the whole text of the entry
+        :return: (string)
+        """
+        return ''.join(''.join(block) for block in self.blocks)
+
+    def __len__(self):
+        return len(self.blocks)
@@ -1,100 +1,247 @@
-from kivy.clock import Clock
-from pisole.consolewidget import SimpleConsoleWidget
-# importing all command functions of the project folder into the local module namespace, so they can be executed
-# as commands of the module
-from commands import *
-
+from pisole.commandindex import command_index
+from pisole.frontend import StreamFrontend
+from pisole.engine import ConsoleEngine
+import pisole.background as background
+import pisole.session as session
 import pisole.translate as translate
+import pisole.fastpath as fastpath
 import pisole.message as message
-import traceback
-import threading
-import commands
-import inspect
+from pisole.helpindex import help_index, render_command, CommandInfo
+from pisole.watcher import FileWatcher
+import pisole.commandpackage as commandpackage
+import importlib
+import types
 import time
 import sys
 
 
-def help(console, command="", max_column_width=30):
+def help(console, command="", max_column_width=30, search=""):
     """
     A function that will provide the user with information about the available commands. prints the list of all commands
     on default and the specific documentation of the command, when passed a name of func object
     :param console: -
     :param command: (string) (func) the command to be helped about
+    :param max_column_width: (int) the maximum width of the column of the command names within the list
+    :param search: (string) lists only the commands matching the search, like 'ldat' matching 'load_data'
     :return:
     """
-    # the functions list will contain tuples (function_name, function)
-    functions_list = list(map(lambda x: list(x), inspect.getmembers(commands, inspect.isfunction)))
-
-    # in case the string is empty the help function will print a list of all available commands
+    # the documentation is extracted from the docstrings once and the rendered markup is cached for the width of the
+    # output, until the commands change
     if command == "":
-        print_string_list = ["The following commands are available\n\n"]
-        # since the list of functions should be properly indented, meaning there should be clearly separated columns,
-        # the width of the first column must be calculated by using the length of the longest command as reference of
-        # how far it is possible to go
-        column_width = 0
-        for function in functions_list:
-            if len(function[0]) > column_width and len(function[0]) < max_column_width - 2:
-                column_width = len(function[0])
-        column_width += 2
-
-        # getting the doc string (only the explanation) for every command and replacing the second item of each
-        # function_list entry with this string. At this point every second item is the object of the function itself
-        # but that isnt needed in this context
-        for function in functions_list:
-            doc_string = str(inspect.getdoc(function[1]))
-            # slicing the docstring, so that it ends before the first parameter is described
-            doc_string = doc_string[:doc_string.find("\n:param")]
-            doc_string = doc_string.replace("\n", " ")
-            function[1] = doc_string
-
         widget_width = int((console.get_width() / console.get_font_size()) * 1.8)
-        column_indent = " " * column_width
-        space_left = widget_width - column_width
-        print(space_left)
-        # adding the function names in bold and enough whitespaces to fill the column before adding the doc strings
-        # in gray color
-        for function in functions_list:
-            print_string_list.append("[color=3AD126]{}[/color]{}".format(function[0], " " * (column_width - len(function[0]))))
-            print_string_list.append("[color=808080]")
-            print_string_list.append(function[1])
-            print_string_list.append("[/color]\n\n")
-
-        console.print_info(''.join(print_string_list))
+        console.print_info(help_index.render_list(widget_width, search, max_column_width))
+        return
+
+    name = command if isinstance(command, str) else getattr(command, "__name__", str(command))
+    markup = help_index.render_command(name)
+    if markup is None:
+        if isinstance(command, str):
+            suggestions = [entry.name for entry in help_index.search(command)[:3]]
+            raise NotImplementedError("the command '{}' does not exist{}".format(
+                command, ", did you mean: {}".format(", ".join(suggestions)) if len(suggestions) > 0 else ""))
+        # a function, that isn't a command
+        markup = render_command(CommandInfo(name, command))
+    console.print_info(markup)
+
+
+def statistics(console):
+    """
+    prints how often the inputs could be executed by the fast path, calling the command directly, and how often the
+    compiled code of an input could be taken from the cache
+    :param console: -
+    :return: (void)
+    """
+    fastpath_statistics = fastpath.get_statistics()
+    cache_statistics = translate.get_cache_statistics()
+    print_string_list = ["fast path: [color=3AD126]{hits}[/color] hits, {misses} misses ({rate:.1f} %)\n".format(
+                             rate=fastpath_statistics["hit_rate"] * 100, **fastpath_statistics),
+                         "compile cache: [color=3AD126]{hits}[/color] hits, {misses} misses, {size}/{max_size} "
+                         "entries, {evictions} evictions".format(**cache_statistics)]
+    console.print_info(''.join(print_string_list))
+
+
+def reload(console):
+    """
+    reloads the commands module, so that changed or newly added commands can be used without restarting the
+    application. Only the changed commands are indexed again
+    :param console: -
+    :return: (void)
+    """
+    changes, duration = reload_commands()
+    console.session.refresh(force=True)
+    console.print_info(format_reload_report(changes, duration))
+
+
+# The commands, that are provided by the console itself in addition to the functions of the commands module
+CONSOLE_COMMANDS = {"help": help,
+                    "statistics": statistics,
+                    "reload": reload,
+                    "jobs": background.jobs,
+                    "wait": background.wait,
+                    "cancel": background.cancel,
+                    "variables": session.variables,
+                    "free": session.free}
+
 
+# The namespace the inputs are executed in. Contains every name, that an 'import *' of the commands module would
+# import, as well as the commands of the console itself. Filled once the commands are first needed
+command_namespace = {}
+
+# The commands module of the project folder, imported on first use
+_commands_module = None
+
+# In case the commands are a package: the names of its submodules by the paths of their source files and the states
+# of these files at the time they have been scanned
+_package_files = {}
+_package_states = {}
+
+# The on-disk cache of the scanned commands of the package, loaded once the package is first scanned
+_index_cache = None
+
+# The names of the console commands, that are replaced by commands of the project
+_shadowed_commands = set()
+
+
+def load_commands():
+    """
+    imports the commands module of the project folder, in case that hasn't already been done, fills the namespace
+    for the execution of the inputs and builds the command index. Importing the commands is deferred until the first
+    console is created, as the module can pull in heavy dependencies of the project.
+    The commands can also be a package: the commands of its submodules are found by scanning their source files and
+    a submodule is only imported, once one of its commands is called
+    :return: (module) the commands module
+    """
+    global _commands_module
+    if _commands_module is None:
+        _commands_module = importlib.import_module("commands")
+        _update_commands(_commands_module)
+    return _commands_module
+
+
+def reload_commands():
+    """
+    reloads the commands module and updates the command index with it, so that changed or newly added command
+    functions can be used without restarting the application. Only in case any command has actually changed, the
+    version of the index is incremented, which invalidates all cached translations. In case the module can't be
+    executed, the exception is raised and the previous commands stay in use
+    :return: (tuple) the dict of the sets of the names of the 'added', 'removed' and 'changed' commands and the amount
+    of seconds the reload took
+    """
+    start_time = time.perf_counter()
+    module = importlib.reload(load_commands())
+    # the changed submodules of a package are imported again by the next call of one of their commands
+    commandpackage.unload_changed_modules(_package_files, _package_states)
+    changes = _update_commands(module, incremental=True)
+    return changes, time.perf_counter() - start_time
+
+
+def format_reload_report(changes, duration):
+    """
+    :param changes: (dict) the sets of the names of the 'added', 'removed' and 'changed' commands
+    :param duration: (float) the amount of seconds the reload took
+    :return: (string) the summary of the reload, like 'reloaded commands in 3.1 ms: changed plot, added load'
+    """
+    parts = ["{} {}".format(kind, ", ".join(sorted(changes[kind])))
+             for kind in ("changed", "added", "removed") if len(changes[kind]) > 0]
+    return "reloaded commands in {:.1f} ms: {}".format(duration * 1000, ", ".join(parts) or "no commands changed")
+
+
+def _update_commands(module, incremental=False):
+    """
+    updates the execution namespace and the command index with the contents of the given commands module
+    :param module: (module) the commands module
+    :param incremental: (bool) whether to update the existing index, instead of building it from scratch
+    :return: (int) the new version of the command index, the dict of the changes for an incremental update
+    """
+    global _package_files, _package_states, _index_cache
+    # the namespace is modified in place, as the running consoles hold a reference to it
+    if hasattr(module, "__all__"):
+        names = module.__all__
     else:
-        functions_dict = {}
-        doc_string = ""
-        for function in functions_list:
-            functions_dict[function[0]] = function[1]
-        if command in functions_dict.keys():
-            print_string_list = ["\n\n[color=3AD126]", command, "[/color]\n"]
-            doc_string = str(inspect.getdoc(functions_dict[command]))
-        elif inspect.isfunction(command):
-            print_string_list = ["\n\n[color=3AD126]", str(command.__name__), "[/color]\n"]
-            doc_string = str(inspect.getdoc(command))
-        else:
-            raise NotImplementedError("the command '{}' does not exist".format(command))
-
-        # adding the explanatory string to the list of string to assemble
-        print_string_list.append("[color=808080]{}[/color]\n".format(doc_string[:doc_string.find("\n:param")]))
-
-        # splitting it into lines
-        doc_string_lines = doc_string.split("\n")
-        first_parameter = True
-        for line in doc_string_lines:
-            if line[:7] == ":param ":
-                if not first_parameter:
-                    parameter_name = line[7:line[1:].find(":")+1]
-                    print_string_list.append("-- {}\n".format(parameter_name))
-                else:
-                    first_parameter = False
-            if line[:8] == ":return:":
-                print_string_list.append("returns: [color=808080]{}[/color]".format(line.replace(":return:", "")))
-
-        console.print_info(''.join(print_string_list))
-
-
-class SimplePisoleConsole(threading.Thread):
+        names = [name for name in vars(module).keys() if not name.startswith("_")]
+    lazy_commands = {}
+    if commandpackage.is_package(module):
+        # only the submodules, that have changed since the last start, have to be scanned
+        if _index_cache is None:
+            _index_cache = commandpackage.get_index_cache(module)
+        lazy_commands, _package_files = commandpackage.scan_package(module, _index_cache)
+        _index_cache.save()
+        _package_states = commandpackage.get_file_states(_package_files)
+        # the names defined by the package itself take precedence over the commands of its submodules, except for
+        # the submodules, that are set as attributes of the package once they're imported
+        lazy_commands = {name: command for name, command in lazy_commands.items()
+                         if isinstance(getattr(module, name, None), (types.ModuleType, type(None)))}
+    # the commands of the project take precedence over the commands of the console with the same names
+    project_names = set(names) | set(lazy_commands.keys())
+    console_commands = {name: command for name, command in CONSOLE_COMMANDS.items() if name not in project_names}
+    _report_shadowed_commands(set(CONSOLE_COMMANDS.keys()) & project_names)
+    command_namespace.clear()
+    command_namespace.update(console_commands)
+    command_namespace.update((name, getattr(module, name)) for name in names)
+    command_namespace.update(lazy_commands)
+    # calling a coroutine command starts it as a job within the event loop of the console
+    command_namespace.update(background.wrap_commands(command_namespace))
+    # the translation only modifies calls of known commands
+    extra_functions = dict(lazy_commands, **console_commands)
+    if incremental:
+        return command_index.update(module, extra_functions)
+    return command_index.build(module, extra_functions)
+
+
+def _report_shadowed_commands(names):
+    """
+    warns about the commands of the console, that are replaced by commands of the project with the same names. Every
+    name is only reported once, not again with every reload
+    :param names: (set) the names of the replaced console commands
+    :return: (void)
+    """
+    global _shadowed_commands
+    new_names = names - _shadowed_commands
+    if len(new_names) > 0:
+        print("the commands module replaces the console commands {}".format(", ".join(sorted(new_names))),
+              file=sys.stderr)
+    _shadowed_commands = names
+
+
+def get_command_files():
+    """
+    :return: (list) the paths of the source files of the commands, the submodules included for a commands package
+    """
+    return [load_commands().__file__] + sorted(_package_files.keys())
+
+
+def watch_commands(engine):
+    """
+    starts a file watcher, that reloads the commands module within the console thread of the given engine, whenever
+    the file of the module changes. The result of the reload is printed as a new entry of the output
+    :param engine: (ConsoleEngine) the console to reload the commands in
+    :return: (FileWatcher) the started watcher, to be stopped when the console is closed
+    """
+    def on_change(paths):
+        # the reload has to be done within the console thread, between the execution of two inputs
+        if engine.loop is not None and not engine.loop.is_closed():
+            engine.loop.call_soon_threadsafe(_hot_reload, engine)
+
+    # the directories of a commands package are watched as a whole, so a newly added submodule is picked up as well
+    module = load_commands()
+    directories = list(module.__path__) if commandpackage.is_package(module) else []
+    watcher = FileWatcher(get_command_files(), on_change, directories=directories)
+    watcher.start()
+    return watcher
+
+
+def _hot_reload(engine):
+    entry_id = engine.frontend.new_command("reload()")
+    try:
+        changes, duration = reload_commands()
+    except Exception as exception:
+        engine.frontend.print_message(message.ErrorMessage(exception), entry_id)
+        return
+    engine.session.refresh(force=True)
+    engine.frontend.print_message(message.InfoMessage(format_reload_report(changes, duration)), entry_id)
+
+
+class SimplePisoleConsole(ConsoleEngine):
     """
     SUMMARY
     This class is a wrapper around the SimpleConsole kivy widget. Once an instance of this class is created, the actual
@@ -104,7 +251,8 @@ class SimplePisoleConsole(threading.Thread):
     adds the actual functionality of a console/terminal though. in its main, thread loop the program will constantly
     check for any user input and then proceed to first translate the issued command into a namespace specific python
     syntax, before executing via the python interpreter. The output of the command will then be printed into the output
-    window of the console widget.
+    window of the console widget. The functionality is inherited from the ConsoleEngine, with the kivy widget as its
+    frontend.
 
     THE WIDGET
     The Widget (SimpleConsoleWidget) consists of a input line at the bottom of the grid layout and a much larger
@@ -112,86 +260,74 @@ class SimplePisoleConsole(threading.Thread):
     The InputLine is used to enter the commands to be executed and can mostly be used just like any other input widget.
     The command can be executed by pressing enter with an already entered string. Pressing Tab will expand the input
     widget by an additional line to support multiline python input syntax. Indents must be done manually.
-    The Output Window is a Scroll View Container, which gets extended by one additional label widget per separate
-    issued input.
+    The Output Window displays one entry per issued input, the text of an entry being split into blocks of lines with
+    one label each. The scrollback is limited, the oldest entries are removed once the limits are exceeded and their
+    labels are reused for new blocks. Alternatively the widget can use the recycle output, which only renders the
+    visible blocks (see the 'output' parameter of the SimpleConsoleWidget).
 
     THE SYNTAX
     The syntax os basically the original Python syntax.
-    Temporary Variables can be used in the context of a single issued input.
+    Variables are kept within the session of the console, so a variable assigned by one input can be used by all the
+    following ones. 'variables()' lists them with their type and memory footprint and 'free("name")' deletes them
+    again (all of them without a name), a variable shadowing a command being replaced by the command.
     Python built in functions can be used
     And most importantly every function, that is defined inside a 'commands.py' module, that is located in the same
     file directory layer as the pisole package
     Multiline commands with indent are supported
 
     :ivar console_widget: (SimpleConsoleWidget) The actual kivy widget representing the console on screen
+
+    :param cache_size: (int) The maximum amount of translated and compiled inputs to be cached
+    :param max_jobs: (int) The maximum amount of background jobs ('!command()') running at the same time
+    :param command_timeout: (float) The amount of seconds after which every command is cancelled, None meaning no
+    timeout
+    :param hot_reload: (bool) Whether to reload the commands module automatically, whenever its file changes
     """
-    def __init__(self):
-        # Initializing the threading.Thread super class
-        super(SimplePisoleConsole, self).__init__()
+    def __init__(self, cache_size=256, translation_engine=None, max_jobs=4, command_timeout=None, hot_reload=False):
+        # the kivy widget is only imported, once a console with a graphical user interface is actually created
+        from pisole.consolewidget import SimpleConsoleWidget
         # creating the actual kivy Console Widget, that will be displayed later
         self.console_widget = SimpleConsoleWidget()
+        # Initializing the ConsoleEngine super class with the widget as frontend and the namespace containing all the
+        # commands
+        load_commands()
+        super(SimplePisoleConsole, self).__init__(self.console_widget, namespace=command_namespace,
+                                                  cache_size=cache_size, translation_engine=translation_engine,
+                                                  max_jobs=max_jobs, command_timeout=command_timeout)
+        self.watcher = watch_commands(self) if hot_reload else None
 
     def run(self):
-
-        # The main loop of the Thread, continuesly checking for user input inside the buffer of the widget and executing
-        # the respective command functions
-        while True:
-            if not self.console_widget.is_input_available():
-                # just waiting in standby in case there is no input from the user available
-                time.sleep(0.001)
-            else:
-                time.sleep(0.001)
-                # saving the user input string into a separate variable to clear the buffer
-                input_string = self.console_widget.pop_latest_input(blocking=False)
-                self.console_widget.new_command(input_string)
-                # translating the user input string, so that the first parameter of every command call is this very
-                # pisole object itself, so that the command can properly interact with the ui widget
-                translated_input = translate.translate(input_string, "self")
-                try:
-                    # compiling and then executing the translated version of the user issued input string
-                    compiled_input = compile(translated_input, "<string>", "exec")
-                    exec(compiled_input)
-                except Exception as exception:
-                    traceback.print_tb(sys.exc_info()[2])
-                    self.print_error(exception)
+        try:
+            super(SimplePisoleConsole, self).run()
+        finally:
+            if self.watcher is not None:
+                self.watcher.stop()
 
     def get_widget(self):
         return self.console_widget
 
-    def print_info(self, string):
-        info_message = message.InfoMessage(string)
-        self.console_widget.println(info_message.get_kivy())
-
-    def print_result(self, string):
-        result_message = message.ResultMessage(string)
-        self.console_widget.println(result_message.get_kivy())
-
-    def print_error(self, exception):
-        error_message = message.ErrorMessage(exception)
-        self.console_widget.println(error_message.get_kivy())
-
-    # TODO: add timeout
-    def prompt_input(self, prompt_string):
-        input_message = message.InputPromptMessage(prompt_string)
-        self.console_widget.println(input_message.get_kivy())
-        starting_length_buffer = len(self.console_widget.entered_strings_list)
-        while True:
-            time.sleep(0.0001)
-            length_buffer = len(self.console_widget.entered_strings_list)
-            if length_buffer < starting_length_buffer:
-                starting_length_buffer = length_buffer
-            elif length_buffer > starting_length_buffer:
-                return self.console_widget.pop_latest_input()
-
-    def get_width(self):
-        return self.console_widget.output_window.width
-
-    def get_font_size(self):
-        return self.console_widget.get_font_size()
-
-    def _print(self, string):
-        self.console_widget.print(string)
-
-    def _println(self, string):
-        self.console_widget.println(string)
 
+def run_headless(input_stream=None, output_stream=None, translation_engine=None, command_timeout=None,
+                 hot_reload=False):
+    """
+    runs the console without a graphical user interface in the calling thread, reading the commands from the input
+    stream and writing the output to the output stream, on default stdin and stdout
+    :param input_stream: (file) the stream to read the inputs from
+    :param output_stream: (file) the stream to write the output to
+    :param translation_engine: (string) the name of the translation algorithm to use
+    :param command_timeout: (float) the amount of seconds after which every command is cancelled
+    :param hot_reload: (bool) whether to reload the commands module automatically, whenever its file changes
+    :return: (void)
+    """
+    load_commands()
+    frontend = StreamFrontend(input_stream, output_stream)
+    frontend.start()
+    engine = ConsoleEngine(frontend, namespace=command_namespace, translation_engine=translation_engine,
+                           command_timeout=command_timeout)
+    watcher = watch_commands(engine) if hot_reload else None
+    try:
+        engine.run()
+    finally:
+        if watcher is not None:
+            watcher.stop()
+        frontend.stop()
@@ -0,0 +1,294 @@
+__author__ = 'Jonas'
+import pisole.message as message
+from pisole.cancellation import CommandCancelled
+import concurrent.futures
+import multiprocessing
+import importlib
+import functools
+import itertools
+import threading
+import atexit
+import time
+import signal
+import queue
+import os
+
+
+# The persistent pool of worker processes and the manager providing the message queues, both created on first use
+_process_pool = None
+_manager = None
+_pool_lock = threading.Lock()
+
+# The message queues and cancellation events, that aren't used by a running command, kept to be reused by the next
+# commands, as creating them within the manager process takes a round trip
+_free_channels = []
+
+# The amount of seconds a cancelled command gets to check its cancellation token and return, before its worker process
+# is terminated
+CANCEL_GRACE_PERIOD = 1.0
+
+# The counter providing the ids of the calls, which mark the messages signaling the end of a call
+_call_counter = itertools.count()
+
+# The first items of the messages put into the queue, once the command has started within a worker process, has
+# finished and has been cancelled
+_STARTED = "__pisole_started__"
+_DONE = "__pisole_done__"
+_CANCELLED = "__pisole_cancelled__"
+
+
+class ProcessConsole:
+    """
+    The console object passed to a command running within a worker process. The child has no access to the frontend,
+    therefore all the prints are put into a queue as Message objects (respectively plain strings for the raw prints),
+    which the parent process fetches and passes on to the actual console.
+
+    :ivar message_queue: (multiprocessing.Queue) The queue the messages are put into
+    :ivar width: (int) The width of the output at the time the command was started
+    :ivar font_size: (int) The font size of the output at the time the command was started
+    :ivar cancellation_token: (ProcessCancellationToken) The token signaling, that the command has been cancelled
+    """
+    def __init__(self, message_queue, width, font_size, cancel_event):
+        self.message_queue = message_queue
+        self.width = width
+        self.font_size = font_size
+        self.cancellation_token = ProcessCancellationToken(cancel_event)
+
+    def print_info(self, string):
+        self.message_queue.put(message.InfoMessage(string))
+
+    def print_result(self, string):
+        self.message_queue.put(message.ResultMessage(string))
+
+    def print_error(self, exception):
+        self.message_queue.put(message.ErrorMessage(exception))
+
+    def print_message(self, message_object):
+        self.message_queue.put(message_object)
+
+    def prompt_input(self, prompt_string):
+        raise RuntimeError("a command running in a separate process can't prompt for input")
+
+    def get_width(self):
+        return self.width
+
+    def get_font_size(self):
+        return self.font_size
+
+    def _print(self, string):
+        self.message_queue.put(string)
+
+    def _println(self, string):
+        self.message_queue.put(string + "\n")
+
+
+class ProcessCancellationToken:
+    """
+    The cancellation token of a command running within a worker process, offering the same checks as the
+    CancellationToken of the console. The cancellation is signaled by an event of the manager process, so every check
+    takes a round trip to the manager and shouldn't be done within every iteration of a tight loop. A command, that
+    doesn't return within the CANCEL_GRACE_PERIOD after the cancellation, is terminated together with its worker
+    process.
+
+    :ivar reason: (string) The reason given to the CommandCancelled exception
+    """
+    def __init__(self, cancel_event):
+        self.reason = "cancelled"
+        self._event = cancel_event
+
+    @property
+    def cancelled(self):
+        return self._event.is_set()
+
+    def check(self):
+        """
+        raises a CommandCancelled exception, in case the command has been cancelled
+        :return: (void)
+        """
+        if self._event.is_set():
+            raise CommandCancelled(self.reason)
+
+    def sleep(self, seconds):
+        """
+        an alternative to time.sleep, that returns as soon as the command is cancelled
+        :param seconds: (float) the amount of seconds to sleep
+        :return: (void)
+        """
+        self._event.wait(seconds)
+        self.check()
+
+
+def get_process_pool():
+    """
+    returns the pool of worker processes, creating it on the first call. The pool is kept alive for the whole session,
+    so only the first command pays for starting the processes and importing the commands module within them
+    :return: (tuple) the ProcessPoolExecutor and the multiprocessing Manager
+    """
+    global _process_pool, _manager
+    with _pool_lock:
+        if _process_pool is None:
+            _manager = multiprocessing.Manager()
+            _process_pool = concurrent.futures.ProcessPoolExecutor(max_workers=os.cpu_count())
+            # the worker processes and the manager would outlive the console otherwise
+            atexit.register(shutdown_process_pool)
+        return _process_pool, _manager
+
+
+def shutdown_process_pool():
+    """
+    terminates the worker processes and the manager, the next command running in a process starts a new pool
+    :return: (void)
+    """
+    global _process_pool, _manager
+    with _pool_lock:
+        if _process_pool is not None:
+            _process_pool.shutdown(wait=False, cancel_futures=True)
+            _manager.shutdown()
+            _process_pool = None
+            _manager = None
+            del _free_channels[:]
+        atexit.unregister(shutdown_process_pool)
+
+
+def _discard_process_pool(process_pool):
+    # the pool breaks, once one of its worker processes has been terminated. The next command starts a new one, the
+    # manager stays in use
+    global _process_pool
+    with _pool_lock:
+        if _process_pool is process_pool:
+            _process_pool = None
+    process_pool.shutdown(wait=False, cancel_futures=True)
+
+
+def _acquire_channel(manager):
+    # the message queue and the cancellation event for a call
+    with _pool_lock:
+        if len(_free_channels) > 0:
+            message_queue, cancel_event = _free_channels.pop()
+            cancel_event.clear()
+            return message_queue, cancel_event
+    return manager.Queue(), manager.Event()
+
+
+def _release_channel(channel):
+    with _pool_lock:
+        _free_channels.append(channel)
+
+
+def _run_command(call_id, module_name, function_name, message_queue, cancel_event, width, font_size, args, kwargs):
+    # executed within the worker process: the function is looked up by its name, as the function objects of the
+    # commands module can't be pickled reliably, and the decorator is removed, so the command doesn't submit itself
+    # to the pool again
+    # the parent needs the id of the process to terminate it, in case the command ignores its cancellation
+    message_queue.put((_STARTED, call_id, os.getpid()))
+    try:
+        module = importlib.import_module(module_name)
+        function = getattr(module, function_name)
+        while hasattr(function, "__wrapped__"):
+            function = function.__wrapped__
+        # exceptions are pickled and raised again in the parent by the future, where the console reports them
+        return function(ProcessConsole(message_queue, width, font_size, cancel_event), *args, **kwargs)
+    finally:
+        # all the messages of the command are within the queue before this one, so the parent can stop relaying
+        message_queue.put((_DONE, call_id))
+
+
+def _relay_message(console, item):
+    # plain strings are the raw prints, everything else is a Message object
+    if isinstance(item, str):
+        console._print(item)
+    else:
+        console.print_message(item)
+
+
+def _relay_messages(console, message_queue, call_id, process_pool, future, cancel_event, cancellation_token):
+    """
+    passes the messages of the command on to the console, waiting without a timeout until the command is done or
+    cancelled
+    :return: (void)
+    """
+    process_id = None
+    deadline = None
+    while True:
+        try:
+            item = message_queue.get(timeout=None if deadline is None else max(deadline - time.perf_counter(), 0))
+        except queue.Empty:
+            # the command ignores its cancellation
+            if process_id is not None:
+                os.kill(process_id, signal.SIGTERM)
+            _discard_process_pool(process_pool)
+            raise CommandCancelled(cancellation_token.reason)
+        if not (isinstance(item, tuple) and len(item) >= 2 and item[0] in (_STARTED, _DONE, _CANCELLED)):
+            _relay_message(console, item)
+        elif item[1] != call_id:
+            # the messages of a previous call using the same queue are ignored
+            continue
+        elif item[0] == _STARTED:
+            process_id = item[2]
+        elif item[0] == _DONE:
+            return
+        elif item[0] == _CANCELLED:
+            if future.cancel():
+                raise CommandCancelled(cancellation_token.reason)
+            cancel_event.set()
+            deadline = time.perf_counter() + CANCEL_GRACE_PERIOD
+
+
+def run_in_process(function):
+    """
+    decorator for the command functions of the commands module, which are supposed to be executed in a worker process
+    of a persistent process pool instead of the console thread. Useful for cpu heavy commands, as they can use all
+    the cores of the machine and don't hold the global interpreter lock, keeping the user interface responsive.
+
+    The command receives a ProcessConsole, so print_info, print_result and print_error work as usual, the messages
+    being sent back to the console through a queue. The parameters and the return value of the command have to be
+    picklable, and the command can't prompt for input. The console is blocked until the command returns, unless it is
+    issued as a background job with the '!' prefix.
+
+    The command can be cancelled like any other: a command, that hasn't been started by the pool yet, is removed from
+    it, a running one is signaled through its cancellation token. In case it doesn't return within the
+    CANCEL_GRACE_PERIOD, its worker process is terminated, which breaks the pool: the other commands running within it
+    fail and the next command starts a new pool.
+
+    EXAMPLE:
+    @run_in_process
+    def compute(console, n):
+        console.print_result(str(sum(i * i for i in range(n))))
+
+    :param function: (function) the command function
+    :return: (function) the wrapped command
+    """
+    @functools.wraps(function)
+    def wrapper(console, *args, **kwargs):
+        process_pool, manager = get_process_pool()
+        channel = _acquire_channel(manager)
+        message_queue, cancel_event = channel
+        call_id = next(_call_counter)
+        future = process_pool.submit(_run_command, call_id, function.__module__, function.__name__, message_queue,
+                                     cancel_event, console.get_width(), console.get_font_size(), args, kwargs)
+        # in case the worker process dies, it can't signal the end of the command, the parent does it instead
+        future.add_done_callback(lambda _: message_queue.put((_DONE, call_id)))
+        # the cancellation wakes up the parent waiting for the messages of the command
+        cancellation_token = getattr(console, "cancellation_token", None)
+
+        def on_cancel():
+            message_queue.put((_CANCELLED, call_id))
+
+        if cancellation_token is not None:
+            cancellation_token.add_callback(on_cancel)
+        try:
+            _relay_messages(console, message_queue, call_id, process_pool, future, cancel_event, cancellation_token)
+        except CommandCancelled:
+            # a command removed from the pool before it started hasn't put anything into the queue. The queue of a
+            # terminated command may still contain its prints, which would end up within the output of the next
+            # command, so that channel isn't reused. The manager frees its objects, once the proxies are gone
+            if future.cancelled():
+                _release_channel(channel)
+            raise
+        finally:
+            if cancellation_token is not None:
+                cancellation_token.remove_callback(on_cancel)
+        _release_channel(channel)
+        return future.result()
+    wrapper.run_in_process = True
+    return wrapper
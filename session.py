@@ -0,0 +1,195 @@
+__author__ = 'Jonas'
+from pisole.commandindex import command_index
+import collections
+import sys
+
+
+# The maximum amount of objects visited to estimate the memory footprint of a single variable. Larger structures are
+# reported with the size of the visited part, marked as a lower bound
+MAX_SIZE_OBJECTS = 1000000
+
+# The types, whose objects are shared and therefore not counted into the size of the variables referencing them
+_SHARED_TYPES = (type, type(sys), type(len), type(lambda: None))
+
+
+class Session:
+    """
+    The persistent namespace of a console, that the inputs are executed in. Variables assigned by one input stay
+    available for all the following inputs, so expensive results don't have to be computed again.
+
+    The namespace is seeded with the commands (the contents of the commands module and the commands of the console
+    itself). These seed names are protected: they can be shadowed by a variable, but freeing them restores the command
+    instead of removing it. Whenever the command index is rebuilt, the seed is refreshed, without touching the
+    variables of the user.
+
+    :ivar namespace: (dict) The namespace the inputs are executed in
+    :ivar seed: (dict) The namespace the session has been seeded with, the commands module namespace of the console
+    :ivar console: (object) The console object, accessible as 'self' within the inputs
+    """
+    def __init__(self, seed, console):
+        self.seed = seed
+        self.console = console
+        self.namespace = {}
+        # the copy of the seed, the namespace has last been updated with, to detect the names shadowed by the user
+        self._seeded = {}
+        self._seed_version = None
+        self.refresh()
+
+    def refresh(self, force=False):
+        """
+        updates the namespace with the current contents of the seed, in case the command index has been rebuilt since
+        the last update. Names, that have been assigned by the user, aren't overwritten
+        :param force: (bool) whether to update the namespace even if the command index hasn't changed, for example
+        after reloading the commands module, which may have changed other names than the commands
+        :return: (void)
+        """
+        if not force and self._seed_version == command_index.version and len(self._seeded) == len(self.seed):
+            return
+        missing = object()
+        for name, value in self._seeded.items():
+            # removing the commands, that no longer exist, unless the user has assigned the name
+            if name not in self.seed and self.namespace.get(name, missing) is value:
+                del self.namespace[name]
+        for name, value in self.seed.items():
+            if name not in self.namespace or self.namespace[name] is self._seeded.get(name, missing):
+                self.namespace[name] = value
+        self.namespace["self"] = self.console
+        self._seeded = dict(self.seed)
+        self._seed_version = command_index.version
+
+    def get_variables(self):
+        """
+        returns the variables assigned by the user, including the ones shadowing a command
+        :return: (dict) the names and values of the variables
+        """
+        missing = object()
+        return {name: value for name, value in self.namespace.items()
+                if not (name == "self" or (name.startswith("__") and name.endswith("__"))) and
+                value is not self._seeded.get(name, missing)}
+
+    def free(self, name):
+        """
+        removes the variable with the given name from the namespace. In case it shadowed a command, the command is
+        restored
+        :param name: (string) the name of the variable
+        :return: (object) the value, that has been removed
+        """
+        variables = self.get_variables()
+        if name not in variables:
+            raise KeyError("there is no variable '{}'".format(name))
+        value = variables[name]
+        if name in self._seeded:
+            self.namespace[name] = self._seeded[name]
+        else:
+            del self.namespace[name]
+        return value
+
+    def fork(self, console):
+        """
+        creates a copy of the namespace for a background job, which may not modify the namespace of the console while
+        other inputs are executed
+        :param console: (object) the console object of the job, accessible as 'self' within its input
+        :return: (tuple) the namespace for the job and the state of the namespace before the job, to be passed to
+        'merge' when the job is done
+        """
+        baseline = dict(self.namespace)
+        return dict(baseline, self=console), baseline
+
+    def merge(self, namespace, baseline):
+        """
+        applies the assignments and deletions, that a background job has done within its forked namespace, to the
+        namespace of the console
+        :param namespace: (dict) the namespace of the job
+        :param baseline: (dict) the state of the namespace before the job
+        :return: (list) the names, that have been assigned
+        """
+        missing = object()
+        assigned = []
+        for name, value in namespace.items():
+            if name == "self" or (name.startswith("__") and name.endswith("__")):
+                continue
+            if baseline.get(name, missing) is not value:
+                self.namespace[name] = value
+                assigned.append(name)
+        for name, value in baseline.items():
+            # only deleting names, that haven't been reassigned by the console meanwhile
+            if name not in namespace and self.namespace.get(name, missing) is value:
+                del self.namespace[name]
+        return assigned
+
+
+def get_size(value):
+    """
+    estimates the memory footprint of the given value, including all the objects it contains. Modules, classes and
+    functions are shared objects and aren't counted
+    :param value: (object) the value
+    :return: (tuple) the size in bytes and whether the size is exact (False in case the value consists of more than
+    MAX_SIZE_OBJECTS objects and only a part of it has been measured)
+    """
+    size = 0
+    seen = set()
+    stack = [value]
+    while len(stack) > 0:
+        if len(seen) >= MAX_SIZE_OBJECTS:
+            return size, False
+        item = stack.pop()
+        if id(item) in seen or isinstance(item, _SHARED_TYPES):
+            continue
+        seen.add(id(item))
+        size += sys.getsizeof(item)
+        if isinstance(item, dict):
+            stack.extend(item.keys())
+            stack.extend(item.values())
+        elif isinstance(item, (list, tuple, set, frozenset, collections.deque)):
+            stack.extend(item)
+        elif hasattr(item, "__dict__"):
+            stack.append(item.__dict__)
+    return size, True
+
+
+def format_size(size):
+    """
+    :param size: (int) the amount of bytes
+    :return: (string) the size with the fitting unit, like '3.2 MB'
+    """
+    for unit in ("B", "kB", "MB", "GB"):
+        if size < 1024 or unit == "GB":
+            return "{:.0f} {}".format(size, unit) if unit == "B" else "{:.1f} {}".format(size, unit)
+        size /= 1024
+
+
+def variables(console):
+    """
+    prints all the variables, that have been assigned within the console, with their type and memory footprint
+    :param console: -
+    :return: (void)
+    """
+    session_variables = console.session.get_variables()
+    if len(session_variables) == 0:
+        console.print_info("there are no variables")
+        return
+    sizes = {name: get_size(value) for name, value in session_variables.items()}
+    print_string_list = ["variables\n"]
+    for name in sorted(sizes, key=lambda name: sizes[name][0], reverse=True):
+        size, exact = sizes[name]
+        print_string_list.append("[color=3AD126]{:<20}[/color] {:<16}{:>12}{}\n".format(
+            name, type(session_variables[name]).__name__, format_size(size), "" if exact else "+"))
+    print_string_list.append("total: {}".format(format_size(sum(size for size, _ in sizes.values()))))
+    console.print_info(''.join(print_string_list))
+
+
+def free(console, *names):
+    """
+    deletes the variables with the given names or, on default, all the variables. A variable shadowing a command is
+    replaced by the command again
+    :param console: -
+    :param names: (string) the names of the variables to delete
+    :return: (void)
+    """
+    session = console.session
+    if len(names) == 0:
+        names = list(session.get_variables().keys())
+    freed_size = 0
+    for name in names:
+        freed_size += get_size(session.free(name))[0]
+    console.print_result("freed {} variables ({})".format(len(names), format_size(freed_size)))
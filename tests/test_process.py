@@ -0,0 +1,86 @@
+__author__ = 'Jonas'
+from pisole.cancellation import CancellationToken, CommandCancelled
+from pisole.process import run_in_process
+import pisole.process as process
+import unittest
+import time
+
+
+@run_in_process
+def chatty(console, count):
+    # keeps printing while ignoring its cancellation, so it is terminated with prints left within its queue
+    for index in range(count):
+        console._print("chatty {}\n".format(index))
+        time.sleep(0.001)
+
+
+@run_in_process
+def polite(console, seconds):
+    console._print("polite started\n")
+    console.cancellation_token.sleep(seconds)
+
+
+@run_in_process
+def echo(console, value):
+    console._print("echo {}\n".format(value))
+    return value
+
+
+class RecordingConsole:
+    """
+    The console passed to the commands, recording the raw prints
+    """
+    def __init__(self):
+        self.cancellation_token = CancellationToken()
+        self.prints = []
+
+    def get_width(self):
+        return 80
+
+    def get_font_size(self):
+        return 1
+
+    def _print(self, string):
+        self.prints.append(string)
+
+    def print_message(self, message_object):
+        self.prints.append(message_object.get_string())
+
+
+class TestRunInProcess(unittest.TestCase):
+
+    def setUp(self):
+        self.grace_period = process.CANCEL_GRACE_PERIOD
+        process.CANCEL_GRACE_PERIOD = 0.2
+
+    def tearDown(self):
+        process.CANCEL_GRACE_PERIOD = self.grace_period
+        process.shutdown_process_pool()
+
+    def test_call_after_terminated_command(self):
+        console = RecordingConsole()
+        console.cancellation_token.cancel_after(0.3)
+        with self.assertRaises(CommandCancelled):
+            chatty(console, 100000)
+        self.assertTrue(any(string.startswith("chatty") for string in console.prints))
+
+        console = RecordingConsole()
+        self.assertEqual(echo(console, 7), 7)
+        self.assertEqual(console.prints, ["echo 7\n"])
+
+    def test_call_after_cancelled_command(self):
+        console = RecordingConsole()
+        console.cancellation_token.cancel_after(0.3)
+        with self.assertRaises(CommandCancelled):
+            polite(console, 10)
+        self.assertEqual(console.prints, ["polite started\n"])
+
+        # the command stopped within the grace period, its channel is reused
+        console = RecordingConsole()
+        self.assertEqual(echo(console, 8), 8)
+        self.assertEqual(console.prints, ["echo 8\n"])
+        self.assertEqual(len(process._free_channels), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,39 @@
+__author__ = 'Jonas'
+from pisole.commandindex import command_index
+import pisole.translate as translate
+import unittest
+import types
+
+
+def greet(console, name):
+    return "{} greets {}".format(console, name)
+
+
+class TestTranslation(unittest.TestCase):
+
+    def setUp(self):
+        module = types.ModuleType("commands")
+        module.greet = greet
+        command_index.build(module)
+
+    def execute(self, input_string, engine):
+        namespace = {"self": "console", "greet": greet}
+        exec(translate.compile_input("result = " + input_string, "self", engine), namespace)
+        return namespace["result"]
+
+    def test_command_call(self):
+        for engine in ("tokenize", "ast", None):
+            self.assertEqual(self.execute("greet('x')", engine), "console greets x")
+
+    def test_command_call_within_fstring(self):
+        for engine in ("tokenize", "ast", None):
+            self.assertEqual(self.execute("f\"{greet('x')}!\"", engine), "console greets x!")
+            self.assertEqual(self.execute("greet(F'{greet(1)}')", engine), "console greets console greets 1")
+
+    def test_command_name_within_string(self):
+        self.assertEqual(translate.translate("greet('greet(1)')", "self", "tokenize"), "greet(self,'greet(1)')")
+        self.assertEqual(translate.translate("rb'greet(1)'", "self", "tokenize"), "rb'greet(1)'")
+
+
+if __name__ == "__main__":
+    unittest.main()
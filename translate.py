@@ -1,31 +1,103 @@
 __author__ = 'Jonas'
 import re
-import os
-import pickle
-import inspect
-import configparser
-import JTSv2.execute as execute
-import JTSv2.lib.stringutil as stringops
+import io
+import ast
+import tokenize
+import sys
+from pisole.cache import LRUCache
+from pisole.commandindex import command_index
 
 
 ILLEGAL_CHARACTERS_FUNCTION_NOMENCLATURE = [" ", ",", ".", "-", "+"]
 
-BUILTIN_FUNCTION_NAMES =["abs", "all", "any", "ascii", "bin", "bool", "bytearray", "bytes", "callable", "char",
-                         "classmethod", "compile", "complex", "delattr", "dict", "dir", "divmod", "enumerate", "eval",
-                         "exec", "filter", "float", "format", "frozenset", "getattr", "globals", "hasattr", "hash",
-                         "hex", "id", "input", "int", "isinstance", "issubclass", "iter", "len", "list",
-                         "locals", "map", "max", "memoryview", "min", "next", "object", "oct", "open", "ord", "pow",
-                         "print", "property", "range", "repr", "reversed", "round", "set", "setattr", "slice", "sorted",
-                         "staticmethod", "str", "sum", "super", "tuple", "type", "vars", "zip"]
+# The token types, that can be placed between any two tokens without changing their meaning
+_INSIGNIFICANT_TOKEN_TYPES = frozenset([tokenize.NL, tokenize.COMMENT, tokenize.INDENT, tokenize.DEDENT])
 
+# Whether the tokenizer splits f-strings into their parts (python 3.12 and later). Before that an f-string is a single
+# string token, so the calls within its replacement fields can't be seen by the tokenize engine
+_FSTRING_TOKENIZED = sys.version_info >= (3, 12)
 
-def translate(input_str, first_parameter):
+# The cache for the compiled code objects of already translated inputs, keyed on the input string, the first
+# parameter and the translation engine. The cache is bound to the version of the command index
+compile_cache = LRUCache(max_size=256)
+
+# The flags for compiling the inputs. Allowing 'await' outside of a function lets an input await a coroutine command,
+# the resulting code object then has to be evaluated as a coroutine by the event loop of the console
+COMPILE_FLAGS = ast.PyCF_ALLOW_TOP_LEVEL_AWAIT
+
+
+def translate(input_str, first_parameter, engine=None):
+    """
+    translates the input string issued by the user, so that the given first parameter is passed as first argument to
+    every command call within the input.
+
+    :param input_str: (string) the string of the execution command, issued by the user of the console
+    :param first_parameter: (string) the name to be added as first parameter to every command call
+    :param engine: (string) the name of the translation algorithm to be used, has to be a key of the
+    TRANSLATION_ENGINES dict. None meaning the 'default_engine'
+    :return: (string) the translated string
+    """
+    engine = engine or default_engine
+    if engine in COMPILING_ENGINES:
+        # the engines working on the syntax tree can still provide the translated source code for inspection
+        return ast.unparse(_translate_commands_ast(input_str, first_parameter))
     translated_string = input_str
     # translated_string = _translate_environmental_variables(input_str)
-    translated_string = _translate_commands(translated_string, first_parameter)
+    translated_string = TRANSLATION_ENGINES[engine](translated_string, first_parameter)
     return translated_string
 
 
+def compile_input(input_str, first_parameter, engine=None):
+    """
+    translates the given input string and then compiles it into a code object, that can directly be executed. The
+    code objects are cached, so that an input, that is issued repeatedly (from the history for example) is only
+    translated and compiled once, as long as the set of commands doesn't change.
+
+    :param input_str: (string) the string of the execution command, issued by the user of the console
+    :param first_parameter: (string) the name to be added as first parameter to every command call
+    :param engine: (string) the name of the translation algorithm to be used. None meaning the 'default_engine'
+    :return: (code) the compiled code object of the translated input
+    """
+    engine = engine or default_engine
+    key = (input_str, first_parameter, engine)
+    version = command_index.version
+    code = compile_cache.get(key, version=version)
+    if code is None:
+        code = _compile_uncached(input_str, first_parameter, engine)
+        compile_cache.put(key, code, version=version)
+    return code
+
+
+def _compile_uncached(input_str, first_parameter, engine):
+    """
+    translates and compiles the input string with the given engine, bypassing the compile cache
+    :param input_str: (string) the string of the execution command, issued by the user of the console
+    :param first_parameter: (string) the name to be added as first parameter to every command call
+    :param engine: (string) the name of the translation algorithm to be used
+    :return: (code) the compiled code object of the translated input
+    """
+    if engine in COMPILING_ENGINES:
+        return COMPILING_ENGINES[engine](input_str, first_parameter)
+    return compile(translate(input_str, first_parameter, engine), "<string>", "exec", flags=COMPILE_FLAGS)
+
+
+def set_cache_size(max_size):
+    """
+    changes the maximum amount of compiled inputs, that are kept in the cache
+    :param max_size: (int) the new maximum size, 0 disabling the cache
+    :return: (void)
+    """
+    compile_cache.resize(max_size)
+
+
+def get_cache_statistics():
+    """
+    returns the hit, miss and eviction counters of the compile cache
+    :return: (dict)
+    """
+    return compile_cache.get_statistics()
+
+
 # Currently not in use for the Pisole Project
 def _translate_environmental_variables(input_string):
     """
@@ -41,6 +113,7 @@ def _translate_environmental_variables(input_string):
     :param input_string:
     :return:
     """
+    import JTSv2.lib.stringutil as stringops
     translated_string = input_string
     env_variable_list = _find_environmental_variables(input_string)
     for variable_name in env_variable_list:
@@ -61,13 +134,16 @@ def _translate_commands(input_string, first_parameter):
     interactions with the ui widget.
     This function essentially uses the original JTSHell algorithm to identify and split the input command string into
     the individual commands and simply adds the string given by the parameter 'first_parameter' as first parameter to
-    every non-builtin functioncall inside the input string.
+    every functioncall inside the input string, whose name is contained in the command index.
 
     :param input_string: (string) the string of the execution command, issued by the user of the console
     :param first_parameter: (string) This string will be added as first parameter to every function call within the
     input_string, that isnt a builtin function
     :return: (string) The translated string that can be straight used be dynamically executed by the python interpreter
     """
+    # the string utilities of the JTShell project are only imported by the legacy algorithm, the default translation
+    # engine doesn't depend on them
+    import JTSv2.lib.stringutil as stringops
     translated_string = input_string
 
     command_list = _find_whole_commands(input_string)
@@ -76,15 +152,13 @@ def _translate_commands(input_string, first_parameter):
         command_name = _get_commandname(command)
 
         # checking whether the current function call is a legit custom command or a python builtin, that is being used
-        # in case the reference dictionary doesnt know the command name, assuming it is a builtin or whatever
+        # in case the command index doesnt know the command name, assuming it is a builtin or whatever
         # skipping to the next command
-        if command_name in BUILTIN_FUNCTION_NAMES:
+        if command_name not in command_index:
             continue
 
-        # In case there is a exclamation mark in front of the command, this means, that the command si supposed to be
-        # run as a background process, therefore putting the main function call into background() function call, which
-        # is a function within the execute module, that expects an executer object and the execution statement as string
-        # so it can execute it as a Process.
+        # inputs, that are supposed to be run as background jobs (prefixed with an exclamation mark '!'), are detected
+        # and stripped of their prefix by the console engine before the translation (see the background module)
         translated_command = stringops.replace_ignore_in_quotationmarks(command, command_name + "(", ''.join([command_name,
                                                                                           "({},".format(first_parameter)]))
 
@@ -94,6 +168,155 @@ def _translate_commands(input_string, first_parameter):
     return translated_string
 
 
+def _translate_commands_tokenize(input_string, first_parameter):
+    """
+    The single pass alternative to the '_translate_commands' algorithm. Instead of searching the whole command strings
+    and replacing them within the input, this function uses the python tokenizer to walk through the tokens of the
+    input just once. Every name token directly followed by an opening bracket, whose name is contained in the command
+    index and which is neither a method call nor a function definition, is a command call, so the given first
+    parameter is inserted right after the opening bracket. Since strings and comments are separate tokens, brackets
+    within them are ignored automatically and nested calls need no recursion.
+    Before python 3.12 an f-string is a single token as well, so an input containing an f-string is translated by the
+    ast engine instead, which also finds the calls within the replacement fields.
+
+    EXAMPLE:
+    "This(This('hallo')) and That('not()')"
+    > "This(self,This(self,'hallo')) and That(self,'not()')"
+
+    :param input_string: (string) the string of the execution command, issued by the user of the console
+    :param first_parameter: (string) This string will be added as first parameter to every command call within the
+    input_string
+    :return: (string) The translated string that can be straight used be dynamically executed by the python interpreter
+    """
+    # the tokens only carry the row and column of their position, so the absolute offset of every line start within
+    # the string is needed to map them onto the string. The readline of the StringIO splits at '\n' only
+    line_offsets = [0, 0]
+    for line in input_string.split("\n"):
+        line_offsets.append(line_offsets[-1] + len(line) + 1)
+
+    insertion = "{},".format(first_parameter)
+    insertion_offsets = []
+    # the last two significant tokens, as a command call is a name token, which is not preceded by 'def' or a dot and
+    # followed by an opening bracket
+    before_name = None
+    name = None
+    fstring_found = False
+    try:
+        for token in tokenize.generate_tokens(io.StringIO(input_string).readline):
+            if token.type in _INSIGNIFICANT_TOKEN_TYPES:
+                continue
+            if (token.type == tokenize.STRING and not _FSTRING_TOKENIZED and not fstring_found and
+                    _is_fstring(token.string)):
+                fstring_found = True
+                try:
+                    return ast.unparse(_translate_commands_ast(input_string, first_parameter))
+                except SyntaxError:
+                    # the compilation of the translated string reports the error to the user
+                    pass
+            if token.type == tokenize.OP and token.string == "(" and name is not None:
+                if _is_command_token(name, before_name):
+                    row, column = token.end
+                    insertion_offsets.append(line_offsets[row] + column)
+            before_name = name
+            name = token
+    except (tokenize.TokenError, IndentationError):
+        # the input is incomplete or malformed, the insertions found so far are still applied and the compilation of
+        # the translated string will report the actual syntax error to the user
+        pass
+
+    # assembling the translated string from the slices between the insertion points in one go
+    translated_string_list = []
+    previous_offset = 0
+    for offset in insertion_offsets:
+        translated_string_list.append(input_string[previous_offset:offset])
+        translated_string_list.append(insertion)
+        previous_offset = offset
+    translated_string_list.append(input_string[previous_offset:])
+    return ''.join(translated_string_list)
+
+
+def _is_fstring(string):
+    """
+    :param string: (string) the source of a string token, including its prefix and quotes
+    :return: (bool) whether the token is an f-string
+    """
+    prefix = string[:len(string) - len(string.lstrip("rRbBuUfF"))]
+    return "f" in prefix.lower()
+
+
+def _is_command_token(name_token, previous_token):
+    """
+    Whether the given name token, which is followed by an opening bracket, is the name of a command call, that needs
+    to be translated
+    :param name_token: (tokenize.TokenInfo) the token right before the opening bracket
+    :param previous_token: (tokenize.TokenInfo) the token before the name token or None
+    :return: (bool)
+    """
+    if name_token.type != tokenize.NAME or name_token.string not in command_index:
+        return False
+    # methods, that have the same name as a command and functions being defined are not command calls
+    return previous_token is None or previous_token.string not in (".", "def", "class")
+
+
+class CommandCallTransformer(ast.NodeTransformer):
+    """
+    A NodeTransformer, that inserts the name given by 'first_parameter' as first argument into every call node of a
+    syntax tree, that calls a command. As the transformer works on the parsed syntax tree instead of the source string,
+    calls within f-strings, lambdas or comprehensions are handled just like any other call and there is no need to
+    parse the translated string again before compiling it.
+
+    EXAMPLE:
+    "[This(x) for x in y]"
+    > "[This(self, x) for x in y]"
+
+    :ivar first_parameter: (string) the name to be inserted as first argument
+    """
+    def __init__(self, first_parameter):
+        super(CommandCallTransformer, self).__init__()
+        self.first_parameter = first_parameter
+
+    def visit_Call(self, node):
+        # transforming the nested calls within the arguments first
+        self.generic_visit(node)
+        if isinstance(node.func, ast.Name) and node.func.id in command_index:
+            node.args.insert(0, ast.Name(id=self.first_parameter, ctx=ast.Load()))
+        return node
+
+
+def _translate_commands_ast(input_string, first_parameter):
+    """
+    parses the input string into a syntax tree and inserts the first parameter into every command call of it.
+    :param input_string: (string) the string of the execution command, issued by the user of the console
+    :param first_parameter: (string) the name to be added as first parameter to every command call
+    :return: (ast.Module) the transformed syntax tree
+    """
+    tree = ast.parse(input_string, "<string>", "exec")
+    tree = CommandCallTransformer(first_parameter).visit(tree)
+    # the inserted name nodes need line numbers to be compiled
+    return ast.fix_missing_locations(tree)
+
+
+def _compile_commands_ast(input_string, first_parameter):
+    """
+    parses the input string just once, translates the syntax tree and compiles the tree directly into a code object
+    :param input_string: (string) the string of the execution command, issued by the user of the console
+    :param first_parameter: (string) the name to be added as first parameter to every command call
+    :return: (code) the compiled code object
+    """
+    return compile(_translate_commands_ast(input_string, first_parameter), "<string>", "exec", flags=COMPILE_FLAGS)
+
+
+# The available translation algorithms, the legacy algorithm of the JTShell project being kept for comparison
+TRANSLATION_ENGINES = {"legacy": _translate_commands,
+                       "tokenize": _translate_commands_tokenize}
+
+# The translation algorithms, that work on the syntax tree and directly produce the compiled code object
+COMPILING_ENGINES = {"ast": _compile_commands_ast}
+
+# The name of the translation algorithm used, if none is specified explicitly
+default_engine = "tokenize"
+
+
 def _find_command_names(input_str):
     """
     If given the string of a terminal input, the function will  search for all command calls within the input and then
@@ -107,6 +330,7 @@ def _find_command_names(input_str):
     :param input_str: (string) the terminal input issued by the user
     :returns: (list)
     """
+    import JTSv2.lib.stringutil as stringops
     command_list = []
     reg = re.compile("""[^().,\-+"'#*'\s]*\(""")
     for string in stringops.split_string_structures(input_str):
@@ -144,6 +368,7 @@ def _find_whole_commands(input_str):
     :param input_str: (string) the string, that is supposed to contain function calls, that have to get found
     :return: (list) a list of string, that contain the whole function calls with the bracket body
     """
+    import JTSv2.lib.stringutil as stringops
     command_list = []
     string_list = stringops.split_string_structures(input_str)
 
@@ -291,6 +516,7 @@ def _find_environmental_variables(input_string):
     :param input_string:
     :return:
     """
+    import JTSv2.lib.stringutil as stringops
     variable_list = []
     string_list = stringops.split_string_structures(input_string)
     reg = re.compile("""\$[^'".,()\-+\s=;:]+""")
@@ -0,0 +1,230 @@
+__author__ = 'Jonas'
+import threading
+import select
+import struct
+import time
+import sys
+import os
+
+
+# The inotify constants of the linux kernel (see 'man inotify')
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_ISDIR = 0x40000000
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+
+# The events of the watched directories, that signal a changed file. Editors often save a file by writing a
+# temporary file and moving it onto the original, so moves and creations are watched as well
+WATCHED_EVENTS = IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE | IN_DELETE
+
+# The header of every event read from the inotify file descriptor: wd, mask, cookie, len
+_EVENT_HEADER = struct.Struct("iIII")
+
+
+class FileWatcher(threading.Thread):
+    """
+    A daemon thread calling a function, whenever one of the watched files has changed. On linux the watcher uses
+    inotify (through ctypes), so it is suspended by the kernel until a file actually changes and doesn't use any cpu
+    time meanwhile. On other systems, or if inotify isn't available, the modification times and sizes of the files
+    are polled in the given interval.
+
+    As saving a file often consists of multiple file system events, the events are collected for the 'debounce'
+    period and the callback is called just once for all of them.
+
+    Besides single files, whole directories can be watched: any file with the given extension within them or their
+    subdirectories, including the ones created later, counts as watched.
+
+    :ivar paths: (list) The absolute paths of the watched files
+    :ivar directories: (list) The absolute paths of the watched directories
+    :ivar extension: (string) The extension of the files watched within the directories, like '.py'
+    :ivar callback: (callable) The function called with the list of changed paths
+    :ivar interval: (float) The amount of seconds between two checks, when polling
+    :ivar debounce: (float) The amount of seconds to collect further events, before the callback is called
+    :ivar mode: (string) 'inotify' or 'polling', known once the thread has been started
+    """
+    def __init__(self, paths, callback, interval=1.0, debounce=0.1, directories=(), extension=".py"):
+        super(FileWatcher, self).__init__(daemon=True)
+        self.paths = [os.path.abspath(path) for path in paths]
+        self.directories = [os.path.abspath(directory) for directory in directories]
+        self.extension = extension
+        self.callback = callback
+        self.interval = interval
+        self.debounce = debounce
+        self.mode = None
+        # the read and write end of the pipe used to wake up the thread waiting for inotify events, when it is
+        # stopped. Only created while inotify is used and closed under the lock, so 'stop' never writes to a closed fd
+        self._stop_pipe = None
+        self._stop_lock = threading.Lock()
+        self._stopped = threading.Event()
+        # the watched directories by their inotify watch descriptors and the function adding another one
+        self._directories = {}
+        self._add_watch = None
+
+    def stop(self):
+        """
+        stops the watcher thread
+        :return: (void)
+        """
+        self._stopped.set()
+        with self._stop_lock:
+            if self._stop_pipe is not None:
+                os.write(self._stop_pipe[1], b"x")
+
+    def run(self):
+        directories = set(os.path.dirname(path) for path in self.paths)
+        for directory in self.directories:
+            directories.update(_walk_directories(directory))
+        inotify_fd, self._directories, self._add_watch = _create_inotify(directories)
+        if inotify_fd is None:
+            self.mode = "polling"
+            self._poll()
+        else:
+            self.mode = "inotify"
+            try:
+                with self._stop_lock:
+                    self._stop_pipe = os.pipe()
+                self._watch(inotify_fd, self._stop_pipe[0])
+            finally:
+                os.close(inotify_fd)
+                with self._stop_lock:
+                    for fd in self._stop_pipe or ():
+                        os.close(fd)
+                    self._stop_pipe = None
+
+    def _watch(self, inotify_fd, stop_fd):
+        while not self._stopped.is_set():
+            # waiting without a timeout, the thread is woken up by an event or by the stop pipe
+            readable, _, _ = select.select([inotify_fd, stop_fd], [], [])
+            if stop_fd in readable:
+                break
+            changed = set(self._read_events(inotify_fd))
+            # collecting the events, that directly follow, like the write and the move of a save
+            deadline = time.monotonic() + self.debounce
+            while not self._stopped.is_set():
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                readable, _, _ = select.select([inotify_fd], [], [], remaining)
+                if inotify_fd in readable:
+                    changed.update(self._read_events(inotify_fd))
+            changed = sorted(path for path in changed if self.is_watched(path))
+            if len(changed) > 0:
+                self._notify(changed)
+
+    def is_watched(self, path):
+        """
+        :param path: (string) the absolute path of a file
+        :return: (bool) whether the file is one of the watched files or lies within a watched directory
+        """
+        if path in self.paths:
+            return True
+        return path.endswith(self.extension) and self._in_directories(path)
+
+    def _in_directories(self, path):
+        return any(path.startswith(directory + os.sep) for directory in self.directories)
+
+    def _read_events(self, inotify_fd):
+        # returns the paths of all the files, that an event has been read for
+        try:
+            data = os.read(inotify_fd, 65536)
+        except BlockingIOError:
+            return []
+        directories = self._directories
+        paths = []
+        offset = 0
+        while offset + _EVENT_HEADER.size <= len(data):
+            watch_descriptor, mask, cookie, length = _EVENT_HEADER.unpack_from(data, offset)
+            offset += _EVENT_HEADER.size
+            name = data[offset:offset + length].rstrip(b"\0").decode(sys.getfilesystemencoding(), "replace")
+            offset += length
+            if watch_descriptor in directories and name != "":
+                path = os.path.join(directories[watch_descriptor], name)
+                if mask & IN_ISDIR:
+                    # a new subdirectory of a watched directory is watched as well
+                    if mask & (IN_CREATE | IN_MOVED_TO) and self._in_directories(path):
+                        for directory in _walk_directories(path):
+                            self._add_watch(directory)
+                        # the files, that have been created within it meanwhile, are picked up by the callback
+                        paths.extend(self._get_files([path]))
+                else:
+                    paths.append(path)
+        return paths
+
+    def _poll(self):
+        states = self._get_states()
+        while not self._stopped.wait(self.interval):
+            new_states = self._get_states()
+            changed = sorted(path for path in set(states) | set(new_states) if states.get(path) != new_states.get(path))
+            states = new_states
+            if len(changed) > 0:
+                self._notify(changed)
+
+    def _get_states(self):
+        # the states of the watched files and of the files within the watched directories
+        return {path: _get_state(path) for path in self.paths + self._get_files(self.directories)}
+
+    def _get_files(self, directories):
+        files = []
+        for directory in directories:
+            for root, _, names in os.walk(directory):
+                files.extend(os.path.join(root, name) for name in names if name.endswith(self.extension))
+        return files
+
+    def _notify(self, changed):
+        try:
+            self.callback(changed)
+        except Exception:
+            # the watcher has to keep running, whatever the callback does
+            import traceback
+            traceback.print_exc()
+
+
+def _get_state(path):
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return stat.st_mtime_ns, stat.st_size
+
+
+def _walk_directories(directory):
+    # the directory and all its subdirectories
+    return [root for root, _, _ in os.walk(directory)]
+
+
+def _create_inotify(directories):
+    """
+    creates an inotify instance watching the given directories
+    :param directories: (set) the absolute paths of the directories
+    :return: (tuple) the file descriptor of the inotify instance, the dict of the directories by their watch
+    descriptors and the function adding the watch of another directory to it. The file descriptor is None, in case
+    inotify isn't available
+    """
+    if not sys.platform.startswith("linux"):
+        return None, {}, None
+    try:
+        import ctypes
+        import ctypes.util
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        inotify_fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+    except (OSError, AttributeError):
+        return None, {}, None
+    if inotify_fd < 0:
+        return None, {}, None
+    watched = {}
+
+    def add_watch(directory):
+        watch_descriptor = libc.inotify_add_watch(inotify_fd, directory.encode(sys.getfilesystemencoding()),
+                                                  WATCHED_EVENTS)
+        if watch_descriptor >= 0:
+            watched[watch_descriptor] = directory
+        return watch_descriptor >= 0
+
+    for directory in directories:
+        if not add_watch(directory):
+            os.close(inotify_fd)
+            return None, {}, None
+    return inotify_fd, watched, add_watch